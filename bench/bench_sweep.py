@@ -0,0 +1,279 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Offline sweep benchmark: drives the bmv2 or Tofino LocalClient against the
+# in-memory fakes in fake_thrift.py / fake_bfrt.py and reports sweep time,
+# peak memory and /inactive query latency.
+
+import os
+import sys
+import io
+import json
+import time
+import random
+import logging
+import resource
+import tempfile
+import ipaddress
+import statistics
+import tracemalloc
+import contextlib
+from argparse import ArgumentParser
+
+from tabulate import tabulate
+
+import fake_bfrt
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTROLLER_DIRS = {
+    'bmv2': os.path.join(ROOT, 'p4src', 'controller'),
+    'tofino': os.path.join(ROOT, 'p4src-tofino', 'controller'),
+}
+
+
+class Activity:
+    """Indices of the monitored space that send traffic during each interval.
+
+    idle       nothing is active
+    stable     the same random `fraction` of addresses every interval
+    uniform    a fresh random `fraction` of addresses every interval
+    churn      stable set where `churn` of it is replaced every interval
+    clustered  whole /24s are active, `fraction` of all /24s
+    """
+    patterns = ('idle', 'stable', 'uniform', 'churn', 'clustered')
+
+    def __init__(self, pattern, size, fraction=0.05, churn=0.1, seed=1):
+        if pattern not in self.patterns:
+            raise ValueError(f'unknown activity pattern {pattern}')
+        self.pattern = pattern
+        self.size = size
+        self.count = int(size * fraction)
+        self.churn = churn
+        self.rng = random.Random(seed)
+        self.current = self.rng.sample(range(size), self.count)
+
+    def next(self):
+        if self.pattern == 'idle':
+            return []
+        if self.pattern == 'stable':
+            return self.current
+        if self.pattern == 'uniform':
+            return self.rng.sample(range(self.size), self.count)
+        if self.pattern == 'churn':
+            replaced = int(len(self.current) * self.churn)
+            keep = self.current[replaced:]
+            self.current = keep + self.rng.sample(range(self.size), replaced)
+            self.rng.shuffle(self.current)
+            return self.current
+        blocks = self.rng.sample(range(max(self.size // 256, 1)), max(self.count // 256, 1))
+        return [b * 256 + i for b in blocks for i in range(256) if b * 256 + i < self.size]
+
+
+class TofinoBench:
+    def __init__(self, args, latency, monitored_path, ports):
+        self.info = fake_bfrt.install(latency, global_table_size=args.global_table_size,
+                                      num_pipes=args.pipes)
+        from controllertof import LocalClient
+        self.client = LocalClient(args.interval, args.global_table_size, args.dark_meter_size, args.alpha,
+                                  monitored_path, ports, args.max_packet_rate, args.max_byte_rate,
+                                  args.avg_packet_rate, args.avg_byte_rate)
+        self.global_table = self.info.table_get('pipe.Ingress.global_table')
+        self.active_digest = self.info.learn_get('pipe.IngressDeparser.active_digest')
+
+    def traffic(self, indices):
+        # what the data plane does for outgoing packets, a digest for every flag it sets
+        flag_table, summary_table = fake_bfrt.live_flag_tables(self.info)
+        new = [(idx,) for idx, flag in zip(indices, flag_table.test_bits(indices)) if not flag]
+        flag_table.set_bits(indices)
+        summary_table.set_indices({self.client.dark_index_mapping[idx] for idx in indices}, 1)
+        self.global_table.set_bits(indices)
+        if new:
+            self.active_digest.push(*new)
+        for digest in fake_bfrt.pending_digests():
+            self.client.handle_digest(digest)
+
+
+class Bmv2Bench:
+    def __init__(self, args, latency, monitored_path, ports):
+        import fake_thrift
+        fake_thrift.install(latency, switches=[f's{i + 1}' for i in range(args.switches)],
+                            register_size=args.global_table_size)
+        from controller import LocalClient
+        self.client = LocalClient(args.interval, args.global_table_size, args.dark_meter_size, args.alpha,
+                                  monitored_path, ports, args.max_packet_rate, args.max_byte_rate,
+                                  args.avg_packet_rate, args.avg_byte_rate)
+        self.switches = list(self.client.controllers.values())
+        self.rng = random.Random(0)
+
+    def traffic(self, indices):
+        # spread the active addresses over the switches
+        for idx in indices:
+            sw = self.switches[self.rng.randrange(len(self.switches))]
+            sw.register_arrays['MyIngress.flag_table'][idx] = 1
+            sw.register_arrays['MyIngress.global_table'][idx] = 1
+
+
+def summary(samples):
+    if not samples:
+        return ['-'] * 4
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return [f'{statistics.mean(samples):.4f}', f'{statistics.median(samples):.4f}',
+            f'{p95:.4f}', f'{ordered[-1]:.4f}']
+
+
+def query_prefixes(monitored, query_len, count, seed):
+    rng = random.Random(seed)
+    prefixes = []
+    for _ in range(count):
+        net = monitored[rng.randrange(len(monitored))]
+        if query_len <= net.prefixlen:
+            prefixes.append(str(net))
+            continue
+        offset = rng.randrange(2 ** (query_len - net.prefixlen)) << (32 - query_len)
+        prefixes.append(f'{net.network_address + offset}/{query_len}')
+    return prefixes
+
+
+def main():
+    parser = ArgumentParser(description='Offline sweep benchmark with in-memory switch fakes.')
+    parser.add_argument('--target', choices=sorted(CONTROLLER_DIRS), default='tofino')
+    parser.add_argument('--monitored', nargs='*', default=None, type=str,
+                        help='monitored prefixes (default 10.0.0.0/<prefix-len>)')
+    parser.add_argument('--prefix-len', default=16, type=int, help='size of the monitored space, 10..24')
+    parser.add_argument('--sweeps', default=5, type=int)
+    parser.add_argument('--activity', choices=Activity.patterns, default='stable')
+    parser.add_argument('--active-fraction', default=0.05, type=float)
+    parser.add_argument('--churn', default=0.1, type=float)
+    parser.add_argument('--queries', default=20, type=int)
+    parser.add_argument('--query-len', default=24, type=int)
+    parser.add_argument('--call-latency-ms', default=0.0, type=float, help='injected latency per RPC')
+    parser.add_argument('--entry-latency-us', default=0.0, type=float, help='injected latency per entry')
+    parser.add_argument('--switches', default=3, type=int, help='bmv2 switches')
+    parser.add_argument('--pipes', default=2, type=int, help='Tofino pipes')
+    parser.add_argument('--interval', default=3, type=int)
+    parser.add_argument('--global-table-size', default=4194304, type=int)
+    parser.add_argument('--dark-meter-size', default=16384, type=int)
+    parser.add_argument('--max-packet-rate', default=1174405, type=int)
+    parser.add_argument('--avg-packet-rate', default=343933, type=int)
+    parser.add_argument('--max-byte-rate', default=338102845, type=int)
+    parser.add_argument('--avg-byte-rate', default=17758683, type=int)
+    parser.add_argument('--alpha', default=1, type=int)
+    parser.add_argument('--tracemalloc', action='store_true', help='also report the Python heap peak (slow)')
+    parser.add_argument('--seed', default=1, type=int)
+    parser.add_argument('--json', default=None, type=str, help='write the results to this file')
+    parser.add_argument('--log-level', default='ERROR', type=str)
+    args = parser.parse_args()
+
+    monitored = [ipaddress.IPv4Network(p) for p in (args.monitored or [f'10.0.0.0/{args.prefix_len}'])]
+    size = sum(net.num_addresses for net in monitored)
+    if size > args.global_table_size:
+        parser.error(f'monitored space ({size} addresses) exceeds --global-table-size')
+
+    sys.path.insert(0, CONTROLLER_DIRS[args.target])
+    latency = fake_bfrt.Latency(args.call_latency_ms / 1e3, args.entry_latency_us / 1e6)
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+        f.write('# prefix/length\n' + ''.join(f'{net}\n' for net in monitored))
+        monitored_path = f.name
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    quiet = io.StringIO()
+    bench_class = TofinoBench if args.target == 'tofino' else Bmv2Bench
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(quiet):
+            bench = bench_class(args, latency, monitored_path, {'incoming': [2], 'outgoing': [1]})
+    finally:
+        os.unlink(monitored_path)
+    setup_time = time.perf_counter() - start
+    logging.getLogger().setLevel(args.log_level)
+
+    activity = Activity(args.activity, size, args.active_fraction, args.churn, args.seed)
+    sweep_times = []
+    calls = []
+    for _ in range(args.sweeps):
+        bench.traffic(activity.next())
+        calls_before = latency.calls, latency.entries
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(quiet):
+            bench.client.sweep()
+        sweep_times.append(time.perf_counter() - start)
+        calls.append((latency.calls - calls_before[0], latency.entries - calls_before[1]))
+
+    query_times = []
+    scoped_times = []
+    start = time.perf_counter()
+    bench.client.get_inactive_prefixes()
+    query_times.append(time.perf_counter() - start)
+    for prefix in query_prefixes(monitored, args.query_len, args.queries, args.seed):
+        start = time.perf_counter()
+        bench.client.get_inactive_prefixes(prefix)
+        scoped_times.append(time.perf_counter() - start)
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    heap_peak = tracemalloc.get_traced_memory()[1] / 2**20 if args.tracemalloc else None
+
+    results = {
+        'target': args.target,
+        'monitored': [str(net) for net in monitored],
+        'addresses': size,
+        'activity': args.activity,
+        'setup_s': setup_time,
+        'sweep_s': sweep_times,
+        'rpc_calls_per_sweep': [c for c, _ in calls],
+        'rpc_entries_per_sweep': [e for _, e in calls],
+        'query_all_s': query_times,
+        'query_scoped_s': scoped_times,
+        'peak_rss_mib': peak_rss,
+        'heap_peak_mib': heap_peak,
+    }
+
+    print(f'{args.target}: {size} addresses in {", ".join(results["monitored"])}, '
+          f'activity {args.activity}, setup {setup_time:.2f}s')
+    print(tabulate([['sweep'] + summary(sweep_times),
+                    ['/inactive (all)'] + summary(query_times),
+                    [f'/inactive (/{args.query_len})'] + summary(scoped_times)],
+                   headers=['seconds', 'mean', 'p50', 'p95', 'max']))
+    print(f'rpc per sweep: {statistics.mean(results["rpc_calls_per_sweep"]):.0f} calls, '
+          f'{statistics.mean(results["rpc_entries_per_sweep"]):.0f} entries')
+    print(f'peak RSS: {peak_rss:.1f} MiB' + (f', Python heap peak: {heap_peak:.1f} MiB' if heap_peak else ''))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,454 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# In-memory stand-in for the parts of bfrt_grpc.client used by the Tofino
+# controllers. install() registers it as `bfrt_grpc.client` so that
+# controllertof.py can be imported and driven without SDE_INSTALL or a switch.
+
+import os
+import queue
+import sys
+import time
+import types
+
+import numpy as np
+
+ALL_PIPES = 0xffff
+WORD_BITS = 32 # blocks per entry of the packed flag and global registers
+
+
+class Mode:
+    # bfruntime_pb2.Mode, entry scopes
+    ALL = 0
+    SINGLE = 1
+    USER_DEFINED = 2
+
+
+class Latency:
+    # per gRPC call and per entry carried by the call, in seconds
+    def __init__(self, per_call=0.0, per_entry=0.0):
+        self.per_call = per_call
+        self.per_entry = per_entry
+        self.calls = 0
+        self.entries = 0
+
+    def charge(self, entries):
+        self.calls += 1
+        self.entries += entries
+        delay = self.per_call + self.per_entry * entries
+        if delay > 0:
+            time.sleep(delay)
+
+
+class KeyTuple:
+    def __init__(self, name, value=None, mask=None, prefix_len=None, low=None, high=None):
+        self.name = name
+        self.value = value
+        self.mask = mask
+        self.prefix_len = prefix_len
+        self.low = low
+        self.high = high
+
+
+class DataTuple:
+    def __init__(self, name, val=None, float_val=None, str_val=None, int_arr_val=None,
+                 bool_arr_val=None, bool_val=None):
+        self.name = name
+        for value in (val, float_val, str_val, int_arr_val, bool_arr_val, bool_val):
+            if value is not None:
+                break
+        self.val = value
+
+
+class Target:
+    def __init__(self, device_id=0, pipe_id=ALL_PIPES, direction=0xff, prsr_id=0xff):
+        self.device_id = device_id
+        self.pipe_id = pipe_id
+        self.direction = direction
+        self.prsr_id = prsr_id
+
+
+class _Key:
+    def __init__(self, fields):
+        self.fields = fields
+
+    def to_dict(self):
+        return {f.name: {'value': f.value, 'prefix_len': f.prefix_len} for f in self.fields}
+
+    def as_tuple(self):
+        return tuple((f.name, f.value, f.prefix_len) for f in self.fields)
+
+
+class _Data:
+    def __init__(self, fields, action_name=None):
+        self.fields = fields
+        self.action_name = action_name
+
+    def to_dict(self):
+        d = {f.name: f.val for f in self.fields}
+        if self.action_name is not None:
+            d['action_name'] = self.action_name
+        return d
+
+
+class _TableInfo:
+    def __init__(self, name, table_type, size, data_names=()):
+        self.name = name
+        self.type = table_type
+        self.size = size
+        self.data_dict_allname = {n.split('.')[-1]: n for n in data_names}
+        self.annotations = dict()
+
+    def name_get(self):
+        return self.name
+
+    def type_get(self):
+        return self.type
+
+    def size_get(self):
+        return self.size
+
+    def key_field_annotation_add(self, field, annotation):
+        self.annotations[field] = annotation
+
+
+class Table:
+    def __init__(self, name, table_type, size, latency, data_names=()):
+        self.name = name
+        self.info = _TableInfo(name, table_type, size, data_names)
+        self.latency = latency
+        self.entries = dict()
+        self.default_entry = None
+        self.operations = []
+        self.pipe_scope = Mode.ALL
+
+    def make_key(self, key_field_list):
+        return _Key(key_field_list)
+
+    def make_data(self, data_field_list, action_name=None):
+        return _Data(data_field_list, action_name)
+
+    def entry_add(self, target, key_list=None, data_list=None):
+        self.latency.charge(len(key_list))
+        for key, data in zip(key_list, data_list):
+            k = key.as_tuple()
+            if k in self.entries:
+                raise KeyError(f'{self.name}: entry already exists')
+            self.entries[k] = data
+
+    def entry_mod(self, target, key_list=None, data_list=None):
+        self.latency.charge(len(key_list))
+        for key, data in zip(key_list, data_list):
+            self.entries[key.as_tuple()] = data
+
+    def entry_del(self, target, key_list=None):
+        self.latency.charge(len(key_list) if key_list else 1)
+        if not key_list:
+            self.entries.clear()
+            return
+        for key in key_list:
+            self.entries.pop(key.as_tuple(), None)
+
+    def entry_get(self, target, key_list=None, flags={"from_hw": False}, required_data_fields=None):
+        self.latency.charge(len(key_list) if key_list else len(self.entries))
+        if not key_list:
+            for k, data in list(self.entries.items()):
+                yield data, _Key([KeyTuple(n, v, prefix_len=p) for n, v, p in k])
+            return
+        for key in key_list:
+            yield self.entries[key.as_tuple()], key
+
+    def usage_get(self, target, flags={"from_hw": False}):
+        yield len(self.entries)
+
+    def default_entry_set(self, target, data):
+        self.latency.charge(1)
+        self.default_entry = data
+
+    def operations_execute(self, target, table_op):
+        self.latency.charge(1)
+        self.operations.append(table_op)
+
+    def attribute_entry_scope_set(self, target, config_gress_scope=False, predefined_gress_scope_val=Mode.ALL,
+                                  config_pipe_scope=True, predefined_pipe_scope=True,
+                                  predefined_pipe_scope_val=Mode.ALL, **kwargs):
+        self.latency.charge(1)
+        if config_pipe_scope:
+            self.pipe_scope = predefined_pipe_scope_val
+
+
+class RegisterTable(Table):
+    # one value per pipe for every index, like a bfrt register read; width 32
+    # registers hold the packed bits of WORD_BITS blocks per entry
+    def __init__(self, name, size, latency, num_pipes=2, init=0, width=1):
+        short = name.split('.', 1)[-1]
+        super().__init__(name, 'REGISTER', size, latency, data_names=[short + '.f1'])
+        self.data_name = short + '.f1'
+        self.num_pipes = num_pipes
+        self.init = init
+        self.width = width
+        self.pipes = [self._initial() for _ in range(num_pipes)]
+
+    def _initial(self):
+        if self.width == 1:
+            return bytearray([self.init]) * self.info.size
+        return np.full(self.info.size, self.init, dtype=np.uint32)
+
+    def _pipes(self, target):
+        if target.pipe_id == ALL_PIPES:
+            if self.pipe_scope != Mode.ALL:
+                raise ValueError(f'{self.name}: asymmetric table needs a pipe')
+            return self.pipes
+        return [self.pipes[target.pipe_id]]
+
+    def _index(self, key):
+        return key.fields[0].value
+
+    def entry_add(self, target, key_list=None, data_list=None):
+        self.latency.charge(len(key_list))
+        pipes = self._pipes(target)
+        for key, data in zip(key_list, data_list):
+            idx = self._index(key)
+            value = data.fields[0].val
+            for pipe in pipes:
+                pipe[idx] = value
+
+    entry_mod = entry_add
+
+    def entry_del(self, target, key_list=None):
+        self.latency.charge(len(key_list) if key_list else 1)
+        pipes = self._pipes(target)
+        if not key_list:
+            for pipe in pipes:
+                pipe[:] = self._initial()
+            return
+        for key in key_list:
+            for pipe in pipes:
+                pipe[self._index(key)] = self.init
+
+    def entry_get(self, target, key_list=None, flags={"from_hw": False}, required_data_fields=None):
+        pipes = self._pipes(target)
+        indices = range(self.info.size) if not key_list else [self._index(k) for k in key_list]
+        self.latency.charge(len(indices))
+        for idx in indices:
+            data = _Data([DataTuple(self.data_name, [int(pipe[idx]) for pipe in pipes])])
+            yield data, _Key([KeyTuple('$REGISTER_INDEX', idx)])
+
+    def usage_get(self, target, flags={"from_hw": False}):
+        yield self.info.size
+
+    # data-plane side, used by the benchmark to emulate traffic
+    def set_indices(self, indices, value=1, pipe=0):
+        reg = self.pipes[pipe]
+        for idx in indices:
+            reg[idx] = value
+
+    def set_bits(self, indices, pipe=0):
+        # the bit of each block in a packed register
+        idx = np.fromiter(indices, dtype=np.int64)
+        np.bitwise_or.at(self.pipes[pipe], idx // WORD_BITS, (1 << (idx % WORD_BITS)).astype(np.uint32))
+
+    def test_bits(self, indices, pipe=0):
+        idx = np.fromiter(indices, dtype=np.int64)
+        return (self.pipes[pipe][idx // WORD_BITS] >> (idx % WORD_BITS).astype(np.uint32)) & 1
+
+
+class MeterTable(Table):
+    def __init__(self, name, size, latency):
+        super().__init__(name, 'METER', size, latency)
+        # bumped on every write so that models can cache the specs
+        self.version = 0
+
+    def entry_add(self, target, key_list=None, data_list=None):
+        self.latency.charge(len(key_list))
+        for key, data in zip(key_list, data_list):
+            self.entries[key.as_tuple()] = data
+        self.version += 1
+
+    entry_mod = entry_add
+
+    def spec(self, index):
+        data = self.entries.get((('$METER_INDEX', index, None),))
+        return None if data is None else data.to_dict()
+
+
+class _LearnInfo:
+    def __init__(self, name, learn_id):
+        self.name = name
+        self.learn_id = learn_id
+
+    def name_get(self):
+        return self.name
+
+    def id_get(self):
+        return self.learn_id
+
+
+class _DigestList:
+    def __init__(self, digest_id, data):
+        self.digest_id = digest_id
+        self.data = data
+
+
+class Learn:
+    def __init__(self, name, fields, learn_id):
+        self.name = name
+        self.fields = fields
+        self.info = _LearnInfo(name, learn_id)
+
+    def make_data_list(self, digest):
+        return [_Data([DataTuple(n, v) for n, v in zip(self.fields, values)]) for values in digest.data]
+
+    def push(self, *values):
+        # a digest message of one or more entries, fields in declaration order
+        ClientInterface.digests.put(_DigestList(self.info.learn_id, list(values)))
+
+
+class BfRtInfo:
+    def __init__(self, p4_name, tables, learns=()):
+        self.p4_name = p4_name
+        self.table_dict = {t.name: t for t in tables}
+        self.learn_dict = {l.name: l for l in learns}
+        # the controllers look tables up by their short name
+        for t in tables:
+            if t.name.startswith('pipe.'):
+                self.table_dict[t.name.split('.', 1)[1]] = t
+
+    def p4_name_get(self):
+        return self.p4_name
+
+    def table_get(self, name):
+        try:
+            return self.table_dict[name]
+        except KeyError:
+            raise KeyError(f'Table {name} not found') from None
+
+    def learn_get(self, name):
+        try:
+            return self.learn_dict[name]
+        except KeyError:
+            raise KeyError(f'Learn {name} not found') from None
+
+
+def darknet_tables(latency, global_table_size=4194304, dark_meter_size=16384, num_pipes=2, v6_slots=65536):
+    """Tables of darknet-norec.p4 (Tofino) as seen through bfrt."""
+    return [
+        Table('pipe.Ingress.ports', 'MATCH_DIRECT', 64, latency),
+        Table('pipe.Ingress.monitored', 'MATCH_DIRECT', 1024, latency),
+        Table('pipe.Ingress.monitored6', 'MATCH_DIRECT', 1024, latency),
+        Table('pipe.Ingress.forward', 'MATCH_DIRECT', 1024, latency),
+        Table('pipe.Egress.mcast_routers', 'MATCH_DIRECT', 1024, latency),
+        Table('pipe.Ingress.flag_bank', 'MATCH_DIRECT', 1, latency),
+        RegisterTable('pipe.Ingress.flag_table0', global_table_size // WORD_BITS, latency, num_pipes, 0, WORD_BITS),
+        RegisterTable('pipe.Ingress.flag_table1', global_table_size // WORD_BITS, latency, num_pipes, 0, WORD_BITS),
+        RegisterTable('pipe.Ingress.summary_table0', dark_meter_size, latency, num_pipes, 0),
+        RegisterTable('pipe.Ingress.summary_table1', dark_meter_size, latency, num_pipes, 0),
+        RegisterTable('pipe.Ingress.global_table', global_table_size // WORD_BITS, latency, num_pipes, 0xffffffff, WORD_BITS),
+        RegisterTable('pipe.Ingress.flag6_table', v6_slots, latency, num_pipes, 0),
+        RegisterTable('pipe.Ingress.global6_table', v6_slots, latency, num_pipes, 1),
+        MeterTable('pipe.Ingress.dark_global_meter', 1, latency),
+        MeterTable('pipe.Ingress.dark_meter', dark_meter_size, latency),
+        MeterTable('pipe.Ingress.dark_global_byte_meter', 1, latency),
+        MeterTable('pipe.Ingress.dark_byte_meter', dark_meter_size, latency),
+        Table('$mirror.cfg', 'MIRROR_CFG', 1024, latency),
+        Table('$pre.node', 'PRE_NODE', 4096, latency),
+        Table('$pre.mgid', 'PRE_MGID', 4096, latency),
+    ]
+
+
+def darknet_learns():
+    """Digests of darknet-norec.p4 (Tofino)."""
+    return [Learn('pipe.IngressDeparser.active6_digest', ('addr6', 'slot6'), 1),
+            Learn('pipe.IngressDeparser.active_digest', ('idx',), 2)]
+
+
+class ClientInterface:
+    # the switch state shared by every client, set by install()
+    bfrt_info = None
+    digests = queue.Queue()
+
+    def __init__(self, grpc_addr, client_id=0, device_id=0, num_tries=5, **kwargs):
+        self.grpc_addr = grpc_addr
+        self.client_id = client_id
+        self.device_id = device_id
+        self.bound = None
+
+    def bfrt_info_get(self, p4_name=None):
+        return ClientInterface.bfrt_info
+
+    def bind_pipeline_config(self, p4_name):
+        self.bound = p4_name
+
+    def digest_get(self, timeout=1):
+        try:
+            return ClientInterface.digests.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError('Digest list not received') from None
+
+    def tear_down_stream(self):
+        pass
+
+
+def live_flag_tables(info):
+    """Flag and summary registers the data plane currently sets."""
+    default = info.table_get('pipe.Ingress.flag_bank').default_entry
+    bank = default.to_dict()['bank'] if default is not None else 0
+    return info.table_get(f'pipe.Ingress.flag_table{bank}'), info.table_get(f'pipe.Ingress.summary_table{bank}')
+
+
+def pending_digests():
+    """Digests pushed so far, for the benchmarks that do not run the digest thread."""
+    while True:
+        try:
+            yield ClientInterface.digests.get_nowait()
+        except queue.Empty:
+            return
+
+
+def install(latency=None, p4_name='darknet-norec', tables=None, **table_kwargs):
+    """Register this module as bfrt_grpc.client and return the shared BfRtInfo."""
+    latency = latency if latency is not None else Latency()
+    tables = tables if tables is not None else darknet_tables(latency, **table_kwargs)
+    ClientInterface.bfrt_info = BfRtInfo(p4_name, tables, darknet_learns())
+
+    os.environ.setdefault('SDE_INSTALL', os.path.join(os.sep, 'nonexistent-sde'))
+    module = sys.modules[__name__]
+    package = types.ModuleType('bfrt_grpc')
+    package.client = module
+    package.bfruntime_pb2 = types.ModuleType('bfrt_grpc.bfruntime_pb2')
+    package.bfruntime_pb2.Mode = Mode
+    sys.modules['bfrt_grpc'] = package
+    sys.modules['bfrt_grpc.client'] = module
+    sys.modules['bfrt_grpc.bfruntime_pb2'] = package.bfruntime_pb2
+    return ClientInterface.bfrt_info
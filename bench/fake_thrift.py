@@ -0,0 +1,153 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# In-memory stand-in for the p4utils pieces used by the bmv2 controller:
+# load_topo() and SimpleSwitchThriftAPI. install() registers them under
+# p4utils.utils.* so that p4src/controller/controller.py runs without bmv2.
+
+import sys
+import types
+
+from fake_bfrt import Latency
+
+
+class SimpleSwitchThriftAPI:
+    registers = {'MyIngress.global_table': 1, 'MyIngress.flag_table': 0}
+    register_size = 4194304
+    latency = Latency()
+
+    def __init__(self, thrift_port, thrift_ip='localhost', json_path=None):
+        self.thrift_port = thrift_port
+        self.register_arrays = {name: bytearray([0]) * self.register_size for name in self.registers}
+        self.meters = dict()
+        self.tables = dict()
+        self.mc_groups = dict()
+        self.mc_nodes = []
+        self.mirrors = dict()
+
+    def get_register_arrays(self):
+        return list(self.register_arrays)
+
+    def register_read(self, register_name, index=None, show=False):
+        self.latency.charge(1)
+        reg = self.register_arrays[register_name]
+        if index is None:
+            return list(reg)
+        return reg[index]
+
+    def register_write(self, register_name, index, value):
+        reg = self.register_arrays[register_name]
+        if isinstance(index, (list, tuple)):
+            lo, hi = index
+            self.latency.charge(hi - lo + 1)
+            reg[lo:hi + 1] = bytearray([value]) * (hi - lo + 1)
+        else:
+            self.latency.charge(1)
+            reg[index] = value
+
+    def register_reset(self, register_name):
+        self.latency.charge(1)
+        reg = self.register_arrays[register_name]
+        reg[:] = bytearray([0]) * len(reg)
+
+    def meter_set_rates(self, meter_name, index, rates):
+        self.latency.charge(1)
+        self.meters[(meter_name, index)] = rates
+
+    def table_add(self, table_name, action_name, match_keys, action_params=[], prio=0):
+        self.latency.charge(1)
+        entries = self.tables.setdefault(table_name, dict())
+        entries[tuple(match_keys)] = (action_name, list(action_params))
+        return len(entries) - 1
+
+    def mc_mgrp_create(self, mgrp):
+        self.mc_groups[mgrp] = []
+        return mgrp
+
+    def mc_node_create(self, rid, ports, lags=[]):
+        self.mc_nodes.append((rid, ports))
+        return len(self.mc_nodes) - 1
+
+    def mc_node_associate(self, mgrp, handle):
+        self.mc_groups[mgrp].append(handle)
+
+    def mirroring_add_mc(self, mirror_id, mgrp):
+        self.mirrors[mirror_id] = ('mc', mgrp)
+
+    def mirroring_add(self, mirror_id, egress_port):
+        self.mirrors[mirror_id] = ('port', egress_port)
+
+    # data-plane side, used by the benchmark to emulate traffic
+    def set_indices(self, register_name, indices, value=1):
+        reg = self.register_arrays[register_name]
+        for idx in indices:
+            reg[idx] = value
+
+
+class Topology:
+    def __init__(self, switches=('s1', 's2', 's3')):
+        self.switches = list(switches)
+
+    def get_p4switches(self):
+        return {sw: {} for sw in self.switches}
+
+    def get_thrift_port(self, sw):
+        return 9090 + self.switches.index(sw)
+
+    def node_to_node_interface_ip(self, node1, node2):
+        return f'10.{self.switches.index(node1)}.{self.switches.index(node2)}.1/24'
+
+    def node_to_node_mac(self, node1, node2):
+        return f'00:00:0a:00:{self.switches.index(node1):02x}:{self.switches.index(node2):02x}'
+
+    def node_to_node_port_num(self, node1, node2):
+        return self.switches.index(node2) + 1
+
+
+def install(latency=None, switches=('s1', 's2', 's3'), register_size=4194304):
+    """Register fake p4utils modules and return the SimpleSwitchThriftAPI class."""
+    SimpleSwitchThriftAPI.latency = latency if latency is not None else Latency()
+    SimpleSwitchThriftAPI.register_size = register_size
+    topo = Topology(switches)
+
+    helper = types.ModuleType('p4utils.utils.helper')
+    helper.load_topo = lambda path: topo
+    thrift = types.ModuleType('p4utils.utils.sswitch_thrift_API')
+    thrift.SimpleSwitchThriftAPI = SimpleSwitchThriftAPI
+
+    sys.modules['p4utils'] = types.ModuleType('p4utils')
+    sys.modules['p4utils.utils'] = types.ModuleType('p4utils.utils')
+    sys.modules['p4utils.utils.helper'] = helper
+    sys.modules['p4utils.utils.sswitch_thrift_API'] = thrift
+    return SimpleSwitchThriftAPI
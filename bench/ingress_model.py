@@ -0,0 +1,350 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Vectorized software model of the Ingress control of
+# p4src-tofino/darknet-norec.p4. It reads its configuration (ports,
+# monitored, meters) from and keeps its registers in the fake_bfrt tables,
+# so an unmodified LocalClient programs and sweeps it like a real switch.
+
+import ipaddress
+
+import numpy as np
+
+GREEN, YELLOW, RED = 0, 1, 3
+WORD_BITS = 32 # blocks per entry of the flag and global registers
+
+
+def _bits(words, idx):
+    # bit of each block in a packed register
+    return (words[idx // WORD_BITS] >> (idx % WORD_BITS).astype(np.uint32)) & 1
+
+
+def _set_bits(words, idx):
+    np.bitwise_or.at(words, idx // WORD_BITS, (1 << (idx % WORD_BITS)).astype(np.uint32))
+
+
+def _segmented_cummin(values, group, span):
+    # running minimum restarting at every group; groups are contiguous and
+    # numbered in order, so shifting each one below all previous ones
+    # isolates them
+    shift = group * span
+    return np.minimum.accumulate(values - shift) + shift
+
+
+def police(group, start, counts, t, size, rate, burst, tokens, last, iterations=2):
+    """Token-bucket policer over packets grouped by bucket.
+
+    Packets are sorted by group, in arrival order within a group; rate, burst,
+    tokens and last are per group. Returns the conforming mask and updates
+    tokens/last in place. Between packets the bucket is refilled and capped
+    at burst; the cap is folded in by fixed-point refinement, which is exact
+    unless a bucket saturates between two packets that are both near its
+    limit.
+    """
+    first = np.repeat(start, counts)
+    r = np.repeat(rate, counts)
+    b = np.repeat(burst, counts)
+    cum = np.cumsum(size, dtype=np.float64)
+    offered = cum - (cum[first] - size[first])
+    before = offered - size
+
+    # the cap term is invariant to shifting time, keep it small for precision
+    rel = t - t.min()
+    refill = np.repeat(tokens, counts) + r * np.maximum(t - np.repeat(last, counts), 0)
+    span = float(offered.max() + b.max() + r.max() * (rel.max() + 1) + 1)
+
+    granted_before = before
+    for _ in range(iterations):
+        cap = b + r * rel + _segmented_cummin(granted_before - r * rel, group, span)
+        allowance = np.floor(np.minimum(refill, cap))
+        granted = offered + np.minimum(_segmented_cummin(allowance - offered, group, span), 0)
+        granted_before = np.empty_like(granted)
+        granted_before[1:] = granted[:-1]
+        granted_before[start] = 0
+        granted_before = np.maximum(granted_before, 0)
+    conform = (granted - granted_before) >= size
+
+    end = start + counts - 1
+    tokens[:] = np.clip(allowance[end] - granted[end], 0, burst)
+    last[:] = t[end]
+    return conform
+
+
+class TrTCM:
+    """Array of color-blind two-rate three-color meters (RFC 2698)."""
+
+    def __init__(self, size):
+        self.cir = np.full(size, np.inf)
+        self.pir = np.full(size, np.inf)
+        self.cbs = np.full(size, np.inf)
+        self.pbs = np.full(size, np.inf)
+        self.tc = np.full(size, np.inf)
+        self.tp = np.full(size, np.inf)
+        self.last = np.zeros(size)
+
+    def configure(self, index, cir, pir, cbs, pbs):
+        self.cir[index], self.pir[index] = cir, pir
+        self.cbs[index], self.pbs[index] = cbs, pbs
+        self.tc[index] = np.minimum(self.tc[index], cbs)
+        self.tp[index] = np.minimum(self.tp[index], pbs)
+
+    def execute(self, index, ts, size, epoch):
+        """Colors of packets (in arrival order) hitting meters index at ts."""
+        colors = np.full(len(index), GREEN, dtype=np.uint8)
+        if not len(index):
+            return colors
+        order = np.argsort(index, kind='stable')
+        idx = index[order]
+        t = ts[order] - epoch
+        s = size[order].astype(np.float64)
+        meters, start, counts = np.unique(idx, return_index=True, return_counts=True)
+        group = np.repeat(np.arange(len(meters)), counts)
+
+        limited = np.isfinite(self.pir[meters])
+        if not limited.any():
+            return colors
+
+        # buckets left at infinity are unprogrammed meters, always green
+        tp, last = self.tp[meters], self.last[meters] - epoch
+        tp[~limited], last[~limited] = 0, 0
+        pir = np.where(limited, self.pir[meters], 0)
+        pbs = np.where(limited, self.pbs[meters], 0)
+        nonred = police(group, start, counts, t, s, pir, pbs, tp, last)
+        nonred |= ~np.repeat(limited, counts)
+        self.tp[meters[limited]] = tp[limited]
+
+        # yellow and green packets are offered to the committed bucket
+        ok = np.flatnonzero(nonred)
+        c_meters, c_start, c_counts = np.unique(idx[ok], return_index=True, return_counts=True)
+        c_limited = np.isfinite(self.cir[c_meters])
+        green = np.ones(len(ok), dtype=bool)
+        if c_limited.any():
+            c_group = np.repeat(np.arange(len(c_meters)), c_counts)
+            tc, c_last = self.tc[c_meters], self.last[c_meters] - epoch
+            tc[~c_limited], c_last[~c_limited] = 0, 0
+            cir = np.where(c_limited, self.cir[c_meters], 0)
+            cbs = np.where(c_limited, self.cbs[c_meters], 0)
+            green = police(c_group, c_start, c_counts, t[ok], s[ok], cir, cbs, tc, c_last)
+            green |= ~np.repeat(c_limited, c_counts)
+            self.tc[c_meters[c_limited]] = tc[c_limited]
+
+        self.last[meters] = np.maximum(self.last[meters], (t[start + counts - 1]) + epoch)
+        sorted_colors = np.full(len(idx), RED, dtype=np.uint8)
+        sorted_colors[ok] = np.where(green, GREEN, YELLOW)
+        colors[order] = sorted_colors
+        return colors
+
+
+class IngressResult:
+    def __init__(self, n):
+        self.packets = n
+        self.outgoing = 0
+        self.incoming = 0
+        self.dark = 0
+        self.notifications = 0
+        self.mirrored = np.zeros(n, dtype=bool)
+        self.mirrored_packets = 0
+        self.mirrored_bytes = 0
+
+    def merge(self, other):
+        self.packets += other.packets
+        self.outgoing += other.outgoing
+        self.incoming += other.incoming
+        self.dark += other.dark
+        self.notifications += other.notifications
+        self.mirrored_packets += other.mirrored_packets
+        self.mirrored_bytes += other.mirrored_bytes
+
+
+class IngressModel:
+    """Ingress of darknet-norec.p4 on top of the fake_bfrt tables in info."""
+
+    # spec field names per unit and their scale to packets / bits
+    meter_specs = {
+        'pkts': (('$METER_SPEC_CIR_PPS', '$METER_SPEC_PIR_PPS', '$METER_SPEC_CBS_PKTS', '$METER_SPEC_PBS_PKTS'), 1),
+        'bytes': (('$METER_SPEC_CIR_KBPS', '$METER_SPEC_PIR_KBPS', '$METER_SPEC_CBS_KBITS', '$METER_SPEC_PBS_KBITS'), 1000),
+    }
+
+    def __init__(self, info, pipe=0):
+        self.pipe = pipe
+        self.ports_table = info.table_get('pipe.Ingress.ports')
+        self.monitored_table = info.table_get('pipe.Ingress.monitored')
+        self.flag_bank = info.table_get('pipe.Ingress.flag_bank')
+        self.flag_tables = [info.table_get('pipe.Ingress.flag_table0'), info.table_get('pipe.Ingress.flag_table1')]
+        self.summary_tables = [info.table_get('pipe.Ingress.summary_table0'), info.table_get('pipe.Ingress.summary_table1')]
+        self.global_table = info.table_get('pipe.Ingress.global_table')
+        self.active_digest = info.learn_get('pipe.IngressDeparser.active_digest')
+        # global and per-/24 meters, packet meters first then byte meters
+        self.meter_tables = [info.table_get('pipe.Ingress.dark_global_meter'),
+                             info.table_get('pipe.Ingress.dark_meter'),
+                             info.table_get('pipe.Ingress.dark_global_byte_meter'),
+                             info.table_get('pipe.Ingress.dark_byte_meter')]
+        self.meter_units = ['pkts', 'pkts', 'bytes', 'bytes']
+        self.meters = [TrTCM(t.info.size_get()) for t in self.meter_tables]
+        self.meter_versions = [None] * len(self.meter_tables)
+        self.lpm_version = None
+        self.epoch = None
+
+    def _registers(self, pipe):
+        # the live bank, as set by the controller
+        bank = self.flag_bank.default_entry.to_dict()['bank'] if self.flag_bank.default_entry is not None else 0
+        flags = self.flag_tables[bank].pipes[pipe]
+        summary = np.frombuffer(self.summary_tables[bank].pipes[pipe], dtype=np.uint8)
+        glob = self.global_table.pipes[pipe]
+        return flags, summary, glob
+
+    def _load_monitored(self):
+        entries = []
+        for key, data in self.monitored_table.entries.items():
+            _, prefix, length = key[0]
+            params = data.to_dict()
+            net = int(ipaddress.IPv4Address(prefix))
+            entries.append((length, net, params['base_idx'], params['mask'], params['dark_base_idx'],
+                            params.get('track_shift', 0), params.get('dark_shift', 8)))
+        # longest prefix first
+        entries.sort(reverse=True)
+        self.lpm = [(np.uint32((0xffffffff << (32 - l)) & 0xffffffff), np.uint32(net), base, mask, dark, track, dark_shift)
+                    for l, net, base, mask, dark, track, dark_shift in entries]
+        self.lpm_version = len(self.monitored_table.entries)
+
+    def lookup(self, addr):
+        """LPM on the monitored table: hit mask, global and dark indices."""
+        if self.lpm_version != len(self.monitored_table.entries):
+            self._load_monitored()
+        hit = np.zeros(len(addr), dtype=bool)
+        idx = np.zeros(len(addr), dtype=np.int64)
+        dark_idx = np.zeros(len(addr), dtype=np.int64)
+        for netmask, net, base, mask, dark, track_shift, dark_shift in self.lpm:
+            m = ~hit & ((addr & netmask) == net)
+            if not m.any():
+                continue
+            offset = (addr[m] & np.uint32(mask)).astype(np.int64)
+            idx[m] = base + (offset >> track_shift)
+            dark_idx[m] = dark + (offset >> dark_shift)
+            hit |= m
+        return hit, idx, dark_idx
+
+    def _load_meters(self):
+        for i, table in enumerate(self.meter_tables):
+            if self.meter_versions[i] == table.version:
+                continue
+            names, scale = self.meter_specs[self.meter_units[i]]
+            for key, data in table.entries.items():
+                spec = data.to_dict()
+                if names[1] not in spec:
+                    continue
+                self.meters[i].configure(key[0][1], *(float(spec[n]) * scale for n in names))
+            self.meter_versions[i] = table.version
+
+    def port_direction(self, port):
+        entry = self.ports_table.entries.get((('ig_intr_md.ingress_port', port, None),))
+        if entry is None:
+            return None
+        return 'incoming' if entry.action_name.endswith('set_incoming') else 'outgoing'
+
+    def process(self, batch, port=None):
+        """Run a PacketBatch through ingress.
+
+        With a port, every packet takes that port's ports-table action. Without
+        one, packets sourced from the monitored space are outgoing and the
+        ones destined to it are incoming.
+        """
+        n = len(batch)
+        result = IngressResult(n)
+        if not n:
+            return result
+        if self.epoch is None:
+            self.epoch = float(batch.ts[0])
+        ts = np.maximum.accumulate(batch.ts)
+        valid = batch.valid
+        pipe = self.pipe if port is None else port >> 7
+
+        if port is None:
+            src_hit, src_idx, src_dark = self.lookup(batch.src)
+            dst_hit, dst_idx, dst_dark = self.lookup(batch.dst)
+            outgoing = valid & src_hit
+            incoming = valid & ~src_hit & dst_hit
+            idx = np.where(outgoing, src_idx, dst_idx)
+            dark_idx = np.where(outgoing, src_dark, dst_dark)
+        else:
+            direction = self.port_direction(port)
+            if direction is None:
+                return result
+            addr = batch.dst if direction == 'incoming' else batch.src
+            hit, idx, dark_idx = self.lookup(addr)
+            incoming = valid & hit & (direction == 'incoming')
+            outgoing = valid & hit & (direction == 'outgoing')
+
+        flags, summary, glob = self._registers(pipe)
+        pos = np.arange(n)
+        out_pos = pos[outgoing]
+        out_idx = idx[outgoing]
+        touched, first = np.unique(out_idx, return_index=True)
+
+        # incoming packets see the registers as they were before the first
+        # outgoing packet of the same address in this batch
+        in_pos = pos[incoming]
+        in_idx = idx[incoming]
+        dark = (_bits(glob, in_idx) == 0) & (_bits(flags, in_idx) == 0)
+        if len(touched):
+            j = np.minimum(np.searchsorted(touched, in_idx), len(touched) - 1)
+            seen = (touched[j] == in_idx) & (out_pos[first[j]] < in_pos)
+            dark &= ~seen
+
+        result.outgoing = len(out_pos)
+        result.incoming = len(in_pos)
+        notified = touched[_bits(flags, touched) == 0]
+        result.notifications = len(notified)
+        if len(notified):
+            self.active_digest.push(*[(int(i),) for i in notified])
+        _set_bits(glob, touched)
+        _set_bits(flags, touched)
+        summary[dark_idx[outgoing]] = 1
+
+        dark_pos = in_pos[dark]
+        result.dark = len(dark_pos)
+        if len(dark_pos):
+            self._load_meters()
+            zeros = np.zeros(len(dark_pos), dtype=np.int64)
+            sizes = {'pkts': np.ones(len(dark_pos)),
+                     'bytes': batch.length[dark_pos].astype(np.float64) * 8}
+            green = np.ones(len(dark_pos), dtype=bool)
+            for i, meter in enumerate(self.meters):
+                index = zeros if i % 2 == 0 else dark_idx[dark_pos]
+                green &= meter.execute(index, ts[dark_pos], sizes[self.meter_units[i]], self.epoch) == GREEN
+            mirrored = dark_pos[green]
+            result.mirrored[mirrored] = True
+            result.mirrored_packets = len(mirrored)
+            result.mirrored_bytes = int(batch.length[mirrored].sum())
+        return result
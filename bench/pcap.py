@@ -0,0 +1,144 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Batched libpcap reader returning the IPv4 header fields the darknet
+# pipeline looks at as numpy arrays.
+
+import mmap
+import struct
+
+import numpy as np
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+
+MAGICS = {
+    0xa1b2c3d4: 1e-6,
+    0xa1b23c4d: 1e-9,
+}
+
+
+class PacketBatch:
+    """Column arrays for a batch of packets, in capture order."""
+
+    def __init__(self, ts, src, dst, proto, length, valid):
+        self.ts = ts
+        self.src = src
+        self.dst = dst
+        self.proto = proto
+        self.length = length
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, key):
+        return PacketBatch(self.ts[key], self.src[key], self.dst[key], self.proto[key],
+                           self.length[key], self.valid[key])
+
+
+def _be(buf, pos, width):
+    value = buf[pos].astype(np.uint32)
+    for i in range(1, width):
+        value = (value << 8) | buf[pos + i]
+    return value
+
+
+def read_pcap(path, batch_size=1 << 20):
+    """Yield PacketBatch objects of up to batch_size packets from path."""
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    buf = None
+    try:
+        magic_le, = struct.unpack_from('<I', mm, 0)
+        if magic_le in MAGICS:
+            endian, scale = '<', MAGICS[magic_le]
+        else:
+            magic_be, = struct.unpack_from('>I', mm, 0)
+            if magic_be not in MAGICS:
+                raise ValueError(f'{path}: not a pcap file')
+            endian, scale = '>', MAGICS[magic_be]
+        linktype, = struct.unpack_from(endian + 'I', mm, 20)
+        if linktype not in (LINKTYPE_ETHERNET, LINKTYPE_RAW):
+            raise ValueError(f'{path}: unsupported link type {linktype}')
+
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        record = struct.Struct(endian + 'IIII')
+        size = len(mm)
+        pos = 24
+        while pos + 16 <= size:
+            ts = []
+            offsets = []
+            caplens = []
+            lengths = []
+            while pos + 16 <= size and len(offsets) < batch_size:
+                sec, frac, incl_len, orig_len = record.unpack_from(mm, pos)
+                if pos + 16 + incl_len > size:
+                    pos = size
+                    break
+                ts.append(sec + frac * scale)
+                offsets.append(pos + 16)
+                caplens.append(incl_len)
+                lengths.append(orig_len)
+                pos += 16 + incl_len
+            if offsets:
+                yield _decode(buf, linktype, np.array(ts), np.array(offsets, dtype=np.int64),
+                              np.array(caplens, dtype=np.int64), np.array(lengths, dtype=np.uint32))
+    finally:
+        buf = None
+        mm.close()
+
+
+def _decode(buf, linktype, ts, off, caplen, orig_len):
+    last = len(buf) - 1
+    if linktype == LINKTYPE_ETHERNET:
+        ether_type = _be(buf, np.minimum(off + 12, last - 1), 2)
+        vlan = ether_type == ETHERTYPE_VLAN
+        ether_type = np.where(vlan, _be(buf, np.minimum(off + 16, last - 1), 2), ether_type)
+        ip = off + np.where(vlan, 18, 14)
+        valid = (ether_type == ETHERTYPE_IPV4) & (caplen >= ip - off + 20)
+    else:
+        ip = off
+        valid = caplen >= 20
+    ip = np.where(valid, ip, 0)
+    valid &= (buf[ip] >> 4) == 4
+
+    src = _be(buf, ip + 12, 4)
+    dst = _be(buf, ip + 16, 4)
+    proto = buf[ip + 9]
+    # frames truncated by the capture keep their original IP length
+    length = np.where(valid, _be(buf, ip + 2, 2) + (ip - off), orig_len).astype(np.uint32)
+    return PacketBatch(ts, src, dst, proto, length, valid)
@@ -0,0 +1,150 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Replays pcap files through the vectorized ingress model while the
+# unmodified Tofino LocalClient sweeps it every --interval minutes of trace
+# time.
+
+import os
+import sys
+import io
+import time
+import json
+import contextlib
+from argparse import ArgumentParser
+
+import numpy as np
+from tabulate import tabulate
+
+import fake_bfrt
+from ingress_model import IngressModel, IngressResult
+from pcap import read_pcap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'p4src-tofino', 'controller'))
+
+
+def main():
+    parser = ArgumentParser(description='Replay pcaps through a software model of the ingress pipeline.')
+    parser.add_argument('pcaps', nargs='+', help='pcap files, in time order')
+    parser.add_argument('--monitored', default=os.path.join(ROOT, 'p4src-tofino', 'input_files', 'monitored.txt'),
+                        type=str)
+    parser.add_argument('--port', default=None, type=int,
+                        help='ingress port of the trace; by default the direction is derived from the addresses')
+    parser.add_argument('--interval', default=3, type=float, help='minutes of trace time between sweeps')
+    parser.add_argument('--batch-size', default=1 << 20, type=int)
+    parser.add_argument('--global-table-size', default=4194304, type=int)
+    parser.add_argument('--dark-meter-size', default=16384, type=int)
+    parser.add_argument('--max-packet-rate', default=1174405, type=int)
+    parser.add_argument('--avg-packet-rate', default=343933, type=int)
+    parser.add_argument('--max-byte-rate', default=338102845, type=int)
+    parser.add_argument('--avg-byte-rate', default=17758683, type=int)
+    parser.add_argument('--alpha', default=1, type=int)
+    parser.add_argument('--outgoing', nargs='*', default=[1], type=int)
+    parser.add_argument('--incoming', nargs='*', default=[2], type=int)
+    parser.add_argument('--json', default=None, type=str, help='write per-sweep results to this file')
+    args = parser.parse_args()
+
+    info = fake_bfrt.install(global_table_size=args.global_table_size, dark_meter_size=args.dark_meter_size)
+    from controllertof import LocalClient
+
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        client = LocalClient(args.interval, args.global_table_size, args.dark_meter_size, args.alpha,
+                             args.monitored, {'incoming': args.incoming, 'outgoing': args.outgoing},
+                             args.max_packet_rate, args.max_byte_rate, args.avg_packet_rate, args.avg_byte_rate)
+    model = IngressModel(info)
+    interval = args.interval * 60
+
+    sweeps = []
+    totals = IngressResult(0)
+    window = IngressResult(0)
+    next_sweep = None
+    model_time = 0.0
+    start = time.perf_counter()
+
+    def sweep(trace_time):
+        sweep_start = time.perf_counter()
+        with contextlib.redirect_stdout(quiet):
+            for digest in fake_bfrt.pending_digests():
+                client.handle_digest(digest)
+            client.sweep()
+        with client.lock:
+            inactive = sum(1 for c in client.counters[:len(client.index_prefix_mapping)] if not c)
+        sweeps.append({
+            'trace_time': trace_time,
+            'packets': window.packets,
+            'outgoing': window.outgoing,
+            'incoming': window.incoming,
+            'dark': window.dark,
+            'mirrored': window.mirrored_packets,
+            'mirrored_bytes': window.mirrored_bytes,
+            'notifications': window.notifications,
+            'inactive': inactive,
+            'sweep_s': time.perf_counter() - sweep_start,
+        })
+
+    for path in args.pcaps:
+        for batch in read_pcap(path, args.batch_size):
+            if next_sweep is None:
+                next_sweep = float(batch.ts[0]) + interval
+            while len(batch):
+                cut = int(np.searchsorted(batch.ts, next_sweep))
+                part, batch = batch[:cut], batch[cut:]
+                t0 = time.perf_counter()
+                result = model.process(part, args.port)
+                model_time += time.perf_counter() - t0
+                window.merge(result)
+                totals.merge(result)
+                if len(batch):
+                    sweep(next_sweep)
+                    window = IngressResult(0)
+                    next_sweep += interval
+
+    elapsed = time.perf_counter() - start
+    print(tabulate([[f"{s['trace_time']:.0f}", s['packets'], s['outgoing'], s['incoming'], s['dark'],
+                     s['mirrored'], s['notifications'], s['inactive'], f"{s['sweep_s']:.3f}"] for s in sweeps],
+                   headers=['trace time', 'packets', 'outgoing', 'incoming', 'dark', 'mirrored',
+                            'notifications', 'inactive', 'sweep (s)']))
+    print(f'{totals.packets} packets in {elapsed:.1f}s ({totals.packets / max(model_time, 1e-9) / 1e6:.2f} Mpps '
+          f'in the model), {len(sweeps)} sweeps')
+    print(f'{totals.dark} dark, {totals.mirrored_packets} mirrored ({totals.mirrored_bytes} bytes)')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(sweeps, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,451 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Collector for the truncated dark-traffic copies the data plane mirrors to
+# LOG_PORT. Rotating pcap files of that port are memory-mapped and, since the
+# mirror session truncates every copy to the same length, mostly parsed as
+# fixed-stride arrays of records straight into numpy columns.
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import mmap
+import struct
+import logging
+import ipaddress
+from argparse import ArgumentParser
+
+import numpy as np
+
+MAGIC_US = 0xa1b2c3d4
+MAGIC_NS = 0xa1b23c4d
+GLOBAL_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+# Ethernet + IPv4 without options
+MIN_RECORD_LEN = 34
+# equally long records decoded as one strided array, see PcapStream._bulk
+MIN_RUN = 64
+
+
+class Records:
+    """Columns of a batch of mirrored packets."""
+    fields = ('ts', 'src', 'dst', 'proto', 'sport', 'dport', 'length')
+
+    def __init__(self, ts, src, dst, proto, sport, dport, length):
+        self.ts = ts            # int64, ns since the epoch
+        self.src = src          # uint32
+        self.dst = dst          # uint32
+        self.proto = proto      # uint8
+        self.sport = sport      # uint16, 0 if not captured
+        self.dport = dport      # uint16, 0 if not captured
+        self.length = length    # uint16, IPv4 total length of the original packet
+
+    def __len__(self):
+        return len(self.ts)
+
+    @classmethod
+    def empty(cls):
+        return cls(*(np.zeros(0, dtype=d) for d in
+                     (np.int64, np.uint32, np.uint32, np.uint8, np.uint16, np.uint16, np.uint16)))
+
+
+def _record_dtype(endian, stride, vlan):
+    ip = RECORD_HEADER_LEN + 14 + (4 if vlan else 0)
+    names = ['sec', 'frac', 'incl_len', 'ether_type', 'vihl', 'total_len', 'proto', 'src', 'dst']
+    formats = [endian + 'u4', endian + 'u4', endian + 'u4', '>u2', 'u1', '>u2', 'u1', '>u4', '>u4']
+    offsets = [0, 4, 8, RECORD_HEADER_LEN + 12 + (4 if vlan else 0), ip, ip + 2, ip + 9, ip + 12, ip + 16]
+    if stride >= ip + 24:
+        names += ['sport', 'dport']
+        formats += ['>u2', '>u2']
+        offsets += [ip + 20, ip + 22]
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': stride})
+
+
+class PcapStream:
+    """Incremental reader of one (possibly still growing) pcap file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.endian = None
+        self.scale = None
+        self.stride = None
+        self.records = 0
+        self.irregular = 0
+
+    def _header(self, mm):
+        magic, = struct.unpack_from('<I', mm, 0)
+        if magic in (MAGIC_US, MAGIC_NS):
+            self.endian = '<'
+        else:
+            magic, = struct.unpack_from('>I', mm, 0)
+            if magic not in (MAGIC_US, MAGIC_NS):
+                raise ValueError(f'{self.path}: not a pcap file')
+            self.endian = '>'
+        self.scale = 1000 if magic == MAGIC_US else 1
+        linktype, = struct.unpack_from(self.endian + 'I', mm, 20)
+        if linktype != 1:
+            raise ValueError(f'{self.path}: link type {linktype} is not Ethernet')
+        self.offset = GLOBAL_HEADER_LEN
+
+    def read(self, batch_size=1 << 21):
+        """Yield Records for every complete record appended since the last call."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size <= max(self.offset, GLOBAL_HEADER_LEN):
+            return
+        with open(self.path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        try:
+            if self.endian is None:
+                self._header(mm)
+            while self.offset + RECORD_HEADER_LEN <= size:
+                incl_len, = struct.unpack_from(self.endian + 'I', mm, self.offset + 8)
+                stride = RECORD_HEADER_LEN + incl_len
+                if self.offset + stride > size:
+                    break
+                records = self._bulk(mm, size, stride, batch_size)
+                if records is None:
+                    records = self._walk(mm, size, batch_size)
+                yield records
+        finally:
+            mm.close()
+
+    def _bulk(self, mm, size, stride, batch_size):
+        # records from self.offset that share the first one's length, None
+        # if they are less than MIN_RUN: the lengths vary, see _walk.
+        # Headers are checked in growing chunks, so that a short run does not
+        # cost a scan of the rest of the file.
+        limit = min((size - self.offset) // stride, batch_size)
+        count, chunk = 0, MIN_RUN
+        while count < limit:
+            n = min(chunk, limit - count)
+            header = np.ndarray((n,), dtype=np.dtype(self.endian + 'u4'), buffer=mm,
+                                offset=self.offset + count * stride + 8, strides=(stride,))
+            mismatch = np.flatnonzero(header != stride - RECORD_HEADER_LEN)
+            del header
+            if len(mismatch):
+                count += int(mismatch[0])
+                break
+            count += n
+            chunk *= 2
+        if count < min(MIN_RUN, limit):
+            return None
+        self._lengths(np.array([stride - RECORD_HEADER_LEN]))
+        records = self._decode(mm, count, stride) if stride >= RECORD_HEADER_LEN + MIN_RECORD_LEN \
+            else Records.empty()
+        self.offset += count * stride
+        self.records += count
+        return records
+
+    def _walk(self, mm, size, batch_size):
+        # records of varying lengths: their offsets are found one header at
+        # a time, up to the next run of MIN_RUN equal lengths, and they are
+        # decoded together
+        fmt = self.endian + 'I'
+        offsets, lengths = [], []
+        offset, run = self.offset, 0
+        while len(offsets) < batch_size and offset + RECORD_HEADER_LEN <= size:
+            incl_len, = struct.unpack_from(fmt, mm, offset + 8)
+            if offset + RECORD_HEADER_LEN + incl_len > size:
+                break
+            run = run + 1 if lengths and incl_len == lengths[-1] else 1
+            if run == MIN_RUN:
+                # left to _bulk
+                del offsets[-(run - 1):], lengths[-(run - 1):]
+                break
+            offsets.append(offset)
+            lengths.append(incl_len)
+            offset += RECORD_HEADER_LEN + incl_len
+        lengths = np.array(lengths, dtype=np.int64)
+        self._lengths(lengths)
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        try:
+            records = self._decode_at(buf, np.array(offsets, dtype=np.int64), lengths)
+        finally:
+            del buf
+        self.offset = offsets[-1] + RECORD_HEADER_LEN + int(lengths[-1])
+        self.records += len(offsets)
+        return records
+
+    def _lengths(self, lengths):
+        # records whose length differs from the one before
+        if self.stride is not None:
+            self.irregular += int(lengths[0] + RECORD_HEADER_LEN != self.stride)
+        self.irregular += int(np.count_nonzero(np.diff(lengths)))
+        self.stride = int(lengths[-1]) + RECORD_HEADER_LEN
+
+    def _decode_at(self, buf, offsets, lengths):
+        # same as _decode for records at the given offsets, the fields are
+        # gathered from the bytes of the file
+
+        def field(pos, fmt, present):
+            dtype = np.dtype(fmt)
+            pos = np.where(present, pos, 0)
+            return buf[pos[:, None] + np.arange(dtype.itemsize)].copy().view(dtype).reshape(-1)
+
+        eth = offsets + RECORD_HEADER_LEN
+        ether_type = field(eth + 12, '>u2', lengths >= 14)
+        tagged = (ether_type == ETHERTYPE_VLAN) & (lengths >= MIN_RECORD_LEN + 4)
+        ether_type = np.where(tagged, field(eth + 16, '>u2', tagged), ether_type)
+        ip = eth + 14 + 4 * tagged
+        ip_len = lengths - (ip - eth)
+        present = ip_len >= MIN_RECORD_LEN - 14
+        vihl = field(ip, 'u1', present)
+        valid = present & (ether_type == ETHERTYPE_IPV4) & ((vihl >> 4) == 4)
+        # ports are only where we expect them without IP options
+        plain = valid & ((vihl & 0xf) == 5) & (ip_len >= 24)
+        sport = np.where(plain, field(ip + 20, '>u2', plain), 0).astype(np.uint16)
+        dport = np.where(plain, field(ip + 22, '>u2', plain), 0).astype(np.uint16)
+        ts = field(offsets, self.endian + 'u4', True).astype(np.int64) * 1000000000 \
+            + field(offsets + 4, self.endian + 'u4', True).astype(np.int64) * self.scale
+        return Records(ts[valid], field(ip + 12, '>u4', valid)[valid], field(ip + 16, '>u4', valid)[valid],
+                       field(ip + 9, 'u1', valid)[valid], sport[valid], dport[valid],
+                       field(ip + 2, '>u2', valid)[valid])
+
+    def _decode(self, mm, count, stride):
+        rec = np.ndarray((count,), dtype=_record_dtype(self.endian, stride, False), buffer=mm,
+                         offset=self.offset)
+        ether_type = rec['ether_type']
+        tagged = ether_type == ETHERTYPE_VLAN
+        if tagged.any() and stride >= RECORD_HEADER_LEN + MIN_RECORD_LEN + 4:
+            vrec = np.ndarray((count,), dtype=_record_dtype(self.endian, stride, True), buffer=mm,
+                              offset=self.offset)
+            pick = lambda name: np.where(tagged, vrec[name], rec[name])
+            ether_type = np.where(tagged, vrec['ether_type'], ether_type)
+        else:
+            pick = lambda name: rec[name].copy()
+        valid = (ether_type == ETHERTYPE_IPV4) & ((pick('vihl') >> 4) == 4)
+        # ports are only where we expect them without IP options
+        plain = valid & ((pick('vihl') & 0xf) == 5)
+        names = rec.dtype.names
+        sport = np.where(plain, pick('sport'), 0).astype(np.uint16) if 'sport' in names \
+            else np.zeros(count, dtype=np.uint16)
+        dport = np.where(plain, pick('dport'), 0).astype(np.uint16) if 'dport' in names \
+            else np.zeros(count, dtype=np.uint16)
+        ts = rec['sec'].astype(np.int64) * 1000000000 + rec['frac'].astype(np.int64) * self.scale
+        records = Records(ts[valid], pick('src')[valid], pick('dst')[valid], pick('proto')[valid],
+                          sport[valid], dport[valid], pick('total_len')[valid])
+        del rec
+        return records
+
+
+class Aggregates:
+    """Running packet/byte counters keyed by an integer (a /24 or a source)."""
+
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.uint32)
+        self.packets = np.zeros(0, dtype=np.int64)
+        self.bytes = np.zeros(0, dtype=np.int64)
+        self.first = np.zeros(0, dtype=np.int64)
+        self.last = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, keys, length, ts):
+        if not len(keys):
+            return
+        # records arrive in time order, so the first occurrence gives the
+        # first time seen; the last time seen is the latest of each key
+        batch, index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        packets = np.bincount(inverse, minlength=len(batch))
+        size = np.bincount(inverse, weights=length, minlength=len(batch)).astype(np.int64)
+        first = ts[index]
+        last = np.zeros(len(batch), dtype=np.int64)
+        np.maximum.at(last, inverse, ts)
+
+        merged, inverse = np.unique(np.concatenate([self.keys, batch]), return_inverse=True)
+        old, new = inverse[:len(self.keys)], inverse[len(self.keys):]
+        out_packets = np.zeros(len(merged), dtype=np.int64)
+        out_bytes = np.zeros(len(merged), dtype=np.int64)
+        out_first = np.full(len(merged), np.iinfo(np.int64).max)
+        out_last = np.zeros(len(merged), dtype=np.int64)
+        out_packets[old], out_bytes[old] = self.packets, self.bytes
+        out_first[old], out_last[old] = self.first, self.last
+        out_packets[new] += packets
+        out_bytes[new] += size
+        out_first[new] = np.minimum(out_first[new], first)
+        out_last[new] = np.maximum(out_last[new], last)
+        self.keys, self.packets, self.bytes = merged, out_packets, out_bytes
+        self.first, self.last = out_first, out_last
+
+    def top(self, n, by='packets'):
+        order = np.argsort(-getattr(self, by), kind='stable')[:n]
+        return [(int(self.keys[i]), int(self.packets[i]), int(self.bytes[i]),
+                 int(self.first[i]), int(self.last[i])) for i in order]
+
+
+class Collector:
+    def __init__(self):
+        self.per_subnet = Aggregates()
+        self.per_source = Aggregates()
+        self.packets = 0
+        self.bytes = 0
+
+    def add(self, records):
+        if not len(records):
+            return
+        length = records.length.astype(np.int64)
+        self.per_subnet.add(records.dst >> 8, length, records.ts)
+        self.per_source.add(records.src, length, records.ts)
+        self.packets += len(records)
+        self.bytes += int(length.sum())
+
+    def report(self, top=20):
+        fmt = lambda rows, to_str: [{'key': to_str(k), 'packets': p, 'bytes': b,
+                                     'first_seen': f / 1e9, 'last_seen': l / 1e9} for k, p, b, f, l in rows]
+        return {
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'subnets': len(self.per_subnet),
+            'sources': len(self.per_source),
+            'top_subnets': fmt(self.per_subnet.top(top), lambda k: f'{ipaddress.IPv4Address(k << 8)}/24'),
+            'top_sources': fmt(self.per_source.top(top), lambda k: str(ipaddress.IPv4Address(k))),
+        }
+
+
+def _natural_key(path):
+    return [int(x) if x.isdigit() else x for x in re.split(r'(\d+)', path)]
+
+
+def rotated_files(pattern):
+    """Files of a rotation set (tcpdump -C/-G), oldest first."""
+    return sorted(glob.glob(pattern), key=lambda p: (os.path.getmtime(p), _natural_key(p)))
+
+
+def collect(pattern, collector, follow=False, poll=1.0, report_interval=60, on_report=None):
+    done = set()
+    current = None
+    last_report = time.monotonic()
+    while True:
+        files = [p for p in rotated_files(pattern) if p not in done]
+        if current is None and files:
+            current = PcapStream(files[0])
+        if current is not None:
+            for records in current.read():
+                collector.add(records)
+            # a newer file means the current one is complete
+            if len(files) > 1 or not follow:
+                for records in current.read():
+                    collector.add(records)
+                done.add(current.path)
+                current = None
+                continue
+        elif not follow:
+            break
+        if on_report is not None and time.monotonic() - last_report >= report_interval:
+            on_report(collector)
+            last_report = time.monotonic()
+        time.sleep(poll)
+    if on_report is not None:
+        on_report(collector)
+
+
+def write_synthetic(path, count, monitored='10.0.0.0/16', sources=5000, caplen=38, seed=1, start=None):
+    """Write a pcap of mirrored dark packets truncated to caplen bytes."""
+    rng = np.random.default_rng(seed)
+    net = ipaddress.IPv4Network(monitored)
+    start = time.time() if start is None else start
+    ts = start + np.sort(rng.uniform(0, max(count / 1e6, 1), count))
+    stride = RECORD_HEADER_LEN + caplen
+    rec = np.zeros(count, dtype=_record_dtype('<', stride, False))
+    raw = rec.view(np.uint8).reshape(count, stride)
+    rec['sec'] = ts.astype(np.uint32)
+    rec['frac'] = ((ts % 1) * 1e6).astype(np.uint32)
+    rec['incl_len'] = caplen
+    raw[:, 12:16] = np.frombuffer(struct.pack('<I', 60), dtype=np.uint8)
+    rec['ether_type'] = ETHERTYPE_IPV4
+    rec['vihl'] = 0x45
+    rec['total_len'] = rng.choice([40, 44, 52, 60, 576, 1500], size=count, p=[.5, .2, .1, .1, .05, .05])
+    rec['proto'] = rng.choice([6, 17, 1], size=count, p=[.8, .15, .05])
+    scanners = rng.integers(0x01000000, 0xdf000000, sources, dtype=np.int64).astype(np.uint32)
+    rec['src'] = scanners[np.minimum(rng.zipf(1.3, count) - 1, sources - 1)]
+    rec['dst'] = int(net.network_address) + rng.integers(0, net.num_addresses, count)
+    if 'sport' in rec.dtype.names:
+        rec['sport'] = rng.integers(1024, 65535, count)
+        rec['dport'] = rng.choice([22, 23, 80, 443, 445, 3389, 8080], size=count)
+    ip_ttl = RECORD_HEADER_LEN + 14 + 8
+    raw[:, ip_ttl] = 64
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', MAGIC_US, 2, 4, 0, 0, 65535, 1))
+        f.write(rec.tobytes())
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level="INFO",
+                        format="%(asctime)s|%(levelname)s: %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+
+    parser = ArgumentParser(description='Aggregate the LOG_PORT mirror stream from rotating pcap files.')
+    parser.add_argument('pattern', help="pcap file or glob of a rotation set, e.g. 'log/dark.pcap*'")
+    parser.add_argument('--follow', action='store_true', help='keep reading files as they grow and rotate')
+    parser.add_argument('--poll', default=1.0, type=float)
+    parser.add_argument('--report-interval', default=60, type=float)
+    parser.add_argument('--top', default=20, type=int)
+    parser.add_argument('--output', default=None, type=str, help='write the report as JSON to this file')
+    parser.add_argument('--synthetic', default=0, type=int,
+                        help='write this many synthetic records to <pattern> and exit')
+    parser.add_argument('--synthetic-prefix', default='10.0.0.0/16', type=str)
+    parser.add_argument('--caplen', default=38, type=int)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        write_synthetic(args.pattern, args.synthetic, args.synthetic_prefix, caplen=args.caplen)
+        sys.exit(0)
+
+    def on_report(collector):
+        report = collector.report(args.top)
+        logging.info(f"{report['packets']} packets, {report['bytes']} bytes, "
+                     f"{report['subnets']} /24s, {report['sources']} sources")
+        if args.output:
+            with open(args.output + '.tmp', 'w') as f:
+                json.dump(report, f, indent=2)
+            os.replace(args.output + '.tmp', args.output)
+        else:
+            for row in report['top_subnets']:
+                print(f"{row['key']:<20}{row['packets']:>12}{row['bytes']:>14}")
+
+    collector = Collector()
+    start = time.perf_counter()
+    collect(args.pattern, collector, args.follow, args.poll, args.report_interval, on_report)
+    elapsed = time.perf_counter() - start
+    logging.info(f'{collector.packets} packets in {elapsed:.2f}s ({collector.packets / max(elapsed, 1e-9) / 1e6:.2f} Mpps)')
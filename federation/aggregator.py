@@ -0,0 +1,236 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Federation of the per-switch controllers: polls the compact /state of every
+# controller, merges them with interval arithmetic on address ranges and
+# serves the same /inactive API over the union. An address is inactive if it
+# is monitored somewhere and active nowhere, like the flags OR-ed across
+# switches in the bmv2 controller.
+
+import os
+import sys
+import time
+import zlib
+import base64
+import logging
+import ipaddress
+import threading
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from flask import Flask, jsonify, request, Response
+from flask_cors import CORS
+
+# interval arithmetic shared with the Tofino controller
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sweep'))
+from intervals import EMPTY, union, difference, clip, to_prefixes
+
+
+def state_intervals(state):
+    """Monitored and active address intervals of a controller's /state."""
+    inactive = np.frombuffer(zlib.decompress(base64.b64decode(state['inactive'])), dtype=np.uint8)
+    monitored = [], []
+    active = [], []
+    for prefix, track_len, base_idx in state['monitored']:
+        net = ipaddress.IPv4Network(prefix)
+        start, shift = int(net.network_address), 32 - track_len
+        size = net.num_addresses >> shift
+        monitored[0].append(start)
+        monitored[1].append(start + net.num_addresses)
+        # runs of active blocks
+        bits = np.zeros(size + 2, dtype=np.int8)
+        bits[1:-1] = inactive[base_idx:base_idx + size] == 0
+        edges = np.flatnonzero(np.diff(bits))
+        active[0].append(start + (edges[::2].astype(np.int64) << shift))
+        active[1].append(start + (edges[1::2].astype(np.int64) << shift))
+    monitored = union(np.array(monitored[0], dtype=np.int64), np.array(monitored[1], dtype=np.int64))
+    if not active[0]:
+        return monitored, EMPTY
+    return monitored, union(np.concatenate(active[0]), np.concatenate(active[1]))
+
+
+class Upstream:
+    """Last known state of one controller."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        self.epoch = None
+        self.swept = None
+        self.switch = None
+        self.monitored = EMPTY
+        self.active = EMPTY
+        self.last_ok = None
+        self.last_error = None
+
+    def poll(self, timeout):
+        """Fetch the state if it changed; True when it did."""
+        params = {} if self.epoch is None else {'since': self.epoch}
+        try:
+            res = self.session.get(f'{self.url}/state', params=params, timeout=timeout)
+            if res.status_code == 304:
+                self.last_ok = time.time()
+                return False
+            res.raise_for_status()
+            state = res.json()
+            self.monitored, self.active = state_intervals(state)
+        except (requests.RequestException, ValueError, zlib.error) as e:
+            if self.last_error is None:
+                logging.warning(f'{self.url}: {e}, serving its last known state')
+            self.last_error = str(e)
+            return False
+        if self.last_error is not None:
+            logging.info(f'{self.url}: back')
+        self.epoch, self.swept, self.switch = state['epoch'], state['swept'], state['switch']
+        self.last_ok = time.time()
+        self.last_error = None
+        return True
+
+    def freshness(self, stale_after):
+        age = None if self.last_ok is None else time.time() - self.last_ok
+        return {
+            'url': self.url,
+            'switch': self.switch,
+            'epoch': self.epoch,
+            'swept': self.swept,
+            'age': age,
+            'stale': age is None or age > stale_after,
+            'error': self.last_error,
+        }
+
+
+class Aggregator:
+    def __init__(self, urls, poll_interval=10, timeout=5, stale_after=None):
+        self.upstreams = [Upstream(url) for url in urls]
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.stale_after = stale_after or 3 * poll_interval
+        self.pool = ThreadPoolExecutor(max_workers=len(self.upstreams), thread_name_prefix='poll')
+        self.lock = threading.Lock()
+        self.inactive = EMPTY
+        self.version = 0
+        self._all = None
+
+    def poll(self):
+        changed = list(self.pool.map(lambda u: u.poll(self.timeout), self.upstreams))
+        if any(changed):
+            self.merge()
+
+    def merge(self):
+        # monitored anywhere and active nowhere
+        monitored = union(np.concatenate([u.monitored[0] for u in self.upstreams]),
+                          np.concatenate([u.monitored[1] for u in self.upstreams]))
+        active = union(np.concatenate([u.active[0] for u in self.upstreams]),
+                       np.concatenate([u.active[1] for u in self.upstreams]))
+        inactive = difference(monitored, active)
+        with self.lock:
+            self.inactive = inactive
+            self.version += 1
+            self._all = None
+
+    def run(self):
+        while True:
+            start = time.time()
+            self.poll()
+            time.sleep(max(0, self.poll_interval - (time.time() - start)))
+
+    def get_inactive_prefixes(self, covering_prefix=None):
+        with self.lock:
+            inactive, version, cached = self.inactive, self.version, self._all
+        if covering_prefix is None:
+            if cached is None or cached[0] != version:
+                cached = (version, to_prefixes(inactive))
+                with self.lock:
+                    if self.version == version:
+                        self._all = cached
+            return cached[1]
+        net = ipaddress.IPv4Network(covering_prefix, strict=False)
+        return to_prefixes(clip(inactive, int(net.network_address), int(net.broadcast_address) + 1))
+
+    def stale(self):
+        return [u.url for u in self.upstreams if u.freshness(self.stale_after)['stale']]
+
+    def freshness(self):
+        return [u.freshness(self.stale_after) for u in self.upstreams]
+
+
+app = Flask(__name__)
+CORS(app)
+aggregator = None
+
+
+@app.route('/')
+def hello():
+    return 'Hi, I am alive!'
+
+
+@app.route('/inactive', methods=['GET'])
+def getInactivePrefixes():
+    prefix = request.args.get('prefix')
+    if prefix is not None:
+        try:
+            ipaddress.IPv4Network(prefix.strip(), strict=False)
+        except ValueError:
+            return Response(status=400)
+        prefix = prefix.strip()
+    inactive_prefixes_list = aggregator.get_inactive_prefixes(prefix)
+    return jsonify(inactive_prefixes=inactive_prefixes_list, stale=aggregator.stale()), 200
+
+
+@app.route('/upstreams', methods=['GET'])
+def getUpstreams():
+    return jsonify(upstreams=aggregator.freshness()), 200
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level="INFO",
+                        format="%(asctime)s|%(levelname)s: %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+
+    parser = ArgumentParser(description='Serve /inactive over the union of several controllers.')
+    parser.add_argument('upstreams', nargs='+', help='controller base URLs, e.g. http://tofino1:2002')
+    parser.add_argument('--poll', default=10, type=float, help='seconds between state polls')
+    parser.add_argument('--timeout', default=5, type=float)
+    parser.add_argument('--stale-after', default=None, type=float,
+                        help='seconds without a successful poll before an upstream is reported stale')
+    parser.add_argument('--host', default='0.0.0.0', type=str)
+    parser.add_argument('--port', default=2003, type=int)
+    args = parser.parse_args()
+
+    aggregator = Aggregator(args.upstreams, args.poll, args.timeout, args.stale_after)
+    aggregator.poll()
+    threading.Thread(target=aggregator.run, name='poll', daemon=True).start()
+    app.run(host=args.host, port=args.port, threaded=True)
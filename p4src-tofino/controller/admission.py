@@ -0,0 +1,124 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Admission control for the expensive API queries (/inactive, /state,
+# /history, /whatif): they run in a small pool instead of on the Flask
+# threads, each client has a bounded number of them in flight, a full queue
+# is answered with 503 and Retry-After, and a query that has not started by
+# its deadline is dropped. While a sweep runs, fewer queries run at once, so
+# that a burst of them does not push it past its interval.
+
+import math
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+# seconds between two looks at the sweep state for a query waiting its turn
+POLL = 0.1
+
+
+class Busy(Exception):
+    """Query refused, HTTP status and seconds before retrying."""
+
+    def __init__(self, status, description, retry_after):
+        super().__init__(description)
+        self.status = status
+        self.description = description
+        self.retry_after = retry_after
+
+
+class Admission:
+    def __init__(self, workers=2, per_client=2, max_queue=16, deadline=30, idle=None, sweep_workers=1):
+        self.workers = workers
+        self.per_client = per_client
+        self.max_queue = max_queue
+        self.deadline = deadline
+        # set while no sweep is running, only sweep_workers queries run otherwise
+        self.idle = idle
+        self.sweep_workers = min(sweep_workers, workers)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='query')
+        self.lock = threading.Lock()
+        self.turn = threading.Condition()
+        self.running = 0
+        self.pending = 0            # queued or running
+        self.clients = Counter()    # client -> queued or running
+        self.retry_after = max(1, math.ceil(deadline))
+
+    def run(self, client, fn):
+        """fn() in the pool on behalf of client, raises Busy if refused."""
+        with self.lock:
+            if self.clients[client] >= self.per_client:
+                raise Busy(429, f'more than {self.per_client} queries in progress', self.retry_after)
+            if self.pending >= self.workers + self.max_queue:
+                raise Busy(503, 'too many queries in progress', self.retry_after)
+            self.pending += 1
+            self.clients[client] += 1
+        deadline = time.monotonic() + self.deadline
+        future = self.pool.submit(self._job, fn, deadline)
+        # a query keeps its slot until it is done, even once its client gave up
+        future.add_done_callback(lambda f: self._release(client))
+        try:
+            return future.result(timeout=self.deadline)
+        except TimeoutError:
+            future.cancel()
+            raise Busy(503, 'query deadline exceeded', self.retry_after)
+
+    def _limit(self):
+        return self.workers if self.idle is None or self.idle.is_set() else self.sweep_workers
+
+    def _job(self, fn, deadline):
+        # the sweep goes first, queries do not start after their deadline
+        with self.turn:
+            while self.running >= self._limit():
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self.turn.wait(min(left, POLL))
+            if time.monotonic() >= deadline:
+                raise Busy(503, 'query deadline exceeded', self.retry_after)
+            self.running += 1
+        try:
+            return fn()
+        finally:
+            with self.turn:
+                self.running -= 1
+                self.turn.notify()
+
+    def _release(self, client):
+        with self.lock:
+            self.pending -= 1
+            self.clients[client] -= 1
+            if not self.clients[client]:
+                del self.clients[client]
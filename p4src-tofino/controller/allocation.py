@@ -0,0 +1,148 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+import json
+from collections import namedtuple
+
+# capacities of one switch, defaults are those of darknet-norec.p4
+Switch = namedtuple('Switch', ['name', 'grpc_addr', 'global_table_size', 'dark_meter_size', 'monitored_size'],
+                    defaults=['localhost:50052', 4194304, 16384, 1024])
+
+
+def load_switches(path):
+    """Read a JSON list of switches, see Switch for the fields."""
+    with open(path, 'r') as f:
+        return [Switch(**sw) for sw in json.load(f)]
+
+
+def entry_cost(entry):
+    # register entries and dark meters taken by (ipnet, track_len, dark_len)
+    ipnet, track_len, dark_len = entry
+    return 2**(track_len - ipnet.prefixlen), 2**(dark_len - ipnet.prefixlen)
+
+
+def split_entry(entry):
+    ipnet, track_len, dark_len = entry
+    # a half still needs whole dark blocks
+    if ipnet.prefixlen >= dark_len:
+        return None
+    return [(half, track_len, dark_len) for half in ipnet.subnets(prefixlen_diff=1)]
+
+
+def plan_allocation(entries, switches):
+    """Place monitored (ipnet, track_len, dark_len) entries on switches.
+
+    Entries are halved until none is over a quarter of the smallest
+    switch's share of the total. Walking them in address order, each switch
+    is filled up to its share (in proportion to its register size) before
+    moving on to the next one, halving again whatever does not fit. Halves
+    that end up on the same switch are joined again. Returns {switch name:
+    entries} in address order, so each switch gets contiguous indices for
+    neighbouring prefixes.
+    """
+    if not switches:
+        raise ValueError('no switches to allocate on')
+    capacity = sum(sw.global_table_size for sw in switches)
+    total = sum(entry_cost(e)[0] for e in entries)
+    if total > capacity:
+        raise ValueError(f'{total} register entries needed, {capacity} available')
+    dark_capacity = sum(sw.dark_meter_size for sw in switches)
+    dark_total = sum(entry_cost(e)[1] for e in entries)
+    if dark_total > dark_capacity:
+        raise ValueError(f'{dark_total} dark meters needed, {dark_capacity} available')
+
+    # granularity of the balancing, at the cost of a few more table entries
+    share = min(sw.global_table_size for sw in switches) * total / capacity / 4
+    pending = list(entries)
+    pieces = []
+    while pending:
+        entry = pending.pop()
+        halves = split_entry(entry) if entry_cost(entry)[0] > share else None
+        if halves:
+            pending.extend(halves)
+        else:
+            pieces.append(entry)
+    pieces.sort(key=lambda e: e[0])
+
+    used = {sw.name: [0, 0, 0] for sw in switches}
+    plan = {sw.name: [] for sw in switches}
+
+    def fits(sw, size, dark):
+        return used[sw.name][0] + size <= sw.global_table_size \
+            and used[sw.name][1] + dark <= sw.dark_meter_size \
+            and used[sw.name][2] < sw.monitored_size
+
+    current = 0
+    while pieces:
+        entry = pieces.pop(0)
+        size, dark = entry_cost(entry)
+        target = switches[current].global_table_size * total / capacity
+        # move on once this entry would overshoot the share by more than half
+        filled = used[switches[current].name][0]
+        if current < len(switches) - 1 and filled and filled + size / 2 > target:
+            current += 1
+        candidates = [sw for sw in switches[current:] + switches[:current] if fits(sw, size, dark)]
+        if not candidates:
+            halves = split_entry(entry)
+            if not halves:
+                raise ValueError(f'{entry[0]} does not fit on any switch')
+            pieces[:0] = halves
+            continue
+        sw = candidates[0]
+        used[sw.name][0] += size
+        used[sw.name][1] += dark
+        used[sw.name][2] += 1
+        plan[sw.name].append(entry)
+
+    return {name: join_entries(sorted(plan[name], key=lambda e: e[0])) for name in plan}
+
+
+def join_entries(entries):
+    # entries sorted by address, siblings are then next to each other
+    joined = []
+    for entry in entries:
+        joined.append(entry)
+        while len(joined) > 1:
+            (a, track_a, dark_a), (b, track_b, dark_b) = joined[-2:]
+            if (track_a, dark_a) != (track_b, dark_b) or a.prefixlen != b.prefixlen or a.prefixlen == 0 \
+                    or a.supernet() != b.supernet() or a == b:
+                break
+            joined[-2:] = [(a.supernet(), track_a, dark_a)]
+    return joined
+
+
+def format_entry(entry):
+    # back to a monitored.txt line
+    ipnet, track_len, dark_len = entry
+    return f'{ipnet} {track_len} {dark_len}'
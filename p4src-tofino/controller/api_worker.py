@@ -0,0 +1,152 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# API workers: separate processes answering /inactive and /state from the
+# snapshot the controller publishes in shared memory (snapshot.py), so that
+# queries neither wait for nor slow down the sweep. They share one listening
+# socket, the kernel spreads the connections over them.
+#
+#   python3 app.py --api-workers 4 [--api-port 2004] [--snapshot morp4]
+#   python3 api_worker.py --snapshot morp4 --port 2004 --workers 4
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import ipaddress
+import subprocess
+from argparse import ArgumentParser
+from flask import Flask, request, Response
+from flask_cors import CORS
+from werkzeug.serving import make_server
+from werkzeug.exceptions import HTTPException
+from snapshot import SnapshotReader
+from conditional import make_etag, conditional_json
+
+app = Flask(__name__)
+CORS(app)
+reader = None
+
+@app.route('/')
+def hello():
+    return 'Hi, I am alive!'
+
+# return inactive IPv4 prefixes, IPv6 and ages are only served by the controller.
+# Same ETags as the controller's, for the same state
+@app.route('/inactive', methods=['GET'])
+def getInactivePrefixes():
+    prefix = request.args.get('prefix')
+    if 'min_age' in request.args or 'max_age' in request.args:
+        return Response(status=400)
+    try:
+        if prefix is not None:
+            prefix = prefix.strip()
+            ipaddress.IPv4Network(prefix, strict=False)
+    except ValueError:
+        return Response(status=400)
+    epoch, swept = reader.read(lambda s: (s.epoch, s.swept))
+    return conditional_json(make_etag(epoch, swept, prefix, None, None), lambda: {'inactive_prefixes': reader.inactive(prefix)})
+
+# compact inactive state for the federation aggregator, 304 if unchanged since epoch
+@app.route('/state', methods=['GET'])
+def getState():
+    state = reader.state()
+    since = request.args.get('since')
+    if since is not None and since == str(state['epoch']):
+        return Response(status=304)
+    return conditional_json(make_etag(state['epoch'], state['swept']), lambda: state)
+
+@app.errorhandler(HTTPException)
+def handle_exception(e):
+    response = e.get_response()
+    response.data = json.dumps({
+        "code": e.code,
+        "name": e.name,
+        "description": e.description,
+    })
+    response.content_type = "application/json"
+    return response
+
+def serve(name, fd):
+    # one worker on the inherited listening socket fd
+    global reader
+    while reader is None:
+        try:
+            reader = SnapshotReader(name)
+        except FileNotFoundError:
+            logging.info(f'Waiting for snapshot {name}...')
+            time.sleep(1)
+    make_server('', 0, app, fd=fd).serve_forever()
+
+def start_workers(name, host, port, workers):
+    # listening socket and the worker processes serving it
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    cmd = [sys.executable, os.path.abspath(__file__), '--snapshot', name, '--fd', str(sock.fileno())]
+    procs = [subprocess.Popen(cmd, pass_fds=(sock.fileno(),)) for _ in range(workers)]
+    logging.info(f'{workers} API workers on {host}:{port}')
+    return sock, procs
+
+def stop_workers(procs):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        proc.wait()
+
+if __name__ == '__main__':
+    logging.basicConfig(level="INFO",
+                        format="%(asctime)s|%(levelname)s: %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+
+    parser = ArgumentParser()
+    parser.add_argument('--snapshot', default='morp4', type=str, help='shared memory segment of the controller')
+    parser.add_argument('--fd', default=None, type=int, help='listening socket, set for the workers')
+    parser.add_argument('--host', default='', type=str)
+    parser.add_argument('--port', default=2004, type=int)
+    parser.add_argument('--workers', default=os.cpu_count(), type=int)
+    args = parser.parse_args()
+
+    if args.fd is not None:
+        serve(args.snapshot, args.fd)
+    else:
+        sock, procs = start_workers(args.snapshot, args.host, args.port, args.workers)
+        try:
+            for proc in procs:
+                proc.wait()
+        except KeyboardInterrupt:
+            stop_workers(procs)
@@ -38,17 +38,48 @@ import socket
 import threading
 import requests
 import os
-from flask import Flask, jsonify, request, Response, abort
+import signal
+import atexit
+import functools
+from flask import Flask, jsonify, request, Response, abort, copy_current_request_context
 from flask_cors import CORS
 from controllertof import LocalClient
+from profiling import SweepProfiler
+from allocation import load_switches
+from history import History
+from events import EventBus
+from conditional import make_etag, conditional_json
+from admission import Admission, Busy
+from api_worker import start_workers, stop_workers
 import logging
 from werkzeug.exceptions import HTTPException
+from werkzeug.http import HTTP_STATUS_CODES
 import time
 from argparse import ArgumentParser
 from socket import getaddrinfo, gaierror, AF_INET, AF_INET6, SOCK_RAW, AI_NUMERICHOST
 
 app = Flask(__name__)
 CORS(app)
+# bounded pool for the expensive queries, set up in main
+admission = None
+
+def busy(e):
+    response = jsonify(code=e.status, name=HTTP_STATUS_CODES[e.status], description=e.description)
+    response.status_code = e.status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def admitted(view):
+    # run the query through admission control, 429/503 with Retry-After when refused
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if admission is None:
+            return view(*args, **kwargs)
+        try:
+            return admission.run(request.remote_addr, copy_current_request_context(lambda: view(*args, **kwargs)))
+        except Busy as e:
+            return busy(e)
+    return wrapper
 
 # check if IPv4 prefix
 def check_prefix(prefix):
@@ -66,9 +97,8 @@ def check_prefix(prefix):
         if not (0 <= pfx_len <= 32):
             return False
     elif family == AF_INET6:
-        return False
-        # if not (0 <= pfx_len <= 128):
-        #    return False
+        if not (0 <= pfx_len <= 128):
+            return False
     else:
         # shouldn't enter this
         return False
@@ -78,20 +108,117 @@ def check_prefix(prefix):
 def hello():
     return 'Hi, I am alive!'
 
-# return inactive prefixes
+# return inactive prefixes, 304 if the client's ETag is still current
 @app.route('/inactive', methods=['GET'])
+@admitted
 def getInactivePrefixes():
     prefix = request.args.get('prefix')
     if prefix is not None and not check_prefix(prefix):
         return Response(status=400)
-    inactive_prefixes_list = controller.get_inactive_prefixes(prefix)
-    return jsonify(inactive_prefixes=inactive_prefixes_list), 200
+    # only the prefixes that turned inactive between min_age and max_age sweeps ago
+    try:
+        min_age, max_age = [int(request.args[name]) if name in request.args else None for name in ('min_age', 'max_age')]
+        if any(age is not None and age < 0 for age in (min_age, max_age)):
+            return Response(status=400)
+        # taken before the query, a sweep in between only makes the body newer than its tag
+        etag = make_etag(controller.epoch, controller.last_sweep, prefix and prefix.strip(), min_age, max_age)
+        return conditional_json(etag, lambda: {'inactive_prefixes': controller.get_inactive_prefixes(prefix, min_age, max_age)})
+    except ValueError:
+        return Response(status=400)
+
+# compact inactive state for the federation aggregator, 304 if unchanged since epoch
+@app.route('/state', methods=['GET'])
+@admitted
+def getState():
+    state = controller.get_state()
+    since = request.args.get('since')
+    if since is not None and since == str(state['epoch']):
+        return Response(status=304)
+    return conditional_json(make_etag(state['epoch'], state['swept']), lambda: state)
+
+# long-term activity of a prefix between start and end (unix time), needs --history
+@app.route('/history', methods=['GET'])
+@admitted
+def getHistory():
+    prefix = request.args.get('prefix')
+    if controller.history is None or prefix is None or not check_prefix(prefix) or ':' in prefix:
+        return Response(status=400)
+    try:
+        start = float(request.args.get('start', 0))
+        end = float(request.args.get('end', time.time()))
+    except ValueError:
+        return Response(status=400)
+    return jsonify(prefix=prefix, start=start, end=end, **controller.get_history(prefix, start, end)), 200
+
+# server-sent events: the prefixes that became active or inactive at each sweep,
+# 503 past --events-subscribers
+@app.route('/events', methods=['GET'])
+def streamEvents():
+    try:
+        q = controller.events.subscribe()
+    except Busy as e:
+        return busy(e)
+    response = Response(controller.events.stream(q), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # also when the client is gone before the stream started
+    response.call_on_close(lambda: controller.events.unsubscribe(q))
+    return response
+
+# inactive addresses and churn under the alternative alphas, needs --what-if-alpha
+@app.route('/whatif', methods=['GET'])
+@admitted
+def getWhatIf():
+    what_if = controller.get_what_if()
+    if what_if is None:
+        return Response(status=404)
+    return jsonify(what_if), 200
 
 @app.route('/info', methods=['GET'])
 def getInfo():
     info, headers = controller.get_gen_info()
     return jsonify(info=info, headers=headers), 200
 
+# profile the next N sweeps (cProfile + tracemalloc report on disk)
+@app.route('/profile', methods=['POST'])
+def requestProfile():
+    try:
+        sweeps = int(request.args.get('sweeps', args.profile_sweeps))
+    except ValueError:
+        return Response(status=400)
+    if sweeps < 1:
+        return Response(status=400)
+    controller.profiler.request(sweeps)
+    return jsonify(sweeps=sweeps, output_dir=controller.profiler.output_dir), 202
+
+# re-read --monitored and move to it without losing the state of unchanged space
+@app.route('/reload', methods=['POST'])
+def reload():
+    try:
+        entries = controller.reload()
+    except ValueError as e:
+        abort(409, description=str(e))
+    return jsonify(monitored=entries), 200
+
+def reload_in_background(signum, frame):
+    # a reload takes a while, keep the signal handler short
+    threading.Thread(target=controller.reload, name='reload').start()
+
+# prefixes of every switch, when the monitored space is split over several
+@app.route('/allocation', methods=['GET'])
+def getAllocation():
+    return jsonify(switch=controller.switch and controller.switch.name, allocation=controller.allocation), 200
+
+# re-plan after the switch list (or the monitored file) changed
+@app.route('/allocation', methods=['POST'])
+def reallocate():
+    if args.switches is None:
+        return Response(status=400)
+    try:
+        entries = controller.optimize_allocation(load_switches(args.switches))
+    except ValueError as e:
+        abort(409, description=str(e))
+    return jsonify(switch=controller.switch.name, monitored=entries), 200
+
 @app.errorhandler(HTTPException)
 def handle_exception(e):
     response = e.get_response()
@@ -117,9 +244,46 @@ if __name__ == '__main__':
     parser.add_argument('--max-byte-rate', default=338102845, type=int)
     parser.add_argument('--avg-byte-rate', default=17758683, type=int)
     parser.add_argument('--alpha', default=1, type=int)
+    parser.add_argument('--what-if-alpha', nargs='*', default=None, type=int,
+                        help='also age counters with these alphas, reported by /whatif')
     parser.add_argument('--monitored', default='../input_files/monitored.txt', type=str)
     parser.add_argument('--outgoing', nargs='*', default=[1], type=int)
     parser.add_argument('--incoming', nargs='*', default=[2], type=int)
+    parser.add_argument('--profile-dir', default='profiles', type=str)
+    parser.add_argument('--profile-sweeps', default=1, type=int)
+    parser.add_argument('--switches', default=None, type=str,
+                        help='JSON list of switches to split the monitored prefixes over')
+    parser.add_argument('--switch', default=socket.gethostname(), type=str,
+                        help='name of this switch in --switches')
+    parser.add_argument('--history', default=None, type=str,
+                        help='append the activity transitions to this file')
+    parser.add_argument('--history-checkpoint', default=64, type=int,
+                        help='sweeps with changes between two full checkpoints')
+    parser.add_argument('--history-retention', default=None, type=float,
+                        help='days of history to keep, everything by default')
+    parser.add_argument('--reconcile-every', default=10, type=int,
+                        help='sweeps between two full reads of the flag table, the other sweeps only read the blocks with a summary bit set')
+    parser.add_argument('--events-queue', default=16, type=int,
+                        help='sweeps an /events subscriber can fall behind before it is dropped')
+    parser.add_argument('--events-subscribers', default=8, type=int,
+                        help='/events subscribers at once, each holds a server thread, 503 beyond')
+    parser.add_argument('--snapshot', default=None, type=str,
+                        help='shared memory segment to publish the state in, default morp4 when --api-workers is set')
+    parser.add_argument('--api-workers', default=0, type=int,
+                        help='processes serving /inactive and /state from the snapshot on --api-port')
+    parser.add_argument('--api-port', default=2004, type=int)
+    parser.add_argument('--bfrt-sessions', default=0, type=int,
+                        help='extra bfrt client sessions to split the register reads and writes over')
+    parser.add_argument('--query-threads', default=2, type=int,
+                        help='threads running /inactive, /state, /history and /whatif queries')
+    parser.add_argument('--query-sweep-threads', default=1, type=int,
+                        help='queries running at once while a sweep runs, 0 to hold them until it is done')
+    parser.add_argument('--query-per-client', default=2, type=int,
+                        help='queries a client can have in progress, 429 beyond')
+    parser.add_argument('--query-queue', default=16, type=int,
+                        help='queries waiting for a thread, 503 beyond')
+    parser.add_argument('--query-deadline', default=30, type=float,
+                        help='seconds a query can wait and run before it is answered with 503')
 
     args = parser.parse_args()
 
@@ -127,8 +291,30 @@ if __name__ == '__main__':
     host_ip = socket.gethostbyname(host_name)
     port = 2002
 
+    profiler = SweepProfiler(args.profile_dir)
+    switches = load_switches(args.switches) if args.switches else None
+    history = None
+    if args.history:
+        retention = args.history_retention*86400 if args.history_retention is not None else None
+        history = History(args.history, args.history_checkpoint, retention)
     controller = LocalClient(args.interval, args.global_table_size, args.dark_meter_size, args. alpha, args.monitored, {'incoming': args.incoming, 'outgoing': args.outgoing},\
-                args.max_packet_rate, args.max_byte_rate, args.avg_packet_rate, args.avg_byte_rate)    
+                args.max_packet_rate, args.max_byte_rate, args.avg_packet_rate, args.avg_byte_rate, profiler=profiler,
+                switches=switches, switch_name=args.switch, history=history,
+                events=EventBus(args.events_queue, max_subscribers=args.events_subscribers), reconcile_every=args.reconcile_every,
+                what_if=args.what_if_alpha, snapshot_name=args.snapshot or (args.api_workers and 'morp4') or None,
+                sessions=args.bfrt_sessions)
+    atexit.register(controller.close)
+    admission = Admission(args.query_threads, args.query_per_client, args.query_queue, args.query_deadline, controller.idle,
+                          args.query_sweep_threads)
+    if controller.snapshot is not None:
+        atexit.register(lambda: controller.snapshot.close())
+    if args.api_workers:
+        api_socket, api_workers = start_workers(controller.snapshot.name, host_ip, args.api_port, args.api_workers)
+        atexit.register(stop_workers, api_workers)
+    # kill -USR1 <pid> profiles the next --profile-sweeps sweeps
+    signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.request(args.profile_sweeps))
+    # kill -HUP <pid> reloads --monitored
+    signal.signal(signal.SIGHUP, reload_in_background)
     # run iterations in the background
     thread = threading.Thread(target=controller.run, name='periodic checks')
     thread.start()
@@ -62,19 +62,107 @@ class CLI(cmd.Cmd):
         print(tabulate(info, headers=headers))
 
     def do_inactive(self, line):
-        """inactive [<prefix>]
-        See inactive prefixes within prefix <prefix>."""
+        """inactive [<prefix>] [min_age=<sweeps>] [max_age=<sweeps>]
+        See inactive prefixes within prefix <prefix>, optionally only those inactive for min_age to max_age sweeps."""
         request_url = f'http://{self.addr}:{self.port}/inactive'
-        if line:
-            prefix = line.strip()
-            request_url += f'?prefix={prefix}'
-        info = requests.get(request_url)
+        params = dict()
+        for field in line.split():
+            name, _, value = field.partition('=')
+            if value:
+                params[name] = value
+            else:
+                params['prefix'] = field
+        info = requests.get(request_url, params=params)
+        if info.status_code != 200:
+            print('Invalid prefix or age')
+            return
         res_j = info.json()['inactive_prefixes']
         print('------Inactive Prefixes------')
         for x in res_j:
             print(x)
         print('-----------------------------')
 
+    def do_history(self, line):
+        """history <prefix> [<days>]
+        See what stayed dark within prefix <prefix> over the last <days> days (default 7)."""
+        fields = line.split()
+        if not fields:
+            print('Missing prefix')
+            return
+        end = time.time()
+        start = end - float(fields[1] if len(fields) > 1 else 7)*86400
+        res = requests.get(f'http://{self.addr}:{self.port}/history',
+                           params={'prefix': fields[0], 'start': start, 'end': end})
+        if res.status_code != 200:
+            print('Invalid prefix or no history on the controller')
+            return
+        res_j = res.json()
+        for name in ('first_active', 'last_active'):
+            t = res_j[name]
+            print(f"{name.replace('_', ' ')}: {time.ctime(t) if t is not None else 'never'}")
+        print('------Dark Throughout------')
+        for x in res_j['dark_throughout']:
+            print(x)
+        print('---------------------------')
+
+    def do_whatif(self, line):
+        """whatif
+        Compare the inactive space and churn of the alternative alphas."""
+        res = requests.get(f'http://{self.addr}:{self.port}/whatif')
+        if res.status_code != 200:
+            print('No alternative alphas on the controller')
+            return
+        res_j = res.json()
+        print(f"{res_j['sweeps']} sweep(s), {res_j['addresses']} addresses")
+        print(tabulate([[a['alpha'] if not a['current'] else f"{a['alpha']} (current)", a['inactive'], a['churn'],
+                         round(a['mean_churn'], 1)] for a in res_j['alphas']],
+                       headers=['alpha', 'inactive', 'churn', 'mean churn']))
+
+    def do_profile(self, line):
+        """profile [<sweeps>]
+        Profile the next <sweeps> sweeps on the controller."""
+        request_url = f'http://{self.addr}:{self.port}/profile'
+        if line:
+            request_url += f'?sweeps={line.strip()}'
+        res = requests.post(request_url)
+        if res.status_code != 202:
+            print('Invalid number of sweeps')
+            return
+        res_j = res.json()
+        print(f"Profiling {res_j['sweeps']} sweep(s), report in {res_j['output_dir']}")
+
+    def do_reload(self, line):
+        """reload
+        Reload the monitored prefixes from the controller's monitored file."""
+        res = requests.post(f'http://{self.addr}:{self.port}/reload')
+        if res.status_code != 200:
+            print(res.json().get('description', 'Reload failed'))
+            return
+        print(f"Monitoring {len(res.json()['monitored'])} prefixes")
+
+    def do_allocation(self, line):
+        """allocation [reload]
+        Show the prefixes of each switch, or re-plan them after the switch list changed."""
+        request_url = f'http://{self.addr}:{self.port}/allocation'
+        if line.strip() == 'reload':
+            res = requests.post(request_url)
+            if res.status_code != 200:
+                print(res.json().get('description', 'Reallocation failed'))
+                return
+            res_j = res.json()
+            print(f"{res_j['switch']} now monitors:")
+            for x in res_j['monitored']:
+                print(x)
+            return
+        res_j = requests.get(request_url).json()
+        if not res_j['allocation']:
+            print('Single switch, no allocation')
+            return
+        for switch, prefixes in res_j['allocation'].items():
+            print(f'------{switch}------')
+            for x in prefixes:
+                print(x)
+
     def do_bye(self, line):
         """bye
         Exit client."""
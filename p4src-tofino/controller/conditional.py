@@ -0,0 +1,70 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Conditional and compressed JSON responses. The state only changes with the
+# epoch, so the ETag of a query is derived from the epoch, the time of the
+# last sweep (which tells restarts apart) and the query arguments: pollers
+# whose state did not change get a 304 and no body, the others a gzipped body
+# if they accept it.
+
+import gzip
+import hashlib
+from flask import jsonify, request, Response
+
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 1  # fast, the bodies are lists of prefixes and compress well anyway
+
+
+def make_etag(epoch, swept, *args):
+    return hashlib.sha1(repr((epoch, swept) + args).encode()).hexdigest()[:20]
+
+
+def conditional_json(etag, build):
+    """304 if the client holds etag, else the JSON of build()."""
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = compress(jsonify(build()))
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress(response):
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE or 'gzip' not in request.accept_encodings:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -52,134 +52,395 @@ sys.path.append(os.path.join(SDE_PYTHON3, 'tofino', 'bfrt_grpc'))
 
 LOG_PORT = 6
 # LOG_PORT = 140 # 2
+# copies to LOG_PORT keep the Ethernet, IPv4 and L4 port headers
+LOG_PKT_LEN = 64
 THRESHOLD = 1024
 RECIRCULATE_PORT = 68
 NUM_PIPES = 2
+PIPE_SHIFT = 7 # dev_port bits 7-8 are the pipe
+METER_BURST_PKTS = 100
+METER_BURST_KBITS = 1200 # 100 full-size packets
+TRACK_LEN = 32 # default tracking granularity
+DARK_LEN = 24 # default dark meter granularity
+MAX_TRACK_SHIFT = 16 # see shift_offset in darknet-norec.p4
+MAX_DARK_SHIFT = 24 # see shift_dark_offset in darknet-norec.p4
+V6_SLOTS = 65536 # see constants.p4
+WORD_BITS = 32 # blocks per flag and global register entry, see bit_mask in darknet-norec.p4
+SPLIT_MIN = 4096 # register entries worth splitting over the client sessions
+KEY_CACHE_SIZE = 1 << 19 # register and meter index keys kept, over all tables and sessions
+DATA_CACHE_SIZE = 4096 # register values and meter rates whose data objects are kept
+
+# sweep engine shared with the bmv2 and Tofino2 controllers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'sweep'))
 
 import bfrt_grpc.client as gc
+import bfrt_grpc.bfruntime_pb2 as bfruntime_pb2
 from tabulate import tabulate
 import argparse, time, ipaddress
 from aggregate6 import aggregate
-from radix import Radix
 import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from profiling import SweepProfiler
+from allocation import plan_allocation, format_entry
+from sparse6 import SparseTracker6, TRACK_LEN6
+import numpy as np
+from intervals import EMPTY, union, to_prefixes
+from events import EventBus
+from snapshot import SnapshotWriter
+from engine import SweepEngine, Backend
+
+
+class BfrtBackend(Backend):
+    """Registers and meters of the darknet program over bfrt_grpc.
+
+    Flags are banked: the data plane sets them in flag_tables[flag_bank]
+    while a sweep reads and then resets the other, frozen bank. Flag and
+    global bits are packed WORD_BITS blocks per register entry. With pipe
+    set, registers are made asymmetric and only that pipe's copy is read
+    and written. Large register reads and writes are split by index range
+    over the extra client sessions, if any. Index keys and data objects are
+    built once and reused from sweep to sweep.
+    """
+
+    def __init__(self, bfrt_info, dev_tgt, profiler, pipe=None):
+        self.dev_tgt = dev_tgt
+        self.profiler = profiler
+        self.pipe = pipe
+        self.reg_tgt = dev_tgt if pipe is None else gc.Target(0, pipe_id=pipe)
+        self.global_table = bfrt_info.table_get('pipe.Ingress.global_table')
+        self.flag_tables = [bfrt_info.table_get('pipe.Ingress.flag_table0'),
+                            bfrt_info.table_get('pipe.Ingress.flag_table1')]
+        self.flag_bank_table = bfrt_info.table_get('pipe.Ingress.flag_bank')
+        # a bit per dark block with flags set, banked like the flags
+        self.summary_tables = [bfrt_info.table_get('pipe.Ingress.summary_table0'),
+                               bfrt_info.table_get('pipe.Ingress.summary_table1')]
+        self.flag_bank = 0
+        # the global table as the controller knows it, a word is written whole
+        self.global_bits = np.ones(self.global_table.info.size_get()*WORD_BITS, dtype=np.uint8)
+        self.dark_meter = bfrt_info.table_get('pipe.Ingress.dark_meter')
+        self.dark_global_byte_meter = bfrt_info.table_get('pipe.Ingress.dark_global_byte_meter')
+        self.dark_byte_meter = bfrt_info.table_get('pipe.Ingress.dark_byte_meter')
+        self.dark_global_meter = bfrt_info.table_get('pipe.Ingress.dark_global_meter')
+        self.session_infos = []
+        self.pool = None
+        # keys by table, see index_keys, and data objects of the last values
+        # and rates used
+        self.keys = {}
+        self.key_count = 0
+        self.keys_lock = threading.Lock()
+        self.register_data = functools.lru_cache(maxsize=DATA_CACHE_SIZE)(self._register_data)
+        self.meter_data = functools.lru_cache(maxsize=DATA_CACHE_SIZE)(self._meter_data)
+        self.byte_meter_data = functools.lru_cache(maxsize=DATA_CACHE_SIZE)(self._byte_meter_data)
+
+    def add_sessions(self, bfrt_infos):
+        # bfrt_info of the extra sessions, bound to the same program
+        self.session_infos = list(bfrt_infos)
+        if self.session_infos:
+            self.pool = ThreadPoolExecutor(max_workers=len(self.session_infos) + 1, thread_name_prefix='bfrt')
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def _parallel(self, table, count, fn):
+        # fn(table, slice) over count entries, one contiguous slice per
+        # session; results in index order
+        if self.pool is None or count < SPLIT_MIN:
+            return [fn(table, slice(0, count))]
+        name = table.info.name_get()
+        tables = [table] + [info.table_get(name) for info in self.session_infos]
+        step = -(-count // len(tables))
+        return list(self.pool.map(lambda k: fn(tables[k], slice(k*step, (k + 1)*step)), range(-(-count // step))))
+
+    def index_keys(self, table, indices, field='$REGISTER_INDEX'):
+        # keys of the indices given, kept for the whole table the first time
+        # it is used as long as KEY_CACHE_SIZE allows, built on every call after
+        keys = self.keys.get(table)
+        if keys is None:
+            with self.keys_lock:
+                keys = self.keys.get(table)
+                if keys is None:
+                    size = table.info.size_get()
+                    keys = [None]*size if self.key_count + size <= KEY_CACHE_SIZE else False
+                    self.key_count += size if keys else 0
+                    self.keys[table] = keys
+        if keys is False:
+            return [table.make_key([gc.KeyTuple(field, int(index))]) for index in indices]
+        _keys = []
+        for index in indices:
+            key = keys[index]
+            if key is None:
+                key = keys[index] = table.make_key([gc.KeyTuple(field, int(index))])
+            _keys.append(key)
+        return _keys
+
+    def _register_data(self, table, value):
+        return table.make_data([gc.DataTuple(table.info.data_dict_allname["f1"], value)])
+
+    def _read(self, table, index_range, flags):
+        _keys = self.index_keys(table, index_range)
+        data_name = table.info.data_dict_allname["f1"]
+        results = []
+        for entry in table.entry_get(self.reg_tgt, _keys, flags=flags):
+            data = entry[0].to_dict()
+            results.append(data[data_name])
+
+        return results
+
+    def read_register(self, table, index_range, flags={"from_hw": False}):
+        if self.pool is not None and not len(index_range):
+            # the whole register, by index so that it can be split
+            index_range = range(table.info.size_get())
+        chunks = self._parallel(table, len(index_range), lambda t, s: self._read(t, index_range[s], flags))
+        return [value for chunk in chunks for value in chunk]
+
+    def write_register(self, table, keys_1, keys_0):
+        self.write_words(table, list(keys_1) + list(keys_0), [1]*len(keys_1) + [0]*len(keys_0))
+
+    def _write(self, table, indices, values):
+        _keys = self.index_keys(table, indices)
+        _data = [self.register_data(table, int(value)) for value in values]
+        table.entry_add(self.reg_tgt, _keys, _data)
+
+    def read_words(self, table, words):
+        # packed entries, OR-ed over the pipes read
+        values = self.read_register(table, words)
+        if not values:
+            return np.zeros(0, dtype=np.uint32)
+        return np.bitwise_or.reduce(np.asarray(values, dtype=np.uint32), axis=1)
+
+    def write_words(self, table, words, values):
+        if len(words):
+            self._parallel(table, len(words), lambda t, s: self._write(t, words[s], values[s]))
+
+    def read_bits(self, table, words=None):
+        # a uint8 per block of the whole register, only the words given are
+        # read (all of them by default), the others are left at 0
+        bits = np.zeros((table.info.size_get(), WORD_BITS), dtype=np.uint8)
+        values = self.read_words(table, [] if words is None else words)
+        rows = slice(None) if words is None else np.asarray(words, dtype=np.int64)
+        bits[rows] = np.unpackbits(values.astype('<u4').view(np.uint8), bitorder='little').reshape(-1, WORD_BITS)
+        return bits.reshape(-1)
+
+    def write_bits(self, table, bits, ones, zeros):
+        # set ones and clear zeros in bits, as returned by read_bits, and
+        # write the words they fall in
+        ones, zeros = np.asarray(ones, dtype=np.int64), np.asarray(zeros, dtype=np.int64)
+        bits[ones] = 1
+        bits[zeros] = 0
+        words = np.unique(np.concatenate([ones, zeros]) // WORD_BITS)
+        values = np.packbits(bits.reshape(-1, WORD_BITS)[words], axis=1, bitorder='little').view('<u4').reshape(-1)
+        self.write_words(table, words, values)
+
+    def sync_register(self, table):
+        table.operations_execute(self.reg_tgt, 'Sync')
+
+    def scope_registers(self, tables=()):
+        # one copy per pipe, so that a single one can be read and written;
+        # other pipes see no monitored traffic
+        if self.pipe is None:
+            return
+        for table in [self.global_table] + self.flag_tables + self.summary_tables + list(tables):
+            table.attribute_entry_scope_set(self.dev_tgt, predefined_pipe_scope=True,
+                                            predefined_pipe_scope_val=bfruntime_pb2.Mode.SINGLE)
+
+    def set_flag_bank(self, bank):
+        self.flag_bank_table.default_entry_set(self.dev_tgt,
+            self.flag_bank_table.make_data([gc.DataTuple('bank', bank)], 'Ingress.set_flag_bank'))
+
+    def swap_banks(self):
+        # packets set flags in the other bank from now on and this one
+        # holds everything since the last swap
+        self.flag_bank ^= 1
+        self.set_flag_bank(self.flag_bank)
+
+    def sync(self):
+        # sync software shadow of the frozen bank with hardware
+        frozen = self.flag_bank ^ 1
+        self.sync_register(self.summary_tables[frozen])
+        self.sync_register(self.flag_tables[frozen])
+
+    def read_flags(self, size, blocks=None):
+        frozen = self.flag_bank ^ 1
+        words = None
+        if blocks is not None:
+            with self.profiler.phase('sweep.read_summary'):
+                summary = self.read_register(self.summary_tables[frozen], range(len(blocks)))
+            # only the words of the dark blocks that saw outgoing traffic
+            words = sorted({w for d, (start, end) in enumerate(blocks) if any(summary[d])
+                            for w in range(start // WORD_BITS, (end - 1) // WORD_BITS + 1)})
+            if not words:
+                return bytearray(size)
+        with self.profiler.phase('sweep.read_flags'):
+            return bytearray(self.read_bits(self.flag_tables[frozen], words)[:size])
+
+    def write_global(self, ones, zeros, refreshed=()):
+        # the data plane sets the global bit of every block it flags, and a
+        # word write may have cleared it since: refreshed blocks the
+        # controller still has at 0 are written again. In between, the live
+        # flag keeps the block from being seen dark.
+        refreshed = np.asarray(refreshed, dtype=np.int64)
+        ones = np.concatenate([np.asarray(ones, dtype=np.int64), refreshed[self.global_bits[refreshed] == 0]])
+        self.write_bits(self.global_table, self.global_bits, ones, zeros)
+
+    def clear_flags(self, indices):
+        # one reset of the frozen bank instead of a write per active index
+        frozen = self.flag_bank ^ 1
+        self.flag_tables[frozen].entry_del(self.reg_tgt)
+        self.summary_tables[frozen].entry_del(self.reg_tgt)
 
-class LocalClient:
+    def _meter_data(self, table, avg_pkt_rate, max_pkt_rate):
+        return table.make_data(
+            [gc.DataTuple('$METER_SPEC_CIR_PPS', avg_pkt_rate),
+             gc.DataTuple('$METER_SPEC_PIR_PPS', max_pkt_rate),
+             gc.DataTuple('$METER_SPEC_CBS_PKTS', METER_BURST_PKTS),
+             gc.DataTuple('$METER_SPEC_PBS_PKTS', METER_BURST_PKTS)])
+
+    def _byte_meter_data(self, table, avg_byte_rate, max_byte_rate):
+        # byte meters are programmed in kbit/s and kbit
+        return table.make_data(
+            [gc.DataTuple('$METER_SPEC_CIR_KBPS', math.ceil(avg_byte_rate * 8 / 1000)),
+             gc.DataTuple('$METER_SPEC_PIR_KBPS', math.ceil(max_byte_rate * 8 / 1000)),
+             gc.DataTuple('$METER_SPEC_CBS_KBITS', METER_BURST_KBITS),
+             gc.DataTuple('$METER_SPEC_PBS_KBITS', METER_BURST_KBITS)])
+
+    def program_meters(self, global_rates, block_rates):
+        if global_rates is not None:
+            _key, = self.index_keys(self.dark_global_meter, [0], '$METER_INDEX')
+            _data = self.meter_data(self.dark_global_meter, global_rates.avg_pkt_rate, global_rates.max_pkt_rate)
+            try:
+                self.dark_global_meter.entry_add(self.dev_tgt, [_key], [_data])
+            except:
+                pass
+            _key, = self.index_keys(self.dark_global_byte_meter, [0], '$METER_INDEX')
+            _data = self.byte_meter_data(self.dark_global_byte_meter, global_rates.avg_byte_rate,
+                                         global_rates.max_byte_rate)
+            try:
+                self.dark_global_byte_meter.entry_add(self.dev_tgt, [_key], [_data])
+            except:
+                pass
+
+        key_field_list = self.index_keys(self.dark_meter, block_rates, '$METER_INDEX')
+        byte_key_field_list = self.index_keys(self.dark_byte_meter, block_rates, '$METER_INDEX')
+        data_field_list = []
+        byte_data_field_list = []
+        for rates in block_rates.values():
+            data_field_list.append(self.meter_data(self.dark_meter, rates.avg_pkt_rate, rates.max_pkt_rate))
+            byte_data_field_list.append(self.byte_meter_data(self.dark_byte_meter, rates.avg_byte_rate,
+                                                             rates.max_byte_rate))
+        try:
+            self.dark_meter.entry_add(self.dev_tgt, key_field_list, data_field_list)
+        except:
+            pass
+        try:
+            self.dark_byte_meter.entry_add(self.dev_tgt, byte_key_field_list, byte_data_field_list)
+        except:
+            pass
+
+
+class LocalClient(SweepEngine):
     def __init__(self, time_interval, global_table_size, dark_meter_size, alpha, monitored_path, ports,\
-                max_pkt_rate, max_byte_rate, avg_pkt_rate, avg_byte_rate):        
+                max_pkt_rate, max_byte_rate, avg_pkt_rate, avg_byte_rate, profiler=None, switches=None, switch_name=None,
+                history=None, events=None, reconcile_every=10, what_if=None, snapshot_name=None,
+                sessions=0):
+        # this switch's share of the monitored space when several switches are used
+        switch = None
+        if switches:
+            switch = self.find_switch(switches, switch_name)
+            global_table_size = switch.global_table_size
+            dark_meter_size = switch.dark_meter_size
+        SweepEngine.__init__(self, global_table_size, dark_meter_size, alpha, max_pkt_rate, max_byte_rate,
+                             avg_pkt_rate, avg_byte_rate)
+        if what_if:
+            self.set_what_if(what_if)
         self.time_interval = time_interval*60 # convert to sec
-        self.global_table_size = global_table_size
-        self.dark_meter_size = dark_meter_size
-        self.alpha = alpha
-        self.counters = [self.alpha]*self.global_table_size
+        self.switches = switches
+        self.switch = switch
+        self.allocation = None
+        # flags set since the last sweep and blocks they turned active, from
+        # the activation digests; every sweep also reads the frozen bank for
+        # flags set without a digest, all of it every reconcile_every sweeps
+        # and the blocks with a summary bit set otherwise
+        self.flagged = set()
+        self.activated = []
+        self.reconcile_every = reconcile_every
+        self.reconcile_next = True
         self.monitored_path = monitored_path
-        self.index_prefix_mapping = []
-        self.prefix_index_mapping = Radix()
-        self.dark_prefix_index_mapping = dict()
         self.ports = ports
+        # IPv6 prefixes are tracked sparsely, on every switch
+        self.monitored6 = []
+        self.tracker6 = SparseTracker6(self.alpha, V6_SLOTS)
 
-        self.max_pkt_rate = max_pkt_rate
-        self.max_byte_rate = max_byte_rate
-        self.avg_pkt_rate = avg_pkt_rate
-        self.avg_byte_rate = avg_byte_rate
-        # max pkt rate per address
-        self.max_pkt_rate_addr = round(self.max_pkt_rate / self.global_table_size, 3)
-        self.max_byte_rate_addr = round(self.max_byte_rate / self.global_table_size, 3)
-        self.avg_pkt_rate_addr = round(self.avg_pkt_rate / self.global_table_size, 3)
-        self.avg_byte_rate_addr = round(self.avg_byte_rate / self.global_table_size, 3)
-
-        self.lock = threading.Lock()
+        # held for a whole sweep, the index mappings only change in between
+        self.sweep_lock = threading.Lock()
+        # clear while a sweep runs, queued API queries wait for it (admission.py)
+        self.idle = threading.Event()
+        self.idle.set()
+        self.profiler = profiler if profiler is not None else SweepProfiler()
+        # on-disk log of the transitions, see history.py
+        self.history = history
+        # transitions pushed to the /events subscribers
+        self.events = events if events is not None else EventBus()
+        # state published in shared memory for the API workers, see snapshot.py
+        self.snapshot = SnapshotWriter(snapshot_name, global_table_size, dark_meter_size) if snapshot_name else None
+        # extra bfrt client sessions the register I/O is split over
+        self.sessions = sessions
         self._setup()
 
-    def parse_monitored(self, path):
-        monitored_prefixes = []
-        with open(path, 'r') as f:
-            for line in f:
-                if line.startswith('#'):
-                    continue
-                monitored_prefixes.append(line[:-1])
-        return monitored_prefixes
-
     def _setup(self):
         bfrt_client_id = 0
 
         self.interface = gc.ClientInterface(
-            grpc_addr = 'localhost:50052', # or specific IP
+            grpc_addr = self.switch.grpc_addr if self.switch else 'localhost:50052',
             client_id = bfrt_client_id,
             device_id = 0,
             num_tries = 1)
 
         self.bfrt_info = self.interface.bfrt_info_get()
         self.dev_tgt = gc.Target(0)
-        print('The target runs the program ', self.bfrt_info.p4_name_get())
+        p4_name = self.bfrt_info.p4_name_get()
+        print('The target runs the program ', p4_name)
 
         self.ports_table = self.bfrt_info.table_get('pipe.Ingress.ports')
         self.monitored_table = self.bfrt_info.table_get('pipe.Ingress.monitored')
         self.monitored_table.info.key_field_annotation_add('meta.addr', 'ipv4')
-        self.global_table = self.bfrt_info.table_get('pipe.Ingress.global_table')
-        self.flag_table = self.bfrt_info.table_get('pipe.Ingress.flag_table')
-        self.dark_meter = self.bfrt_info.table_get('pipe.Ingress.dark_meter')
-        self.dark_global_meter = self.bfrt_info.table_get('pipe.Ingress.dark_global_meter')        
-        self.interface.bind_pipeline_config(self.bfrt_info.p4_name_get())
+        self.monitored6_table = self.bfrt_info.table_get('pipe.Ingress.monitored6')
+        self.flag6_table = self.bfrt_info.table_get('pipe.Ingress.flag6_table')
+        self.global6_table = self.bfrt_info.table_get('pipe.Ingress.global6_table')
+        self.active6_digest = self.bfrt_info.learn_get('pipe.IngressDeparser.active6_digest')
+        self.active_digest = self.bfrt_info.learn_get('pipe.IngressDeparser.active_digest')
+        self.backend = BfrtBackend(self.bfrt_info, self.dev_tgt, self.profiler, self.monitored_pipe(self.ports))
+        self.interface.bind_pipeline_config(p4_name)
+        self.backend.scope_registers([self.flag6_table, self.global6_table])
+
+        self.session_interfaces = []
+        for k in range(self.sessions):
+            interface = gc.ClientInterface(
+                grpc_addr = self.switch.grpc_addr if self.switch else 'localhost:50052',
+                client_id = bfrt_client_id + 1 + k,
+                device_id = 0,
+                num_tries = 1)
+            interface.bind_pipeline_config(p4_name)
+            self.session_interfaces.append(interface)
+        self.backend.add_sessions([interface.bfrt_info_get(p4_name) for interface in self.session_interfaces])
     # def _setup_tables(self):
         self.add_mirroring([5, 5, 6], 1, 3)  # set up mirroring
-        monitored_prefixes = self.parse_monitored(self.monitored_path)   # populate monitored table
+        self.backend.set_flag_bank(self.backend.flag_bank)
+        entries, entries6 = self.split_families(self.parse_monitored(self.monitored_path))
+        monitored_prefixes = self.allocate(entries)   # populate monitored table
         self.populate_monitored(monitored_prefixes)
+        self.populate_monitored6(entries6)
         self.add_ports(self.ports)
+        self.set_rates()
+        self.publish_snapshot()
 
-    def set_rates(self):
-        # set global rate
-        print(self.max_pkt_rate)
-        _key = self.dark_global_meter.make_key([gc.KeyTuple('$METER_INDEX', 0)])
-        _data = self.dark_global_meter.make_data(
-            [gc.DataTuple('$METER_SPEC_CIR_PPS', self.avg_pkt_rate),
-             gc.DataTuple('$METER_SPEC_PIR_PPS', self.max_pkt_rate),
-             gc.DataTuple('$METER_SPEC_CBS_PKTS', 100),
-             gc.DataTuple('$METER_SPEC_PBS_PKTS', 100)])
-        try:
-                self.dark_global_meter.entry_add(self.dev_tgt, [_key], [_data])
-        except:
-            pass
-
-        # only for packet rate for now
-        prefix_max_pkt_rate = math.ceil(self.max_pkt_rate_addr * 256) # per /24
-        prefix_avg_pkt_rate = math.ceil(self.avg_pkt_rate_addr * 256) # per /24
-
-        key_field_list = []
-        data_field_list = []
-        for i in range(len(self.dark_prefix_index_mapping)):
-            # set rate for /24
-            key_field_list.append(self.dark_meter.make_key([gc.KeyTuple('$METER_INDEX', i)]))
-            data_field_list.append(self.dark_meter.make_data(
-            [gc.DataTuple('$METER_SPEC_CIR_PPS', prefix_avg_pkt_rate),
-             gc.DataTuple('$METER_SPEC_PIR_PPS', prefix_max_pkt_rate),
-             gc.DataTuple('$METER_SPEC_CBS_PKTS', 100),
-             gc.DataTuple('$METER_SPEC_PBS_PKTS', 100)]))
-        try:
-            self.dark_meter.entry_add(self.dev_tgt, key_field_list, data_field_list)
-        except:
-            pass
+    def close(self):
+        # stop the I/O threads and tear down every client session
+        self.backend.close()
+        for interface in self.session_interfaces + [self.interface]:
+            interface.tear_down_stream()
 
-    def update_rates(self, inactive_pfxs, inactive_addr):
-        addr_avg_pkt_rate = math.ceil(self.avg_pkt_rate / inactive_addr) # per /24
-        addr_max_pkt_rate = math.ceil(self.max_pkt_rate / inactive_addr) # per /24
-
-        key_field_list = []
-        data_field_list = []
-        for inactive_pfx, in_addr in inactive_pfxs.items():
-            prefix_max_pkt_rate = math.ceil(addr_max_pkt_rate * in_addr) # per /24
-            prefix_avg_pkt_rate = math.ceil(addr_avg_pkt_rate * in_addr) # per /24
-            idx = self.dark_prefix_index_mapping[inactive_pfx]
-            key_field_list.append(self.dark_meter.make_key([gc.KeyTuple('$METER_INDEX', idx)]))
-            data_field_list.append(self.dark_meter.make_data(
-            [gc.DataTuple('$METER_SPEC_CIR_PPS', prefix_avg_pkt_rate),
-             gc.DataTuple('$METER_SPEC_PIR_PPS', prefix_max_pkt_rate),
-             gc.DataTuple('$METER_SPEC_CBS_PKTS', 100),
-             gc.DataTuple('$METER_SPEC_PBS_PKTS', 100)]))
-        try:
-            self.dark_meter.entry_add(self.dev_tgt, key_field_list, data_field_list)
-        except:
-            pass
-            
     def add_ports(self, ports):
         for port in ports['incoming']:
             _keys = self.ports_table.make_key([gc.KeyTuple('ig_intr_md.ingress_port', port)])
@@ -197,41 +458,245 @@ class LocalClient:
             except:
                 pass
 
-    def optimize_allocation(self, switches):
-        pass
+    def monitored_pipe(self, ports):
+        # registers are only touched by packets from the incoming and
+        # outgoing ports, None if those are in several pipes
+        pipes = {port >> PIPE_SHIFT & 3 for port in ports['incoming'] + ports['outgoing']}
+        if len(pipes) != 1:
+            logging.info(f'Ports in pipes {sorted(pipes)}, registers are read in every pipe')
+            return None
+        return pipes.pop()
+
+    def find_switch(self, switches, name):
+        for sw in switches:
+            if sw.name == name:
+                return sw
+        raise ValueError(f'switch {name} is not in the switch list')
+
+    def plan(self, entries, switches):
+        plan = plan_allocation([self.parse_entry(entry) for entry in entries], switches)
+        return {name: [format_entry(e) for e in share] for name, share in plan.items()}
+
+    def allocate(self, entries):
+        # share of this switch, everything if it is on its own
+        if not self.switches:
+            return entries
+        self.allocation = self.plan(entries, self.switches)
+        return self.allocation[self.switch.name]
+
+    def optimize_allocation(self, switches, switch_name=None):
+        # re-plan the monitored file over switches and move this one to its new share
+        return self.reload(switches, switch_name)
+
+    def parse_entry(self, entry):
+        # prefix/length [tracking length [dark meter length]]
+        fields = entry.split()
+        ipnet = ipaddress.IPv4Network(fields[0])
+        track_len = int(fields[1]) if len(fields) > 1 else TRACK_LEN
+        dark_len = int(fields[2]) if len(fields) > 2 else DARK_LEN
+        # blocks can not be larger than the monitored prefix itself
+        track_len = max(track_len, ipnet.prefixlen)
+        dark_len = max(dark_len, ipnet.prefixlen)
+        if track_len > 32 or 32 - track_len > MAX_TRACK_SHIFT:
+            raise ValueError(f'{entry}: tracking length must be between /{32 - MAX_TRACK_SHIFT} and /32')
+        if dark_len > track_len or 32 - dark_len > MAX_DARK_SHIFT:
+            raise ValueError(f'{entry}: dark meter length must be between /{32 - MAX_DARK_SHIFT} and the tracking length')
+        return ipnet, track_len, dark_len
+
+    def split_families(self, entries):
+        # (IPv4 entries, IPv6 entries)
+        entries6 = [entry for entry in entries if ':' in entry.split()[0]]
+        return [entry for entry in entries if entry not in entries6], entries6
+
+    def parse_entry6(self, entry):
+        # prefix/length [tracking length], blocks of at most a /64
+        fields = entry.split()
+        ipnet = ipaddress.IPv6Network(fields[0])
+        track_len = max(int(fields[1]) if len(fields) > 1 else TRACK_LEN6, ipnet.prefixlen)
+        if track_len > 64:
+            raise ValueError(f'{entry}: IPv6 tracking length must be at most /64')
+        return ipnet, track_len
+
+    def _monitored_key(self, m):
+        return self.monitored_table.make_key([gc.KeyTuple('meta.addr', str(m.ipnet.network_address), None, m.ipnet.prefixlen)])
+
+    def _monitored_data(self, m):
+        return self.monitored_table.make_data([
+            gc.DataTuple('base_idx', m.base_idx),
+            gc.DataTuple('mask', int(m.ipnet.hostmask)),
+            gc.DataTuple('dark_base_idx', m.dark_base_idx),
+            gc.DataTuple('track_shift', 32 - m.track_len),
+            gc.DataTuple('dark_shift', 32 - m.dark_len)
+        ], 'Ingress.calc_idx')
 
     def populate_monitored(self, entries):
-        base_idx = 0
-        dark_base_idx = 0
-        for entry in entries:
-            prefix, length = entry.split('/')
-            mask = 2**(32 - int(length)) - 1
-            _keys = self.monitored_table.make_key([gc.KeyTuple('meta.addr', prefix, None, int(length))])
-            _data = self.monitored_table.make_data([
-                gc.DataTuple('base_idx', base_idx),
-                gc.DataTuple('mask', mask),
-                gc.DataTuple('dark_base_idx', dark_base_idx)
-            ], 'Ingress.calc_idx')
+        self.monitored = self.layout(entries)
+        for m in self.monitored:
             try:
-                self.monitored_table.entry_add(self.dev_tgt, [_keys], [_data])
+                self.monitored_table.entry_add(self.dev_tgt, [self._monitored_key(m)], [self._monitored_data(m)])
             except:
                 pass
-            # save in local dictionary
-            ipnet = ipaddress.IPv4Network(entry)
-            netws = list(ipnet.subnets(new_prefix=32))
-            self.index_prefix_mapping.extend(netws)
+        self.map_monitored()
+
+    def _monitored6_key(self, ipnet):
+        return self.monitored6_table.make_key([gc.KeyTuple('meta.addr6', int(ipnet.network_address) >> 64,
+                                                           None, ipnet.prefixlen)])
+
+    def _monitored6_data(self, track_len):
+        return self.monitored6_table.make_data([
+            gc.DataTuple('mask', (2**64 - 1) ^ (2**(64 - track_len) - 1))
+        ], 'Ingress.calc_slot6')
 
-            for i in range(len(netws)):
-                node = self.prefix_index_mapping.add(str(netws[i]))
-                node.data['index'] = base_idx + i
+    def populate_monitored6(self, entries):
+        self.monitored6 = [self.parse_entry6(entry) for entry in entries]
+        self.tracker6.set_monitored(self.monitored6)
+        for ipnet, track_len in self.monitored6:
+            self.monitored6_table.entry_add(self.dev_tgt, [self._monitored6_key(ipnet)], [self._monitored6_data(track_len)])
 
-            dark_netws = list(ipnet.subnets(new_prefix=24))
-            for i in range(len(dark_netws)):
-                dark_netw = '.'.join(str(dark_netws[i]).split('.')[:3])
-                self.dark_prefix_index_mapping[dark_netw] = dark_base_idx + i            
+    def update_monitored6_table(self, old_entries, new_entries):
+        old_entries = dict(old_entries)
+        for ipnet, track_len in new_entries:
+            old = old_entries.pop(ipnet, None)
+            if old == track_len:
+                continue
+            if old is None:
+                self.monitored6_table.entry_add(self.dev_tgt, [self._monitored6_key(ipnet)], [self._monitored6_data(track_len)])
+            else:
+                self.monitored6_table.entry_mod(self.dev_tgt, [self._monitored6_key(ipnet)], [self._monitored6_data(track_len)])
+        if old_entries:
+            self.monitored6_table.entry_del(self.dev_tgt, [self._monitored6_key(ipnet) for ipnet in old_entries])
+
+    def index_moves(self, old_layout, new_layout):
+        # (old index, new index, length) of the blocks that survive, only
+        # blocks tracked at the same granularity keep their state
+        moves = []
+        for m in new_layout:
+            start, end = int(m.ipnet.network_address), int(m.ipnet.broadcast_address) + 1
+            shift = 32 - m.track_len
+            for o in old_layout:
+                if o.track_len != m.track_len:
+                    continue
+                o_start, o_end = int(o.ipnet.network_address), int(o.ipnet.broadcast_address) + 1
+                lo, hi = max(start, o_start), min(end, o_end)
+                if lo < hi:
+                    moves.append((o.base_idx + ((lo - o_start) >> shift), m.base_idx + ((lo - start) >> shift),
+                                  (hi - lo) >> shift))
+        return moves
+
+    def update_monitored_table(self, old_layout, new_layout):
+        # only touch the entries that changed
+        old_entries = {m.ipnet: m for m in old_layout}
+        for m in new_layout:
+            old = old_entries.pop(m.ipnet, None)
+            if old == m:
+                continue
+            if old is None:
+                self.monitored_table.entry_add(self.dev_tgt, [self._monitored_key(m)], [self._monitored_data(m)])
+            else:
+                self.monitored_table.entry_mod(self.dev_tgt, [self._monitored_key(m)], [self._monitored_data(m)])
+        if old_entries:
+            self.monitored_table.entry_del(self.dev_tgt, [self._monitored_key(m) for m in old_entries.values()])
+
+    def reload(self, switches=None, switch_name=None):
+        # move to a new monitored file (or switch list) in place: surviving
+        # blocks keep their counters and register bits, a layout that does
+        # not fit raises before anything is touched
+        switch = self.switch
+        if switches is None:
+            switches = self.switches
+        else:
+            switch = self.find_switch(switches, switch_name or (self.switch and self.switch.name))
+        entries, entries6 = self.split_families(self.parse_monitored(self.monitored_path))
+        monitored6 = [self.parse_entry6(entry) for entry in entries6]
+        allocation = None
+        if switches:
+            allocation = self.plan(entries, switches)
+            entries = allocation[switch.name]
+        global_table_size = switch.global_table_size if switch else self.global_table_size
+        dark_meter_size = switch.dark_meter_size if switch else self.dark_meter_size
+        layout = self.layout(entries, global_table_size, dark_meter_size)
+
+        with self.sweep_lock:
+            # the flags since the last sweep are moved in the frozen bank,
+            # where the data plane does not set any, and made live again
+            # once the new indices are in place
+            self.backend.swap_banks()
+            flag_table = self.backend.flag_tables[self.backend.flag_bank ^ 1]
+            summary_table = self.backend.summary_tables[self.backend.flag_bank ^ 1]
+            self.backend.sync_register(flag_table)
+            flags = self.backend.read_bits(flag_table)
+            with self.lock:
+                old_size = len(self.index_prefix_mapping)
+                new_size = sum(m.size for m in layout)
+                moves = self.index_moves(self.monitored, layout)
+
+                counters = [self.alpha]*global_table_size
+                last_change = np.full(global_table_size, self.sweeps, dtype=np.uint32)
+                what_if = None
+                if self.what_if is not None:
+                    what_if = np.repeat(self.what_if_alphas[:, None], global_table_size, axis=1)
+                new_flags = [0]*new_size
+                for old, new, length in moves:
+                    counters[new:new + length] = self.counters[old:old + length]
+                    last_change[new:new + length] = self.last_change[old:old + length]
+                    if what_if is not None:
+                        what_if[:, new:new + length] = self.what_if[:, old:old + length]
+                    new_flags[new:new + length] = flags[old:old + length]
+
+                # registers are only written where the new layout differs
+                global_1, global_0, flag_1, flag_0 = [], [], [], []
+                for i in range(new_size):
+                    g_value = 1 if counters[i] else 0
+                    if i >= old_size or g_value != (1 if self.counters[i] else 0):
+                        (global_1 if g_value else global_0).append(i)
+                    if i >= old_size or new_flags[i] != flags[i]:
+                        (flag_1 if new_flags[i] else flag_0).append(i)
+                flag_0.extend(int(i) for i in np.flatnonzero(flags[new_size:]) + new_size)
 
-            base_idx += len(netws)
-            dark_base_idx += len(dark_netws)
+                self.backend.write_global(global_1, global_0)
+                self.backend.write_bits(flag_table, flags, flag_1, flag_0)
+                self.update_monitored_table(self.monitored, layout)
+
+                self.switches, self.switch, self.allocation = switches, switch, allocation
+                self.global_table_size = global_table_size
+                self.dark_meter_size = dark_meter_size
+                self.counters = counters
+                self.last_change = last_change
+                self.what_if = what_if
+                # digests still carry old indices, start over from a full read
+                self.flagged = set()
+                self.activated = []
+                self.reconcile_next = True
+                self.monitored = layout
+                self.map_monitored()
+                # the summary bits of the dark blocks the moved flags landed in
+                summary = sorted({self.dark_index_mapping[i] for i in range(new_size) if new_flags[i]})
+                summary_table.entry_del(self.backend.reg_tgt)
+                self.backend.write_register(summary_table, summary, [])
+                # the other bank took flags by old and new indices meanwhile,
+                # the digests of the same packets are dropped above too
+                self.backend.swap_banks()
+                self.backend.clear_flags(())
+                # IPv6 state is kept by block, a block that changes tracking length starts over
+                self.update_monitored6_table(self.monitored6, monitored6)
+                self.monitored6 = monitored6
+                self.tracker6.set_monitored(monitored6)
+                self.epoch += 1
+                if self.snapshot is not None and not self.snapshot.fits(len(layout), new_size, len(self.dark_index_prefix_mapping)):
+                    # readers move to the new segment on their own
+                    self.snapshot.close()
+                    self.snapshot = SnapshotWriter(self.snapshot.name, global_table_size, dark_meter_size)
+            self.publish_snapshot()
+            if self.history is not None:
+                self.history.checkpoint(self.epoch, time.time(), *self.history_snapshot())
+            # indices moved, subscribers resync with /inactive
+            self.events.publish('reload', {'epoch': self.epoch}, self.epoch)
+            self.set_rates()
+
+        kept = sum(length for _, _, length in moves)
+        logging.info(f'Reloaded {len(layout)} + {len(monitored6)} IPv6 prefixes, {new_size} entries: {kept} kept their state, '
+                     f'{len(global_1) + len(global_0) + len(flag_1) + len(flag_0)} register writes')
+        return entries
 
     def add_mirroring(self, eg_ports, mc_session_id, log_session_id):
         mirror_table = self.bfrt_info.table_get('$mirror.cfg')
@@ -314,7 +779,8 @@ class LocalClient:
             gc.DataTuple('$direction', str_val="BOTH"),
             gc.DataTuple('$session_enable', bool_val=True),
             gc.DataTuple('$ucast_egress_port', LOG_PORT),
-            gc.DataTuple('$ucast_egress_port_valid', bool_val=True)
+            gc.DataTuple('$ucast_egress_port_valid', bool_val=True),
+            gc.DataTuple('$max_pkt_len', LOG_PKT_LEN)
             ], "$normal")
 
         try:
@@ -341,149 +807,209 @@ class LocalClient:
         headers = ['Full Table Name','Type','Usage','Capacity']
         return data, headers
 
-    def read_register(self, table, index_range, flags={"from_hw": False}):
-        _keys = [table.make_key([gc.KeyTuple("$REGISTER_INDEX", index)]) for index in index_range]
-        data_name = table.info.data_dict_allname["f1"]
-        results = []
-        for entry in table.entry_get(self.dev_tgt, _keys, flags=flags):
-            data = entry[0].to_dict()
-            results.append(data[data_name])
+    def get_inactive_prefixes(self, covering_prefix=None, min_age=None, max_age=None):
+        aged = min_age is not None or max_age is not None
+        if covering_prefix is not None and ':' in covering_prefix:
+            if aged:
+                raise ValueError('inactivity age is not kept for IPv6 prefixes')
+            with self.profiler.phase('query.lookup'), self.lock:
+                return self.tracker6.inactive(covering_prefix)
 
-        return results
+        with self.profiler.phase('query.lookup'), self.lock:
+            found = self.inactive_blocks(covering_prefix, min_age, max_age)
+        
+        with self.profiler.phase('query.aggregate'):
+            inactive_prefixes = aggregate([pfx for _, pfx in found])
+        if covering_prefix is None and self.monitored6 and not aged:
+            with self.profiler.phase('query.lookup'), self.lock:
+                inactive_prefixes.extend(self.tracker6.inactive())
+        return inactive_prefixes
 
-    def write_register(self, table, keys_1, keys_0):
-        _keys = [table.make_key([gc.KeyTuple("$REGISTER_INDEX", index)]) for index in keys_1]
-        _keys.extend([table.make_key([gc.KeyTuple("$REGISTER_INDEX", index)]) for index in keys_0])
+    def activate(self, indices):
+        # flag 0->1 transitions reported by the data plane, the global table
+        # bit is already set there
+        with self.lock:
+            activated = []
+            for i in indices:
+                if i >= len(self.index_prefix_mapping):
+                    continue
+                self.flagged.add(i)
+                if not self.counters[i]:
+                    activated.append(i)
+                    logging.warning(f'Prefix {self.index_prefix_mapping[i]} became active.')
+                self.counters[i] = self.alpha + 1
+            if not activated:
+                return
+            self.last_change[activated] = self.sweeps
+            self.activated.extend(activated)
+            self.epoch += 1
+            if self.snapshot is not None:
+                self.snapshot.activate(self.epoch, self.last_sweep, activated, [self.dark_index_mapping[i] for i in activated],
+                                       self.block_addrs[activated])
+        if len(self.events):
+            self.publish_transitions(sorted(activated), [])
 
-        data_name = table.info.data_dict_allname["f1"]
-        _data = [table.make_data([gc.DataTuple(data_name, 1)])]*len(keys_1)
-        _data.extend([table.make_data([gc.DataTuple(data_name, 0)])]*len(keys_0))
+    def handle_digest(self, digest):
+        # activations between two sweeps: IPv4 indices and IPv6 blocks
+        if digest.digest_id == self.active_digest.info.id_get():
+            self.activate([data.to_dict()['idx'] for data in self.active_digest.make_data_list(digest)])
+            return
+        with self.lock:
+            blocks = len(self.tracker6.counters)
+            for data in self.active6_digest.make_data_list(digest):
+                d = data.to_dict()
+                self.tracker6.seen(d['addr6'], d['slot6'])
+            # /inactive changed, see the ETags in app.py
+            if len(self.tracker6.counters) != blocks:
+                self.epoch += 1
+
+    def digest_loop(self):
+        while True:
+            try:
+                digest = self.interface.digest_get(timeout=1)
+            except RuntimeError:
+                continue
+            self.handle_digest(digest)
 
-        table.entry_add(self.dev_tgt, _keys, _data)
+    def index_intervals(self, indices):
+        # address ranges of register indices, merged
+        indices = np.asarray(indices, dtype=np.int64)
+        starts, ends = [], []
+        for m in self.monitored:
+            lo, hi = np.searchsorted(indices, [m.base_idx, m.base_idx + m.size])
+            shift = 32 - m.track_len
+            block_starts = int(m.ipnet.network_address) + ((indices[lo:hi] - m.base_idx) << shift)
+            starts.append(block_starts)
+            ends.append(block_starts + (1 << shift))
+        if not starts:
+            return EMPTY
+        return union(np.concatenate(starts), np.concatenate(ends))
 
-    def get_inactive_prefixes(self, covering_prefix=None):
-        inactive_prefixes = []
+    def history_snapshot(self):
+        # monitored and dark address ranges, for a history checkpoint
         with self.lock:
-            if covering_prefix is None:
-                for i in range(len(self.index_prefix_mapping)):
-                    if not self.counters[i]:
-                        inactive_prefixes.append(str(self.index_prefix_mapping[i]))
-            else:
-                covered = self.prefix_index_mapping.search_covered(covering_prefix)
-                for node in covered:
-                    if not self.counters[node.data['index']]:
-                        inactive_prefixes.append(str(node.prefix))
-        
-        return aggregate(inactive_prefixes)
+            monitored = union(np.array([int(m.ipnet.network_address) for m in self.monitored], dtype=np.int64),
+                              np.array([int(m.ipnet.broadcast_address) + 1 for m in self.monitored], dtype=np.int64))
+            counters = np.asarray(self.counters[:len(self.index_prefix_mapping)])
+            return monitored, self.index_intervals(np.flatnonzero(counters == 0))
+
+    def get_history(self, prefix, start, end):
+        # dark throughout [start, end], and when prefix was last and first active in it
+        net = ipaddress.IPv4Network(prefix, strict=False)
+        lo, hi = int(net.network_address), int(net.broadcast_address) + 1
+        return {
+            'dark_throughout': aggregate(to_prefixes(self.history.dark_throughout(lo, hi, start, end))),
+            'first_active': self.history.first_active(lo, hi, start),
+            'last_active': self.history.last_active(lo, hi, end),
+        }
+
+    def publish_snapshot(self):
+        # inactive bitmap and inactive addresses per dark block, for the API workers
+        if self.snapshot is None:
+            return
+        with self.lock:
+            inactive = np.asarray(self.counters[:len(self.index_prefix_mapping)]) == 0
+            dark = np.bincount(np.asarray(self.dark_index_mapping, dtype=np.int64)[inactive], weights=self.block_addrs[inactive],
+                               minlength=len(self.dark_index_prefix_mapping))
+            self.snapshot.publish(self.epoch, self.last_sweep, self.switch and self.switch.name, self.monitored, inactive, dark)
+
+    def publish_transitions(self, global_indices, inactive_indices):
+        # aggregated once per sweep, whatever the number of subscribers
+        with self.lock:
+            active = aggregate([str(self.index_prefix_mapping[i]) for i in global_indices])
+            inactive = aggregate([str(self.index_prefix_mapping[i]) for i in inactive_indices])
+        if active or inactive:
+            self.events.publish('transitions', {'epoch': self.epoch, 'active': active, 'inactive': inactive}, self.epoch)
 
     def run(self):
+        threading.Thread(target=self.digest_loop, daemon=True).start()
         while True:
-            logging.info('Starting collecting values...')
-            # collect global table(s)
-            inactive_pfxs = dict()
-            inactive_addr = 0
-            
-            # sync software shadow with hardware
-            self.flag_table.operations_execute(self.dev_tgt, 'Sync')
-            print('sync done')
-
-            # read in batches of 100k entries
-            """
-            RANGE = 100000
-            prev_j = 0
-            iter_time = time.time()
-            for j in range(RANGE, len(self.index_prefix_mapping), RANGE):
-                start_time = time.time()
-                print('start reading', j)
-                flags = self.read_register(self.flag_table, range(prev_j, j))
-                print('read flags', j)
-                global_indices = []
-                flag_indices = []
-                inactive_indices = []
-                for i in range(prev_j, j):
-                    active = 0
-                    t_val = flags[i - prev_j]
-                    active |= int(any(t_val))
-                    with self.lock:
-                        if active:
-                            if not self.counters[i]:
-                                global_indices.append(i)
-                                # self.write_register(self.global_table, i , 1)
-                                logging.warning(f'Prefix {self.index_prefix_mapping[i]} became active.')
-                            #self.write_register(self.flag_table, i, 0)
-                            flag_indices.append(i)
-                            self.counters[i] = self.alpha + 1
-                        else:
-                            if self.counters[i] > 1:
-                                self.counters[i] -= 1
-                            else:
-                                inactive_addr += 1
-                                pfx = ".".join(str(self.index_prefix_mapping[i]).split(".")[:3])
-                                if pfx not in inactive_pfxs:
-                                    inactive_pfxs[pfx] = 0
-                                inactive_pfxs[pfx] += 1
-
-                                if self.counters[i] == 1:
-                                    #self.write_register(self.global_table, i, 0)
-                                    inactive_indices.append(i)
-                                    self.counters[i] = 0
-                prev_j = j                    
-                # update registers
-                print('start writing')
-                self.write_register(self.global_table, global_indices, inactive_indices)
-                self.write_register(self.flag_table, [], flag_indices)
-                print('end writing')
-                print(j, time.time() - start_time)
-            """
-            iter_time = time.time()
-            print('start reading')
-            flags = self.read_register(self.flag_table, [])
-            print(time.time() - iter_time, "read flag")
-                
-            global_indices = []
-            flag_indices = []
-            inactive_indices = []
-            for i in range(len(flags)):
-                active = 0
-                t_val = flags[i]
-                active |= int(any(t_val))
-                with self.lock:
-                    if active:
-                        if not self.counters[i]:
-                            global_indices.append(i)
-                            # self.write_register(self.global_table, i , 1)
-                            logging.warning(f'Prefix {self.index_prefix_mapping[i]} became active.')
-                        #self.write_register(self.flag_table, i, 0)
-                        flag_indices.append(i)
-                        self.counters[i] = self.alpha + 1
-                    else:
-                        if self.counters[i] > 1:
-                            self.counters[i] -= 1
-                        else:
-                            inactive_addr += 1
-                            pfx = ".".join(str(self.index_prefix_mapping[i]).split(".")[:3])
-                            if pfx not in inactive_pfxs:
-                                inactive_pfxs[pfx] = 0
-                            inactive_pfxs[pfx] += 1
-
-                            if self.counters[i] == 1:
-                                #self.write_register(self.global_table, i, 0)
-                                inactive_indices.append(i)
-                                self.counters[i] = 0
-            print('start writing')
-            self.write_register(self.global_table, global_indices, inactive_indices)
-            self.write_register(self.flag_table, [], flag_indices)
-            print('end writing')
-
-            print('all:', time.time() - iter_time)
-
-            self.update_rates(inactive_pfxs, inactive_addr)
-            
-            print('finished rates')
+            self.profiler.sweep_start()
+            self.idle.clear()
+            try:
+                with self.profiler.phase('sweep'), self.sweep_lock:
+                    self.sweep()
+            finally:
+                self.idle.set()
+                self.profiler.sweep_end()
 
             logging.info(f'Waiting for {self.time_interval} seconds...')
             time.sleep(self.time_interval)
 
+    def sweep(self):
+        logging.info('Starting collecting values...')
+        # flip the banks: the frozen one holds every flag since the last sweep
+        with self.profiler.phase('sweep.flip'):
+            self.backend.swap_banks()
+
+        with self.lock:
+            flagged, self.flagged = self.flagged, set()
+            activated, self.activated = self.activated, []
+            reconcile = self.reconcile_next or self.reconcile_every <= 1 or (self.sweeps + 1) % self.reconcile_every == 0
+            self.reconcile_next = False
+
+        iter_time = time.time()
+        size = len(self.index_prefix_mapping)
+        # the frozen bank is reset below, whatever it holds is read first:
+        # lost digests, peer notifications and recirculated copies set flags
+        # without a digest
+        with self.profiler.phase('sweep.sync'):
+            self.backend.sync()
+        print('sync done')
+        flags = self.backend.read_flags(size, None if reconcile else self.dark_index_ranges)
+        print(time.time() - iter_time, "read flag")
+        missed = sum(flags) - len(flagged)
+        if missed > 0:
+            logging.info(f'{missed} flags set without a digest')
+        for i in flagged:
+            flags[i] = 1
+
+        with self.profiler.phase('sweep.aging'):
+            aging = self.age(flags)
+        print('start writing')
+        with self.profiler.phase('sweep.write_registers'):
+            self.backend.write_global(aging.activated, aging.deactivated, aging.refreshed)
+            self.backend.clear_flags(aging.refreshed)
+        print('end writing')
+
+        print('all:', time.time() - iter_time)
+
+        if self.monitored6:
+            with self.profiler.phase('sweep.ipv6'):
+                self.sweep6()
+
+        with self.profiler.phase('sweep.update_rates'):
+            self.update_rates(aging.inactive_pfxs, aging.inactive_addr)
+
+        with self.lock:
+            self.epoch += 1
+            self.last_sweep = time.time()
+
+        with self.profiler.phase('sweep.snapshot'):
+            self.publish_snapshot()
+
+        if len(self.events):
+            with self.profiler.phase('sweep.publish'):
+                self.publish_transitions(aging.activated, aging.deactivated)
+
+        if self.history is not None:
+            with self.profiler.phase('sweep.history'):
+                self.history.record(self.epoch, self.last_sweep, self.index_intervals(sorted(aging.activated + activated)),
+                                    self.index_intervals(aging.deactivated), self.history_snapshot)
+        
+        print('finished rates')
+        return aging
+
+    def sweep6(self):
+        self.backend.sync_register(self.flag6_table)
+        flags = self.backend.read_register(self.flag6_table, [])
+        flagged = [slot for slot in range(len(flags)) if any(flags[slot])]
+        with self.lock:
+            global_1, global_0 = self.tracker6.age(flagged)
+        self.backend.write_register(self.global6_table, global_1, global_0)
+        self.backend.write_register(self.flag6_table, [], flagged)
+        logging.info(f'IPv6: {len(self.tracker6.counters)} active blocks, {len(flagged)} slots flagged')
+
 '''
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Server-sent events of the sweep transitions. Each /events subscriber holds
+# a Flask thread for as long as it is connected, so their number is capped
+# (--events-subscribers) and a subscriber past the cap is answered with 503
+# and Retry-After instead of taking a thread from the queries.
+
+import json
+import queue
+import threading
+
+from admission import Busy
+
+KEEPALIVE = b': keepalive\n\n'
+OVERFLOW = b'event: overflow\ndata: {}\n\n'
+
+
+class EventBus:
+    """Fan-out of the sweep transitions to the /events subscribers.
+
+    Every event is encoded once and the same bytes are queued to each
+    subscriber. A subscriber whose queue is full is dropped: its stream
+    ends with an overflow event after what was already queued, and it is
+    expected to reconnect and resync with /inactive.
+    """
+
+    def __init__(self, max_queue=16, keepalive=15, max_subscribers=8):
+        self.max_queue = max_queue
+        self.keepalive = keepalive
+        self.max_subscribers = max_subscribers
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.subscribers)
+
+    def subscribe(self):
+        """A queue for a new subscriber, raises Busy past max_subscribers."""
+        q = queue.Queue(self.max_queue)
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                # dead subscribers are noticed at their next keepalive
+                raise Busy(503, f'{self.max_subscribers} /events subscribers already', self.keepalive)
+            self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def publish(self, event, data, event_id=None):
+        message = f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+        if event_id is not None:
+            message = f'id: {event_id}\n'.encode() + message
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                self.unsubscribe(q)
+                self.dropped += 1
+
+    def stream(self, q):
+        # SSE body for the subscriber of q, keepalives let dead clients be noticed
+        try:
+            while True:
+                try:
+                    yield q.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield KEEPALIVE
+                if q.empty() and q not in self.subscribers:
+                    yield OVERFLOW
+                    return
+        finally:
+            self.unsubscribe(q)
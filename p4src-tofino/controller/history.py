@@ -0,0 +1,251 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# On-disk history of the inactive state. Every sweep that changes something
+# appends the address ranges that became active and dark (run-length encoded
+# as [first, last] pairs); a checkpoint with the whole monitored and dark
+# space is appended every few deltas and on reloads, so a query seeks to the
+# checkpoint before its start instead of replaying the log.
+
+import os
+import sys
+import bisect
+import struct
+import logging
+import threading
+
+import numpy as np
+
+# interval arithmetic shared with the federation aggregator
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'sweep'))
+from intervals import EMPTY, merge, difference, intersection, clip
+
+DELTA = b'D'       # ranges that became active, ranges that became dark
+CHECKPOINT = b'C'  # monitored ranges, dark ranges
+# kind, epoch, time, number of ranges in each of the two lists
+HEADER = struct.Struct('<cQdII')
+
+
+class History:
+    """Append-only log of the inactive state, one record per changing sweep."""
+
+    def __init__(self, path, checkpoint_every=64, retention=None, compact_every=4096):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.retention = retention # seconds, everything is kept if None
+        self.compact_every = compact_every
+        # queries come from the API threads, records from the sweeps
+        self.lock = threading.RLock()
+        # (time, epoch, kind, offset) of every record, in log order
+        self.index = []
+        self.checkpoints = [] # positions in index
+        self.since_checkpoint = 0
+        self.since_compaction = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            open(self.path, 'wb').close()
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            offset = 0
+            while offset + HEADER.size <= size:
+                kind, epoch, t, n1, n2 = HEADER.unpack(f.read(HEADER.size))
+                end = offset + HEADER.size + (n1 + n2)*8
+                if end > size:
+                    break
+                self._index(t, epoch, kind, offset)
+                offset = end
+                f.seek(offset)
+        if offset < size:
+            # a record cut short by a crash
+            logging.warning(f'History: dropping {size - offset} bytes of a partial record in {self.path}')
+            os.truncate(self.path, offset)
+        self.log = open(self.path, 'ab')
+
+    def _index(self, t, epoch, kind, offset):
+        if kind == CHECKPOINT:
+            self.checkpoints.append(len(self.index))
+            self.since_checkpoint = 0
+        else:
+            self.since_checkpoint += 1
+        self.index.append((t, epoch, kind, offset))
+
+    def _write(self, f, kind, epoch, t, first, second):
+        f.write(HEADER.pack(kind, epoch, t, len(first[0]), len(second[0])))
+        for starts, ends in (first, second):
+            f.write(starts.astype('<u4').tobytes())
+            f.write((ends - 1).astype('<u4').tobytes())
+
+    def _append(self, kind, epoch, t, first, second):
+        offset = self.log.tell()
+        self._write(self.log, kind, epoch, t, first, second)
+        self.log.flush()
+        self._index(t, epoch, kind, offset)
+
+    def _read(self, position, f):
+        t, epoch, kind, offset = self.index[position]
+        f.seek(offset + 1 + 8 + 8)
+        n1, n2 = struct.unpack('<II', f.read(8))
+        lists = []
+        for n in (n1, n2):
+            starts = np.frombuffer(f.read(4*n), dtype='<u4').astype(np.int64)
+            ends = np.frombuffer(f.read(4*n), dtype='<u4').astype(np.int64) + 1
+            lists.append((starts, ends))
+        return lists
+
+    def record(self, epoch, t, activated, darkened, snapshot):
+        """One sweep: address ranges that became active and dark.
+
+        snapshot() returns the monitored and dark ranges, it is only called
+        when a checkpoint is due.
+        """
+        with self.lock:
+            if not self.checkpoints:
+                self.checkpoint(epoch, t, *snapshot())
+                return
+            if not len(activated[0]) and not len(darkened[0]):
+                return
+            self._append(DELTA, epoch, t, activated, darkened)
+            if self.since_checkpoint >= self.checkpoint_every:
+                self.checkpoint(epoch, t, *snapshot())
+            self.since_compaction += 1
+            if self.retention is not None and self.since_compaction >= self.compact_every:
+                self.compact(t - self.retention)
+
+    def checkpoint(self, epoch, t, monitored, dark):
+        with self.lock:
+            self._append(CHECKPOINT, epoch, t, monitored, dark)
+
+    def _position(self, t):
+        # last record at or before t, -1 if none
+        return bisect.bisect_right(self.index, (t, float('inf'))) - 1
+
+    def _replay(self, f, end):
+        # monitored and dark space after the record at position end
+        start = bisect.bisect_right(self.checkpoints, end) - 1
+        if start < 0:
+            return end, EMPTY, EMPTY
+        position = self.checkpoints[start]
+        monitored, dark = self._read(position, f)
+        for position in range(position + 1, end + 1):
+            first, second = self._read(position, f)
+            if self.index[position][2] == CHECKPOINT:
+                monitored, dark = first, second
+            else:
+                dark = difference(merge(dark, second), first)
+        return end, monitored, dark
+
+    def _scan(self, f, positions, start, end):
+        # ranges within [start, end) that are active in each record
+        for position in positions:
+            first, second = self._read(position, f)
+            if self.index[position][2] == CHECKPOINT:
+                active = difference(clip(first, start, end), second)
+            else:
+                active = clip(first, start, end)
+            yield position, active
+
+    def dark_throughout(self, start, end, t0, t1):
+        """Address ranges in [start, end) that were dark from t0 to t1."""
+        with self.lock:
+            with open(self.path, 'rb') as f:
+                position, monitored, dark = self._replay(f, self._position(t0))
+                dark = clip(dark, start, end)
+                for position in range(position + 1, self._position(t1) + 1):
+                    if not len(dark[0]):
+                        break
+                    first, second = self._read(position, f)
+                    if self.index[position][2] == CHECKPOINT:
+                        dark = intersection(dark, second)
+                    else:
+                        dark = difference(dark, first)
+            return dark
+
+    def first_active(self, start, end, t0):
+        """Time of the first record from t0 on with active space in [start, end)."""
+        with self.lock:
+            with open(self.path, 'rb') as f:
+                position, monitored, dark = self._replay(f, self._position(t0))
+                if position >= 0 and len(difference(clip(monitored, start, end), dark)[0]):
+                    return max(t0, self.index[position][0])
+                for position, active in self._scan(f, range(position + 1, len(self.index)), start, end):
+                    if len(active[0]):
+                        return self.index[position][0]
+            return None
+
+    def last_active(self, start, end, t1):
+        """End of the last active period in [start, end) up to t1: t1 if still
+        active then, else the time of the sweep that found it dark."""
+        with self.lock:
+            with open(self.path, 'rb') as f:
+                position, monitored, dark = self._replay(f, self._position(t1))
+                if position < 0:
+                    return None
+                if len(difference(clip(monitored, start, end), dark)[0]):
+                    return t1
+                for position in range(position, -1, -1):
+                    first, second = self._read(position, f)
+                    if self.index[position][2] == CHECKPOINT:
+                        # space that stopped being monitored leaves no dark transition
+                        if len(difference(clip(first, start, end), second)[0]):
+                            return self.index[position][0]
+                    elif len(clip(second, start, end)[0]):
+                        return self.index[position][0]
+            return None
+
+    def compact(self, before):
+        """Drop the records older than before, starting over from a checkpoint."""
+        with self.lock:
+            self.since_compaction = 0
+            cut = bisect.bisect_left(self.index, (before, -1))
+            if cut == 0:
+                return
+            tmp = self.path + '.tmp'
+            with open(self.path, 'rb') as f, open(tmp, 'wb') as out:
+                position, monitored, dark = self._replay(f, cut - 1)
+                t, epoch, _, _ = self.index[position]
+                self._write(out, CHECKPOINT, epoch, t, monitored, dark)
+                for position in range(cut, len(self.index)):
+                    first, second = self._read(position, f)
+                    self._write(out, self.index[position][2], self.index[position][1], self.index[position][0], first, second)
+            self.log.close()
+            os.replace(tmp, self.path)
+            self.index = []
+            self.checkpoints = []
+            self._load()
+            logging.info(f'History: compacted {cut} records older than {before}')
+
+    def close(self):
+        self.log.close()
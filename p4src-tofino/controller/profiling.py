@@ -0,0 +1,172 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+import os
+import io
+import time
+import logging
+import cProfile
+import pstats
+import tracemalloc
+import threading
+from contextlib import nullcontext
+
+# shared no-op context, returned while nobody is listening
+_DISABLED = nullcontext()
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class SweepProfiler:
+    """Named instrumentation points for the sweep and the query path.
+
+    Phases cost a single attribute check while no hook is registered and no
+    capture is pending. request(n) arms a cProfile/tracemalloc capture of the
+    next n sweeps; the report is written to output_dir once they are done.
+    """
+
+    def __init__(self, output_dir='profiles', top=40):
+        self.output_dir = output_dir
+        self.top = top
+        self.hooks = []
+        self.active = False
+        self._pending = 0
+        self._remaining = 0
+        self._profile = None
+        self._snapshot = None
+        self._started_tracing = False
+        self._timings = dict()
+        self._sweeps = 0
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        # hook(phase_name, seconds) is called at the end of every phase
+        self.hooks.append(hook)
+        self.active = True
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+        self.active = bool(self.hooks) or self._remaining > 0
+
+    def phase(self, name):
+        if not self.active:
+            return _DISABLED
+        return _Phase(self, name)
+
+    def _record(self, name, elapsed):
+        if self._remaining:
+            with self._lock:
+                count, total = self._timings.get(name, (0, 0.0))
+                self._timings[name] = (count + 1, total + elapsed)
+        for hook in self.hooks:
+            hook(name, elapsed)
+
+    def request(self, sweeps=1):
+        # can be called from signal handlers and API threads
+        self._pending = max(int(sweeps), 1)
+        logging.info(f'Profiling requested for the next {self._pending} sweep(s)')
+
+    def sweep_start(self):
+        if self._pending and not self._remaining:
+            self._remaining = self._pending
+            self._pending = 0
+            self._sweeps = 0
+            self._timings = dict()
+            self._profile = cProfile.Profile()
+            # tracing started elsewhere (e.g. bench_sweep) is left running
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+            self.active = True
+        if self._remaining:
+            self._profile.enable()
+
+    def sweep_end(self):
+        if not self._remaining:
+            return
+        self._profile.disable()
+        self._sweeps += 1
+        self._remaining -= 1
+        if not self._remaining:
+            self.active = bool(self.hooks)
+            try:
+                path = self._write_report()
+                logging.info(f'Profile of {self._sweeps} sweep(s) written to {path}')
+            except OSError as e:
+                logging.error(f'Could not write profile report: {e}')
+            finally:
+                if self._started_tracing:
+                    tracemalloc.stop()
+                self._profile = None
+                self._snapshot = None
+
+    def _write_report(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, time.strftime('sweep-%Y%m%d-%H%M%S'))
+        self._profile.dump_stats(base + '.prof')
+
+        out = io.StringIO()
+        out.write(f'sweeps profiled: {self._sweeps}\n\n')
+        out.write(f'{"phase":<24}{"calls":>8}{"total (s)":>14}{"mean (s)":>14}\n')
+        for name, (count, total) in sorted(self._timings.items(), key=lambda x: -x[1][1]):
+            out.write(f'{name:<24}{count:>8}{total:>14.4f}{total / count:>14.4f}\n')
+
+        out.write('\n---- cProfile (cumulative) ----\n')
+        pstats.Stats(self._profile, stream=out).sort_stats('cumulative').print_stats(self.top)
+
+        out.write('\n---- tracemalloc (growth since capture start) ----\n')
+        current, peak = tracemalloc.get_traced_memory()
+        out.write(f'current: {current / 2**20:.1f} MiB, peak: {peak / 2**20:.1f} MiB\n')
+        snapshot = tracemalloc.take_snapshot()
+        for stat in snapshot.compare_to(self._snapshot, 'lineno')[:self.top]:
+            out.write(f'{stat}\n')
+
+        with open(base + '.txt', 'w') as f:
+            f.write(out.getvalue())
+        return base + '.txt'
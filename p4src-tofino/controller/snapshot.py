@@ -0,0 +1,275 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Shared-memory copy of the inactive state, published by the sweep process
+# for the API workers (api_worker.py) and any local tool. A seqlock guards
+# the segment: the sequence number is odd while the writer is at work, and a
+# reader retries until it sees the same even number before and after. Readers
+# map the arrays straight onto the segment, nothing is copied.
+#
+#   header    magic, version, sequence, epoch, last sweep, counts, capacities
+#   entries   monitored table entries (ENTRY)
+#   bitmap    a bit per tracked block, 1 if inactive
+#   dark      inactive addresses behind every dark meter block
+
+import os
+import sys
+import time
+import zlib
+import base64
+import struct
+import ipaddress
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# interval arithmetic shared with the federation aggregator
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'sweep'))
+from intervals import union, clip, to_prefixes
+
+MAGIC = b'MRP4'
+VERSION = 1
+PREFIX = struct.Struct('<4sI')       # magic, version
+SEQ_OFFSET = 8
+STATE = struct.Struct('<QdIIII')     # epoch, last sweep, entries, blocks, dark blocks, retired
+STATE_OFFSET = 16
+CAPS = struct.Struct('<III')         # capacity in entries, blocks and dark blocks
+CAPS_OFFSET = 48
+SWITCH = struct.Struct('32s')
+SWITCH_OFFSET = 64
+HEADER_SIZE = 128
+ENTRY = np.dtype([('network', '<u4'), ('prefixlen', 'u1'), ('track_len', 'u1'), ('dark_len', 'u1'), ('pad', 'u1'),
+                  ('base_idx', '<u4'), ('dark_base_idx', '<u4'), ('size', '<u4'), ('dark_size', '<u4')])
+
+
+def _layout(max_entries, max_blocks, max_dark):
+    # offsets of the entries, bitmap and dark counts, and the segment size
+    entries = HEADER_SIZE
+    bitmap = entries + max_entries*ENTRY.itemsize
+    dark = bitmap + (max_blocks + 63) // 64 * 8
+    return entries, bitmap, dark, dark + max_dark*4
+
+
+class Snapshot:
+    """Arrays of one consistent snapshot, views into the segment."""
+
+    def __init__(self, epoch, swept, switch, entries, n_blocks, bitmap, dark):
+        self.epoch = epoch
+        self.swept = swept
+        self.switch = switch
+        self.entries = entries
+        self.n_blocks = n_blocks
+        self.bitmap = bitmap
+        self.dark = dark
+
+    def inactive_bits(self, first, last):
+        # one uint8 per block in [first, last)
+        bits = np.unpackbits(self.bitmap[first >> 3:(last + 7) >> 3], bitorder='little')
+        return bits[first & 7:(first & 7) + last - first]
+
+    def inactive_intervals(self, start=0, end=2**32):
+        # inactive address ranges within [start, end), merged
+        starts, ends = [], []
+        for e in self.entries:
+            network, shift, size, base_idx = int(e['network']), 32 - int(e['track_len']), int(e['size']), int(e['base_idx'])
+            lo, hi = max(start, network), min(end, network + (size << shift))
+            if lo >= hi:
+                continue
+            first, last = (lo - network) >> shift, ((hi - 1 - network) >> shift) + 1
+            idx = np.flatnonzero(self.inactive_bits(base_idx + first, base_idx + last)) + first
+            block_starts = network + (idx.astype(np.int64) << shift)
+            starts.append(block_starts)
+            ends.append(block_starts + (1 << shift))
+        if not starts:
+            return union(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        # a query finer than the tracking granularity gets its own prefix back
+        return clip(union(np.concatenate(starts), np.concatenate(ends)), start, end)
+
+
+class SnapshotWriter:
+    """Publishes the controller state into the shared-memory segment name."""
+
+    def __init__(self, name, max_blocks, max_dark, max_entries=1024):
+        self.name = name
+        self.max_entries, self.max_blocks, self.max_dark = max_entries, max_blocks, max_dark
+        offsets = _layout(max_entries, max_blocks, max_dark)
+        try:
+            # left over by a controller that did not exit cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=offsets[3])
+        buf = self.shm.buf
+        self.seq = np.ndarray(1, dtype=np.uint64, buffer=buf, offset=SEQ_OFFSET)
+        self.entries = np.ndarray(max_entries, dtype=ENTRY, buffer=buf, offset=offsets[0])
+        self.bitmap = np.ndarray((max_blocks + 7) // 8, dtype=np.uint8, buffer=buf, offset=offsets[1])
+        self.dark = np.ndarray(max_dark, dtype=np.uint32, buffer=buf, offset=offsets[2])
+        self.n_entries = self.n_blocks = self.n_dark = 0
+        self.seq[0] = 0
+        STATE.pack_into(buf, STATE_OFFSET, 0, float('nan'), 0, 0, 0, 0)
+        CAPS.pack_into(buf, CAPS_OFFSET, max_entries, max_blocks, max_dark)
+        # magic last: readers only attach to a complete header
+        PREFIX.pack_into(buf, 0, MAGIC, VERSION)
+
+    def fits(self, entries, blocks, dark):
+        return entries <= self.max_entries and blocks <= self.max_blocks and dark <= self.max_dark
+
+    def _begin(self):
+        self.seq[0] += 1
+
+    def _end(self, epoch, swept, retired=0):
+        STATE.pack_into(self.shm.buf, STATE_OFFSET, epoch, float('nan') if swept is None else swept,
+                        self.n_entries, self.n_blocks, self.n_dark, retired)
+        self.seq[0] += 1
+
+    def publish(self, epoch, swept, switch, monitored, inactive, dark):
+        # monitored: MonitoredEntry list, inactive: a bool per block,
+        # dark: inactive addresses per dark block
+        if not self.fits(len(monitored), len(inactive), len(dark)):
+            raise ValueError(f'snapshot does not fit in shared memory segment {self.name}')
+        self._begin()
+        self.n_entries, self.n_blocks, self.n_dark = len(monitored), len(inactive), len(dark)
+        for k, m in enumerate(monitored):
+            self.entries[k] = (int(m.ipnet.network_address), m.ipnet.prefixlen, m.track_len, m.dark_len, 0,
+                               m.base_idx, m.dark_base_idx, m.size, m.dark_size)
+        bits = np.packbits(inactive, bitorder='little')
+        self.bitmap[:len(bits)] = bits
+        self.dark[:len(dark)] = dark
+        SWITCH.pack_into(self.shm.buf, SWITCH_OFFSET, (switch or '').encode())
+        self._end(epoch, swept)
+
+    def activate(self, epoch, swept, indices, dark_indices, addrs):
+        # blocks that became active between two sweeps
+        self._begin()
+        for i, d, n in zip(indices, dark_indices, addrs):
+            self.bitmap[i >> 3] &= ~np.uint8(1 << (i & 7))
+            self.dark[d] -= n
+        self._end(epoch, swept)
+
+    def close(self):
+        # readers still attached move on to a new segment of the same name
+        self._begin()
+        self._end(0, None, retired=1)
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SnapshotReader:
+    """Zero-copy access to the segment published by a SnapshotWriter."""
+
+    def __init__(self, name):
+        self.name = name
+        self.shm = None
+        self._attach()
+
+    def _attach(self):
+        shm = shared_memory.SharedMemory(name=self.name)
+        # the writer owns the segment, do not let the resource tracker
+        # remove it when this process exits
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        buf = shm.buf
+        magic, version = PREFIX.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            shm.close()
+            raise ValueError(f'{self.name} is not a version {VERSION} snapshot segment')
+        max_entries, max_blocks, max_dark = CAPS.unpack_from(buf, CAPS_OFFSET)
+        offsets = _layout(max_entries, max_blocks, max_dark)
+        if self.shm is not None:
+            self.shm.close()
+        self.shm = shm
+        self.seq = np.ndarray(1, dtype=np.uint64, buffer=buf, offset=SEQ_OFFSET)
+        self.entries = np.ndarray(max_entries, dtype=ENTRY, buffer=buf, offset=offsets[0])
+        self.bitmap = np.ndarray((max_blocks + 7) // 8, dtype=np.uint8, buffer=buf, offset=offsets[1])
+        self.dark = np.ndarray(max_dark, dtype=np.uint32, buffer=buf, offset=offsets[2])
+
+    def read(self, fn):
+        """fn(Snapshot) on a consistent snapshot, run again if a write overlapped.
+
+        The arrays of the Snapshot are only valid inside fn, copy what has
+        to outlive it.
+        """
+        while True:
+            seq = int(self.seq[0])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            epoch, swept, n_entries, n_blocks, n_dark, retired = STATE.unpack_from(self.shm.buf, STATE_OFFSET)
+            if retired:
+                try:
+                    self._attach()
+                except FileNotFoundError:
+                    # the writer is creating the next one
+                    time.sleep(0.01)
+                continue
+            switch = SWITCH.unpack_from(self.shm.buf, SWITCH_OFFSET)[0].rstrip(b'\0').decode() or None
+            snapshot = Snapshot(epoch, None if swept != swept else swept, switch, self.entries[:n_entries], n_blocks,
+                                self.bitmap[:(n_blocks + 7) // 8], self.dark[:n_dark])
+            try:
+                result = fn(snapshot)
+            except Exception:
+                if int(self.seq[0]) == seq:
+                    raise
+                continue
+            if int(self.seq[0]) == seq:
+                return result
+
+    def epoch(self):
+        return self.read(lambda s: s.epoch)
+
+    def inactive(self, covering_prefix=None):
+        # aggregated inactive IPv4 prefixes, like LocalClient.get_inactive_prefixes
+        start, end = 0, 2**32
+        if covering_prefix is not None:
+            net = ipaddress.IPv4Network(covering_prefix, strict=False)
+            start, end = int(net.network_address), int(net.broadcast_address) + 1
+        return to_prefixes(self.read(lambda s: s.inactive_intervals(start, end)))
+
+    def state(self):
+        # the /state document of LocalClient.get_state
+        def build(s):
+            inactive = s.inactive_bits(0, s.n_blocks).tobytes()
+            return {
+                'epoch': s.epoch,
+                'swept': s.swept,
+                'switch': s.switch,
+                'monitored': [[str(ipaddress.IPv4Network((int(e['network']), int(e['prefixlen'])))),
+                               int(e['track_len']), int(e['base_idx'])] for e in s.entries],
+                'inactive': base64.b64encode(zlib.compress(inactive, 1)).decode(),
+            }
+        return self.read(build)
+
+    def close(self):
+        self.shm.close()
@@ -0,0 +1,213 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+import logging
+import ipaddress
+
+import numpy as np
+
+TRACK_LEN6 = 64 # default IPv6 tracking granularity, the data plane keys on the upper 64 bits
+
+
+def _crc16_table():
+    # CRC-16 (polynomial 0x8005 reflected, no initial or final xor), the
+    # Tofino HashAlgorithm_t.CRC16 of slot6_hash
+    table = np.zeros(256, dtype=np.uint16)
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xa001 if crc & 1 else crc >> 1
+        table[byte] = crc
+    return table
+
+
+CRC16_TABLE = _crc16_table()
+
+
+def slots6(blocks):
+    """Slot of each block (upper 64 bits, masked), as slot6_hash computes it."""
+    blocks = np.asarray(blocks, dtype=np.uint64)
+    crc = np.zeros(len(blocks), dtype=np.uint16)
+    for shift in range(56, -8, -8):
+        byte = ((blocks >> np.uint64(shift)) & np.uint64(0xff)).astype(np.uint16)
+        crc = (crc >> 8) ^ CRC16_TABLE[(crc ^ byte) & 0xff]
+    return crc
+
+
+class SparseTracker6:
+    """Active IPv6 blocks, aged like the IPv4 counters but only stored while active.
+
+    The data plane hashes the blocks into slots (flag6_table/global6_table)
+    and reports, by digest, the block that turned a slot's flag on. Nothing
+    is kept per monitored block: inactive space is the monitored ranges minus
+    the blocks reported in the busy slots, so the cost follows the active
+    blocks and not the size of the prefixes. Another block sharing the slot
+    of an active one sends no digest and stays listed as inactive, although
+    the data plane does not see its traffic as dark until the slot idles.
+    """
+
+    def __init__(self, alpha, slots):
+        self.alpha = alpha
+        self.slots = slots
+        self.monitored = []     # (ipnet, track_len), longest prefix first
+        self.counters = dict()  # block (upper 64 bits) -> counter
+        self.sizes = dict()     # block -> number of /64s it covers
+        self.block_slot = dict()
+        self.slot_blocks = dict()
+        # what global6_table holds: everything active until the first alpha sweeps are done
+        self.global_bits = bytearray([1]) * slots
+        self.warmup = alpha
+
+    def set_monitored(self, entries):
+        self.monitored = sorted(entries, key=lambda e: e[0].prefixlen, reverse=True)
+        # forget blocks that are not monitored anymore
+        for block in [b for b in self.counters if self.lookup(b) is None]:
+            self._remove(block)
+
+    def lookup(self, block):
+        addr = block << 64
+        for ipnet, track_len in self.monitored:
+            if addr >> (128 - ipnet.prefixlen) == int(ipnet.network_address) >> (128 - ipnet.prefixlen):
+                return ipnet, track_len
+        return None
+
+    def seen(self, block, slot):
+        # digest: block turned slot active
+        entry = self.lookup(block)
+        if entry is None:
+            return
+        if int(slots6([block])[0]) != slot:
+            logging.warning(f'IPv6 block {block:#x} reported in slot {slot}, expected {int(slots6([block])[0])}')
+        if block in self.counters:
+            self._remove(block)
+        self.counters[block] = self.alpha + 1
+        self.sizes[block] = 2**(64 - entry[1])
+        self.block_slot[block] = slot
+        self.slot_blocks.setdefault(slot, set()).add(block)
+
+    def _remove(self, block):
+        del self.counters[block]
+        del self.sizes[block]
+        slot = self.block_slot.pop(block)
+        blocks = self.slot_blocks[slot]
+        blocks.discard(block)
+        if not blocks:
+            del self.slot_blocks[slot]
+
+    def age(self, flagged):
+        """One sweep over the slots whose flag was set, returns the global6_table writes."""
+        flagged = set(flagged)
+        refreshed = set()
+        for slot in flagged:
+            for block in self.slot_blocks.get(slot, ()):
+                self.counters[block] = self.alpha + 1
+                refreshed.add(block)
+
+        changed = set(flagged)
+        for block in list(self.counters):
+            if block in refreshed:
+                continue
+            if self.counters[block] > 1:
+                self.counters[block] -= 1
+            else:
+                changed.add(self.block_slot[block])
+                self._remove(block)
+
+        if self.warmup:
+            self.warmup -= 1
+            if self.warmup:
+                return [], []
+            changed = range(self.slots)
+
+        # a slot stays active while any of its blocks is, or when its flag is set
+        # before the digest of the block made it to us
+        keys_1, keys_0 = [], []
+        for slot in changed:
+            value = 1 if slot in flagged or slot in self.slot_blocks else 0
+            if value != self.global_bits[slot]:
+                self.global_bits[slot] = value
+                (keys_1 if value else keys_0).append(slot)
+        return keys_1, keys_0
+
+    def busy_ranges(self):
+        # address ranges of the blocks reported in the busy slots, a slot
+        # being busy while it holds one
+        return merge([(b << 64, (b + self.sizes[b]) << 64)
+                      for blocks in self.slot_blocks.values() for b in blocks])
+
+    def inactive(self, covering_prefix=None):
+        """Inactive IPv6 prefixes: monitored space minus the blocks of busy slots."""
+        if self.warmup:
+            return []
+        ranges = []
+        for ipnet, _ in self.monitored:
+            ranges.append((int(ipnet.network_address), int(ipnet.broadcast_address) + 1))
+        if covering_prefix is not None:
+            net = ipaddress.IPv6Network(covering_prefix, strict=False)
+            lo, hi = int(net.network_address), int(net.broadcast_address) + 1
+            ranges = [(max(s, lo), min(e, hi)) for s, e in ranges if s < hi and e > lo]
+
+        prefixes = []
+        for start, end in subtract(merge(ranges), self.busy_ranges()):
+            prefixes.extend(str(net) for net in ipaddress.summarize_address_range(
+                ipaddress.IPv6Address(start), ipaddress.IPv6Address(end - 1)))
+        return prefixes
+
+
+def merge(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(r) for r in merged]
+
+
+def subtract(ranges, holes):
+    # both sorted and disjoint
+    result = []
+    i = 0
+    for start, end in ranges:
+        while i < len(holes) and holes[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(holes) and holes[j][0] < end:
+            if holes[j][0] > start:
+                result.append((start, holes[j][0]))
+            start = max(start, holes[j][1])
+            j += 1
+        if start < end:
+            result.append((start, end))
+    return result
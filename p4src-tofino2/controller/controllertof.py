@@ -53,51 +53,144 @@ LOG_PORT = 13
 THRESHOLD = 1024
 RECIRCULATE_PORT = 6
 NUM_PIPES = 2
+METER_BURST_PKTS = 100
+METER_BURST_KBITS = 1200 # 100 full-size packets
+TRACK_LEN = 32 # addresses are tracked one by one
+DARK_LEN = 24 # a dark meter per /24, see calc_idx
+
+# sweep engine shared with the bmv2 and Tofino controllers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'sweep'))
 
 # Here is the most important module
 import bfrt_grpc.client as gc
 from tabulate import tabulate
 import argparse, time, ipaddress
-from aggregate6 import aggregate
-from radix import Radix
-import threading
 import math
+from engine import SweepEngine, Backend
+
+
+class BfrtBackend(Backend):
+    """Registers and meters of the Tofino2 darknet program over bfrt_grpc.
+
+    Even addresses are kept in the *_table0 registers and odd ones in the
+    *_table1 registers: index i is entry i // 2 of bank i % 2.
+    """
+
+    def __init__(self, bfrt_info, dev_tgt):
+        self.dev_tgt = dev_tgt
+        self.global_tables = [bfrt_info.table_get('pipe.Ingress.global_table0'),
+                              bfrt_info.table_get('pipe.Ingress.global_table1')]
+        self.flag_tables = [bfrt_info.table_get('pipe.Ingress.flag_table0'),
+                            bfrt_info.table_get('pipe.Ingress.flag_table1')]
+        self.dark_meter = bfrt_info.table_get('pipe.Ingress.dark_meter')
+        self.dark_global_byte_meter = bfrt_info.table_get('pipe.Ingress.dark_global_byte_meter')
+        self.dark_byte_meter = bfrt_info.table_get('pipe.Ingress.dark_byte_meter')
+        self.dark_global_meter = bfrt_info.table_get('pipe.Ingress.dark_global_meter')
+
+    def read_register(self, table, index_range, flags={"from_hw": False}):
+        _keys = [table.make_key([gc.KeyTuple("$REGISTER_INDEX", index)]) for index in index_range]
+        data_name = table.info.data_dict_allname["f1"]
+        return [entry[0].to_dict()[data_name] for entry in table.entry_get(self.dev_tgt, _keys, flags=flags)]
+
+    def write_register(self, table, keys_1, keys_0):
+        if not keys_1 and not keys_0:
+            return
+        _keys = [table.make_key([gc.KeyTuple("$REGISTER_INDEX", index)]) for index in keys_1 + keys_0]
+        data_name = table.info.data_dict_allname["f1"]
+        _data = [table.make_data([gc.DataTuple(data_name, 1)])]*len(keys_1)
+        _data.extend([table.make_data([gc.DataTuple(data_name, 0)])]*len(keys_0))
+
+        table.entry_add(self.dev_tgt, _keys, _data)
+
+    def banks(self, indices):
+        # register entries of indices, per bank
+        banks = ([], [])
+        for i in indices:
+            banks[i % 2].append(i // 2)
+        return banks
+
+    def sync(self):
+        # sync software shadow with hardware, once per sweep
+        for table in self.flag_tables:
+            table.operations_execute(self.dev_tgt, 'Sync')
+
+    def read_flags(self, size, blocks=None):
+        flags = bytearray(size)
+        for bank, table in enumerate(self.flag_tables):
+            for j, t_val in enumerate(self.read_register(table, range((size - bank + 1) // 2))):
+                flags[2*j + bank] = int(any(t_val))
+        return flags
+
+    def write_global(self, ones, zeros, refreshed=()):
+        for table, keys_1, keys_0 in zip(self.global_tables, self.banks(ones), self.banks(zeros)):
+            self.write_register(table, keys_1, keys_0)
+
+    def clear_flags(self, indices):
+        for table, keys_0 in zip(self.flag_tables, self.banks(indices)):
+            self.write_register(table, [], keys_0)
+
+    def _meter_data(self, table, avg_pkt_rate, max_pkt_rate):
+        return table.make_data(
+            [gc.DataTuple('$METER_SPEC_CIR_PPS', avg_pkt_rate),
+             gc.DataTuple('$METER_SPEC_PIR_PPS', max_pkt_rate),
+             gc.DataTuple('$METER_SPEC_CBS_PKTS', METER_BURST_PKTS),
+             gc.DataTuple('$METER_SPEC_PBS_PKTS', METER_BURST_PKTS)])
+
+    def _byte_meter_data(self, table, avg_byte_rate, max_byte_rate):
+        # byte meters are programmed in kbit/s and kbit
+        return table.make_data(
+            [gc.DataTuple('$METER_SPEC_CIR_KBPS', math.ceil(avg_byte_rate * 8 / 1000)),
+             gc.DataTuple('$METER_SPEC_PIR_KBPS', math.ceil(max_byte_rate * 8 / 1000)),
+             gc.DataTuple('$METER_SPEC_CBS_KBITS', METER_BURST_KBITS),
+             gc.DataTuple('$METER_SPEC_PBS_KBITS', METER_BURST_KBITS)])
+
+    def program_meters(self, global_rates, block_rates):
+        if global_rates is not None:
+            _key = self.dark_global_meter.make_key([gc.KeyTuple('$METER_INDEX', 0)])
+            _data = self._meter_data(self.dark_global_meter, global_rates.avg_pkt_rate, global_rates.max_pkt_rate)
+            try:
+                self.dark_global_meter.entry_add(self.dev_tgt, [_key], [_data])
+            except:
+                pass
+            _key = self.dark_global_byte_meter.make_key([gc.KeyTuple('$METER_INDEX', 0)])
+            _data = self._byte_meter_data(self.dark_global_byte_meter, global_rates.avg_byte_rate,
+                                          global_rates.max_byte_rate)
+            try:
+                self.dark_global_byte_meter.entry_add(self.dev_tgt, [_key], [_data])
+            except:
+                pass
 
-class LocalClient:
+        key_field_list = []
+        data_field_list = []
+        byte_key_field_list = []
+        byte_data_field_list = []
+        for idx, rates in block_rates.items():
+            key_field_list.append(self.dark_meter.make_key([gc.KeyTuple('$METER_INDEX', idx)]))
+            data_field_list.append(self._meter_data(self.dark_meter, rates.avg_pkt_rate, rates.max_pkt_rate))
+            byte_key_field_list.append(self.dark_byte_meter.make_key([gc.KeyTuple('$METER_INDEX', idx)]))
+            byte_data_field_list.append(self._byte_meter_data(self.dark_byte_meter, rates.avg_byte_rate,
+                                                              rates.max_byte_rate))
+        try:
+            self.dark_meter.entry_add(self.dev_tgt, key_field_list, data_field_list)
+        except:
+            pass
+        try:
+            self.dark_byte_meter.entry_add(self.dev_tgt, byte_key_field_list, byte_data_field_list)
+        except:
+            pass
+
+class LocalClient(SweepEngine):
     def __init__(self, time_interval, global_table_size, dark_meter_size, alpha, monitored_path, ports,\
                 max_pkt_rate, max_byte_rate, avg_pkt_rate, avg_byte_rate):         
+        # global_table_size entries in each of the two banks; the initial
+        # per-address rates stay over global_table_size, as before the engine
+        SweepEngine.__init__(self, global_table_size*2, dark_meter_size, alpha, max_pkt_rate, max_byte_rate,
+                             avg_pkt_rate, avg_byte_rate, rate_divisor=global_table_size)
         self.time_interval = time_interval*60 # convert to sec
-        self.global_table_size = global_table_size
-        self.dark_prefix_index_mapping = dict()
-        self.alpha = alpha
-        self.counters = [self.alpha]*(self.global_table_size*2)
         self.monitored_path = monitored_path
-        self.index_prefix_mapping = []
-        self.prefix_index_mapping = Radix()
         self.ports = ports
-
-        self.max_pkt_rate = max_pkt_rate
-        self.max_byte_rate = max_byte_rate
-        self.avg_pkt_rate = avg_pkt_rate
-        self.avg_byte_rate = avg_byte_rate
-        # max pkt rate per address
-        self.max_pkt_rate_addr = round(self.max_pkt_rate / self.global_table_size, 3)
-        self.max_byte_rate_addr = round(self.max_byte_rate / self.global_table_size, 3)
-        self.avg_pkt_rate_addr = round(self.avg_pkt_rate / self.global_table_size, 3)
-        self.avg_byte_rate_addr = round(self.avg_byte_rate / self.global_table_size, 3)
-
-        self.lock = threading.Lock()
         self._setup()
 
-    def parse_monitored(self, path):
-        monitored_prefixes = []
-        with open(path, 'r') as f:
-            for line in f:
-                if line.startswith('#'):
-                    continue
-                monitored_prefixes.append(line[:-1])
-        return monitored_prefixes
-
     def _setup(self):
         bfrt_client_id = 0
 
@@ -114,12 +207,7 @@ class LocalClient:
         self.ports_table = self.bfrt_info.table_get('pipe.Ingress.ports')
         self.monitored_table = self.bfrt_info.table_get('pipe.Ingress.monitored')
         self.monitored_table.info.key_field_annotation_add('meta.addr', 'ipv4')
-        self.global_table0 = self.bfrt_info.table_get('pipe.Ingress.global_table0')
-        self.flag_table0 = self.bfrt_info.table_get('pipe.Ingress.flag_table0')
-        self.global_table1 = self.bfrt_info.table_get('pipe.Ingress.global_table1')
-        self.flag_table1 = self.bfrt_info.table_get('pipe.Ingress.flag_table1')
-        self.dark_meter = self.bfrt_info.table_get('pipe.Ingress.dark_meter')
-        self.dark_global_meter = self.bfrt_info.table_get('pipe.Ingress.dark_global_meter')
+        self.backend = BfrtBackend(self.bfrt_info, self.dev_tgt)
         self.interface.bind_pipeline_config(self.bfrt_info.p4_name_get())
         self.add_mirroring([10, 10, 11], 1, 2)
         monitored_prefixes = self.parse_monitored(self.monitored_path)
@@ -127,62 +215,6 @@ class LocalClient:
         self.add_ports(self.ports)
         self.set_rates()
 
-    def set_rates(self):
-        # set global rate
-        print(self.max_pkt_rate)
-        _key = self.dark_global_meter.make_key([gc.KeyTuple('$METER_INDEX', 0)])
-        _data = self.dark_global_meter.make_data(
-            [gc.DataTuple('$METER_SPEC_CIR_PPS', self.avg_pkt_rate),
-             gc.DataTuple('$METER_SPEC_PIR_PPS', self.max_pkt_rate),
-             gc.DataTuple('$METER_SPEC_CBS_PKTS', 100),
-             gc.DataTuple('$METER_SPEC_PBS_PKTS', 100)])
-        try:
-                self.dark_global_meter.entry_add(self.dev_tgt, [_key], [_data])
-        except:
-            pass
-
-        # only for packet rate for now
-        prefix_max_pkt_rate = math.ceil(self.max_pkt_rate_addr * 256) # per /24
-        prefix_avg_pkt_rate = math.ceil(self.avg_pkt_rate_addr * 256) # per /24
-
-        key_field_list = []
-        data_field_list = []
-        for i in range(len(self.dark_prefix_index_mapping)):
-            # set rate for /24
-            key_field_list.append(self.dark_meter.make_key([gc.KeyTuple('$METER_INDEX', i)]))
-            data_field_list.append(self.dark_meter.make_data(
-            [gc.DataTuple('$METER_SPEC_CIR_PPS', prefix_avg_pkt_rate),
-             gc.DataTuple('$METER_SPEC_PIR_PPS', prefix_max_pkt_rate),
-             gc.DataTuple('$METER_SPEC_CBS_PKTS', 100),
-             gc.DataTuple('$METER_SPEC_PBS_PKTS', 100)]))
-        try:
-            self.dark_meter.entry_add(self.dev_tgt, key_field_list, data_field_list)
-        except:
-            pass
-
-    def update_rates(self, inactive_pfxs, inactive_addr):
-        addr_avg_pkt_rate = math.ceil(self.avg_pkt_rate / inactive_addr) # per /24
-        addr_max_pkt_rate = math.ceil(self.max_pkt_rate / inactive_addr) # per /24
-
-        key_field_list = []
-        data_field_list = []
-        for inactive_pfx, in_addr in inactive_pfxs.items():
-            prefix_max_pkt_rate = math.ceil(addr_max_pkt_rate * in_addr) # per /24
-            prefix_avg_pkt_rate = math.ceil(addr_avg_pkt_rate * in_addr) # per /24
-
-            idx = self.dark_prefix_index_mapping[inactive_pfx]
-            key_field_list.append(self.dark_meter.make_key([gc.KeyTuple('$METER_INDEX', idx)]))
-            data_field_list.append(self.dark_meter.make_data(
-            [gc.DataTuple('$METER_SPEC_CIR_PPS', prefix_avg_pkt_rate),
-             gc.DataTuple('$METER_SPEC_PIR_PPS', prefix_max_pkt_rate),
-             gc.DataTuple('$METER_SPEC_CBS_PKTS', 100),
-             gc.DataTuple('$METER_SPEC_PBS_PKTS', 100)]))
-
-        try:
-            self.dark_meter.entry_add(self.dev_tgt, key_field_list, data_field_list)
-        except:
-            pass
-
     def add_ports(self, ports):
         # incoming
         for port in ports['incoming']:
@@ -205,38 +237,30 @@ class LocalClient:
     def optimize_allocation(self, switches):
         pass
 
+    def parse_entry(self, entry):
+        # prefix/length, tracked by address
+        ipnet = ipaddress.IPv4Network(entry.split()[0])
+        # both banks hold half of every prefix
+        if ipnet.prefixlen > 31:
+            raise ValueError(f'{entry}: prefix must be a /31 or larger')
+        return ipnet, TRACK_LEN, max(DARK_LEN, ipnet.prefixlen)
+
     def populate_monitored(self, entries):
-        base_idx = 0
-        dark_base_idx = 0
-        for entry in entries:
-            prefix, length = entry.split('/')
-            mask = 2**(31 - int(length)) - 1
-            _keys = self.monitored_table.make_key([gc.KeyTuple('meta.addr', prefix, None, int(length))])
+        self.monitored = self.layout(entries)
+        for m in self.monitored:
+            mask = 2**(31 - m.ipnet.prefixlen) - 1
+            _keys = self.monitored_table.make_key([gc.KeyTuple('meta.addr', str(m.ipnet.network_address), None,
+                                                               m.ipnet.prefixlen)])
             _data = self.monitored_table.make_data([
-                gc.DataTuple('base_idx', base_idx),
+                gc.DataTuple('base_idx', m.base_idx // 2),
                 gc.DataTuple('mask', mask),
-                gc.DataTuple('dark_base_idx', dark_base_idx)
+                gc.DataTuple('dark_base_idx', m.dark_base_idx)
                 ], 'Ingress.calc_idx')
             try:
                 self.monitored_table.entry_add(self.dev_tgt, [_keys], [_data])
             except:
                 pass
-            # save in local dictionary in /32s
-            ipnet = ipaddress.IPv4Network(entry)
-            netws = list(ipnet.subnets(new_prefix=32))
-            self.index_prefix_mapping.extend(netws)
-
-            for i in range(len(netws)):
-                node = self.prefix_index_mapping.add(str(netws[i]))
-                node.data['index'] = 2*base_idx + i
-            base_idx += len(netws) / 2
-
-            dark_netws = list(ipnet.subnets(new_prefix=24))
-            for i in range(len(dark_netws)):
-                dark_netw = '.'.join(str(dark_netws[i]).split('.')[:3])
-                self.dark_prefix_index_mapping[dark_netw] = dark_base_idx + i            
-
-            dark_base_idx += len(dark_netws)
+        self.map_monitored()
 
     def add_mirroring(self, eg_ports, mc_session_id, log_session_id):
         mirror_table = self.bfrt_info.table_get('$mirror.cfg')
@@ -352,81 +376,6 @@ class LocalClient:
         headers = ['Full Table Name','Type','Usage','Capacity']
         return data, headers
 
-    def read_register(self, table, index, flags={"from_hw": True}):
-        _keys = table.make_key([gc.KeyTuple("$REGISTER_INDEX", index)])
-        data, _ = next(table.entry_get(
-            self.dev_tgt,
-            [
-                _keys
-            ],
-            flags=flags
-        ))
-        data_name = table.info.data_dict_allname["f1"]
-        return data.to_dict()[data_name]
-
-    def write_register(self, table, index, value, flags={"from_hw": True}):
-
-        _keys = table.make_key([gc.KeyTuple("$REGISTER_INDEX", index)])
-        data_name = table.info.data_dict_allname["f1"]
-        _data = table.make_data([gc.DataTuple(data_name, value)])
-
-        table.entry_add(self.dev_tgt, [_keys], [_data])
-
-    def get_inactive_prefixes(self, covering_prefix=None):
-        inactive_prefixes = []
-        with self.lock:
-            if covering_prefix is None:
-                for i in range(len(self.index_prefix_mapping)):
-                    if not self.counters[i]:
-                        inactive_prefixes.append(str(self.index_prefix_mapping[i]))
-            else:
-                covered = self.prefix_index_mapping.search_covered(covering_prefix)
-                for node in covered:
-                    if not self.counters[node.data['index']]:
-                        inactive_prefixes.append(str(node.prefix))
-        
-        return aggregate(inactive_prefixes)
-
-    def run(self):
-        while True:
-            logging.info('Starting collecting values...')
-            # collect global table(s)
-            inactive_pfxs = dict()
-            inactive_addr = 0
-            for i in range(len(self.index_prefix_mapping)):
-                active = 0
-
-                flag_table = self.flag_table0 if not i%2 else self.flag_table1
-                global_table = self.global_table0 if not i%2 else self.global_table1
-
-                t_val = self.read_register(flag_table, int(i/2))
-                active |= int(any(t_val))
-                with self.lock:
-                    if active:
-                        if not self.counters[i]:
-                            self.write_register(global_table, int(i/2) , 1)
-                            logging.warning(f'Prefix {self.index_prefix_mapping[i]} became active.')
-                        self.write_register(flag_table, int(i/2), 0)
-                        self.counters[i] = self.alpha + 1
-                    else:
-                        if self.counters[i] > 1:
-                            self.counters[i] -= 1
-                        else:
-                            inactive_addr += 1
-                            pfx = ".".join(str(self.index_prefix_mapping[i]).split(".")[:3])
-                            if pfx not in inactive_pfxs:
-                                inactive_pfxs[pfx] = 0
-                            inactive_pfxs[pfx] += 1
-
-                            if self.counters[i] == 1:
-                                self.write_register(global_table, int(i/2), 0)
-                                self.counters[i] = 0
-
-            self.update_rates(inactive_pfxs, inactive_addr)
-     
-            logging.info(f'Waiting for {self.time_interval} secs...')
-            time.sleep(self.time_interval)
-
 '''
 
 if __name__ == "__main__":
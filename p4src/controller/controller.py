@@ -32,50 +32,86 @@
 # NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
 # MODIFICATIONS.
 
+import os
+import sys
 from p4utils.utils.helper import load_topo
 from p4utils.utils.sswitch_thrift_API import SimpleSwitchThriftAPI
 import argparse
-from radix import Radix
-import threading
 import time
 import ipaddress
-from aggregate6 import aggregate
 import logging
-import math
+import numpy as np
+
+# sweep engine shared with the Tofino controllers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'sweep'))
+from engine import SweepEngine, Backend, index_runs
 
 logging.basicConfig(level="DEBUG",
                         format="%(asctime)s|%(levelname)s: %(message)s",
                         datefmt="%Y-%m-%d %H:%M:%S")
 LOG_PORT = 6
 THRESHOLD = 1024
+METER_BURST_BYTES = 15000 # 10 full-size packets
+TRACK_LEN = 32 # default tracking granularity
+DARK_LEN = 24 # default dark meter granularity
+
+
+class ThriftBackend(Backend):
+    """Registers and meters of every bmv2 switch over Thrift.
+
+    A flag counts if any switch set it, writes go to all of them.
+    """
+
+    def __init__(self, controllers):
+        self.controllers = controllers
+
+    def read_flags(self, size, blocks=None):
+        # one read of the whole register per switch
+        flags = np.zeros(size, dtype=bool)
+        for controller in self.controllers.values():
+            flags |= np.asarray(controller.register_read('MyIngress.flag_table')[:size]) != 0
+        return bytearray(flags.tobytes())
+
+    def write_register(self, register, indices, value):
+        # runs of consecutive indices are written as a range
+        for first, last in index_runs(indices):
+            index = first if first == last else [first, last]
+            for controller in self.controllers.values():
+                controller.register_write(register, index, value)
+
+    def write_global(self, ones, zeros, refreshed=()):
+        self.write_register('MyIngress.global_table', ones, 1)
+        self.write_register('MyIngress.global_table', zeros, 0)
 
+    def clear_flags(self, indices):
+        self.write_register('MyIngress.flag_table', indices, 0)
 
-class LocalClient:
+    def program_meters(self, global_rates, block_rates):
+        # byte meters run in bytes per microsecond
+        for controller in self.controllers.values():
+            if global_rates is not None:
+                controller.meter_set_rates('MyIngress.dark_global_meter', 0,
+                                           [(global_rates.avg_pkt_rate, 100), (global_rates.max_pkt_rate, 100)])
+                controller.meter_set_rates('MyIngress.dark_global_byte_meter', 0,
+                                           [(global_rates.avg_byte_rate / 1e6, METER_BURST_BYTES),
+                                            (global_rates.max_byte_rate / 1e6, METER_BURST_BYTES)])
+            for idx, rates in block_rates.items():
+                controller.meter_set_rates('MyIngress.dark_meter', idx, [(rates.avg_pkt_rate, 100), (rates.max_pkt_rate, 100)])
+                controller.meter_set_rates('MyIngress.dark_byte_meter', idx,
+                                           [(rates.avg_byte_rate / 1e6, METER_BURST_BYTES),
+                                            (rates.max_byte_rate / 1e6, METER_BURST_BYTES)])
+
+
+class LocalClient(SweepEngine):
     def __init__(self, time_interval, global_table_size, dark_meter_size, alpha, monitored_path, ports,\
                 max_pkt_rate, max_byte_rate, avg_pkt_rate, avg_byte_rate):
+        SweepEngine.__init__(self, global_table_size, dark_meter_size, alpha, max_pkt_rate, max_byte_rate,
+                             avg_pkt_rate, avg_byte_rate)
         self.time_interval = time_interval*60
-        self.global_table_size = global_table_size
-        self.dark_meter_size = dark_meter_size
-        self.alpha = alpha
-        self.counters = [self.alpha]*self.global_table_size
         self.monitored_path = monitored_path
-        self.index_prefix_mapping = []
-        self.prefix_index_mapping = Radix()
-        self.dark_prefix_index_mapping = dict()
         self.ports = ports
 
-        self.max_pkt_rate = max_pkt_rate
-        self.max_byte_rate = max_byte_rate
-        self.avg_pkt_rate = avg_pkt_rate
-        self.avg_byte_rate = avg_byte_rate
-        # max pkt rate per address
-        self.max_pkt_rate_addr = round(self.max_pkt_rate / self.global_table_size, 3)
-        self.max_byte_rate_addr = round(self.max_byte_rate / self.global_table_size, 3)
-        self.avg_pkt_rate_addr = round(self.avg_pkt_rate / self.global_table_size, 3)
-        self.avg_byte_rate_addr = round(self.avg_byte_rate / self.global_table_size, 3)
-
         self.controllers = dict()
-        self.lock = threading.Lock()
         self.topo = None
         self._setup()
 
@@ -85,6 +121,7 @@ class LocalClient:
         for p4switch in self.topo.get_p4switches():
             thrift_port = self.topo.get_thrift_port(p4switch)
             self.controllers[p4switch] = SimpleSwitchThriftAPI(thrift_port)
+        self.backend = ThriftBackend(self.controllers)
 
         # set initial values of registers
         for sw, controller in self.controllers.items():
@@ -95,36 +132,11 @@ class LocalClient:
                 else:
                     controller.register_reset(register)
         self.add_mirroring(100, 200)
-        monitored_prefixes = self._read_monitored_prefixes(self.monitored_path)
+        monitored_prefixes = self.parse_monitored(self.monitored_path)
         self.populate_monitored(monitored_prefixes)
         self.add_ports(self.ports)
         self.set_rates()
 
-    def set_rates(self):
-        # set global rate
-        for controller in self.controllers.values():
-            controller.meter_set_rates('MyIngress.dark_global_meter', 0, [(self.avg_pkt_rate, 100), (self.max_pkt_rate, 100)])
-
-        # only for packet rate for now
-        prefix_max_pkt_rate = math.ceil(self.max_pkt_rate_addr * 256) # per /24
-        prefix_avg_pkt_rate = math.ceil(self.avg_pkt_rate_addr * 256) # per /24
-
-        for controller in self.controllers.values():
-            for i in range(len(self.dark_prefix_index_mapping)):
-                controller.meter_set_rates('MyIngress.dark_meter', i, [(prefix_avg_pkt_rate, 100), (prefix_max_pkt_rate, 100)])
-    
-    def update_rates(self, inactive_pfxs, inactive_addr):
-        addr_avg_pkt_rate = math.ceil(self.avg_pkt_rate / inactive_addr) # per /24
-        addr_max_pkt_rate = math.ceil(self.max_pkt_rate / inactive_addr) # per /24
-
-        for inactive_pfx, in_addr in inactive_pfxs.items():
-            prefix_max_pkt_rate = math.ceil(addr_max_pkt_rate * in_addr) # per /24
-            prefix_avg_pkt_rate = math.ceil(addr_avg_pkt_rate * in_addr) # per /24
-            idx = self.dark_prefix_index_mapping[inactive_pfx]
-
-            for controller in self.controllers.values():
-                controller.meter_set_rates('MyIngress.dark_meter', idx, [(prefix_avg_pkt_rate, 100), (prefix_max_pkt_rate, 100)])
-
     def add_ports(self, ports):
         for port in ports['incoming']:
             for controller in self.controllers.values():
@@ -133,37 +145,29 @@ class LocalClient:
             for controller in self.controllers.values():
                 controller.table_add('MyIngress.ports', 'set_outgoing', [str(port)], [])
 
+    def parse_entry(self, entry):
+        # prefix/length [tracking length [dark meter length]]
+        fields = entry.split()
+        ipnet = ipaddress.IPv4Network(fields[0])
+        track_len = int(fields[1]) if len(fields) > 1 else TRACK_LEN
+        dark_len = int(fields[2]) if len(fields) > 2 else DARK_LEN
+        # blocks can not be larger than the monitored prefix itself
+        track_len = max(track_len, ipnet.prefixlen)
+        dark_len = max(dark_len, ipnet.prefixlen)
+        if track_len > 32:
+            raise ValueError(f'{entry}: tracking length must be at most /32')
+        if dark_len > track_len:
+            raise ValueError(f'{entry}: dark meter length must not exceed the tracking length')
+        return ipnet, track_len, dark_len
+
     def populate_monitored(self, entries):
-        base_idx = 0
-        dark_base_idx = 0
-        for entry in entries:
-            length = entry.split('/')[-1]
+        self.monitored = self.layout(entries)
+        for m in self.monitored:
             for controller in self.controllers.values():
-                controller.table_add('MyIngress.monitored', 'calc_idx', [entry], action_params=[str(base_idx), length, str(dark_base_idx)])            # save in local dictionary
-            ipnet = ipaddress.IPv4Network(entry)
-            netws = list(ipnet.subnets(new_prefix=32))
-            self.index_prefix_mapping.extend(netws)
-
-            for i in range(len(netws)):
-                node = self.prefix_index_mapping.add(str(netws[i]))
-                node.data['index'] = base_idx + i
-
-            dark_netws = list(ipnet.subnets(new_prefix=24))
-            for i in range(len(dark_netws)):
-                dark_netw = '.'.join(str(dark_netws[i]).split('.')[:3])
-                self.dark_prefix_index_mapping[dark_netw] = dark_base_idx + i            
-
-            base_idx += len(netws)
-            dark_base_idx += len(dark_netws)
-
-    def _read_monitored_prefixes(self, path):
-        monitored_prefixes = []
-        with open(path, 'r') as f:
-            for line in f:
-                if line.startswith('#'):
-                    continue
-                monitored_prefixes.append(line)
-        return monitored_prefixes
+                controller.table_add('MyIngress.monitored', 'calc_idx', [str(m.ipnet)],
+                                     action_params=[str(m.base_idx), str(m.ipnet.prefixlen), str(m.dark_base_idx),
+                                                    str(32 - m.track_len), str(32 - m.dark_len)])
+        self.map_monitored()
 
     def add_mirroring(self, mc_session_id, log_session_id):
         mc_grp_id = 1
@@ -181,61 +185,6 @@ class LocalClient:
                     rid += 1
             controller.mirroring_add_mc(mc_session_id, mc_grp_id)
             controller.mirroring_add(log_session_id, LOG_PORT)
-     
-    def get_inactive_prefixes(self, covering_prefix=None):
-        inactive_prefixes = []
-        with self.lock:
-            if covering_prefix is None:
-                for i in range(len(self.index_prefix_mapping)):
-                    if not self.counters[i]:
-                        inactive_prefixes.append(str(self.index_prefix_mapping[i]))
-            else:
-                covered = self.prefix_index_mapping.search_covered(covering_prefix)
-                for node in covered:
-                    if not self.counters[node.data['index']]:
-                        inactive_prefixes.append(str(node.prefix))
-        
-            return aggregate(inactive_prefixes)
-        
-    def run(self):
-        while True:
-            logging.info('Starting collecting values...')
-            # collect global table(s)
-            inactive_pfxs = dict()
-            inactive_addr = 0
-            for i in range(len(self.index_prefix_mapping)):
-                active = 0
-                for controller in self.controllers.values():
-                    t_val = controller.register_read('MyIngress.flag_table', i)
-                    active |= t_val
-                with self.lock:
-                    if active:
-                        for controller in self.controllers.values():
-                            if not self.counters[i]:
-                                controller.register_write('MyIngress.global_table', i , 1)
-                            controller.register_write('MyIngress.flag_table', i, 0)
-                        logging.warning(f'Prefix {self.index_prefix_mapping[i]} became active.')
-                        self.counters[i] = self.alpha + 1
-                    else:
-                        if self.counters[i] > 1:
-                            self.counters[i] -= 1
-                        else:
-                            inactive_addr += 1
-                            pfx = ".".join(str(self.index_prefix_mapping[i]).split(".")[:3])
-                            if pfx not in inactive_pfxs:
-                                inactive_pfxs[pfx] = 0
-                            inactive_pfxs[pfx] += 1
-
-                            if self.counters[i] == 1:
-                                for controller in self.controllers.values():
-                                    controller.register_write('MyIngress.global_table', i, 0)
-                                self.counters[i] = 0
-
-            self.update_rates(inactive_pfxs, inactive_addr)
-
-            logging.info(f'Waiting for {self.time_interval/60} mins...')
-            time.sleep(self.time_interval)
-
 
 '''
 
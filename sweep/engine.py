@@ -0,0 +1,409 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Sweep engine shared by the bmv2, Tofino and Tofino2 controllers: the
+# counter store, aging, dark meter rates and state snapshots. Each target
+# only provides a Backend, the register and meter I/O of its data plane.
+
+import math
+import time
+import base64
+import logging
+import operator
+import ipaddress
+import threading
+import zlib
+from collections import namedtuple
+
+import numpy as np
+from aggregate6 import aggregate
+from radix import Radix
+
+# register and dark meter ranges of one monitored table entry
+MonitoredEntry = namedtuple('MonitoredEntry', ['ipnet', 'track_len', 'dark_len', 'base_idx', 'dark_base_idx',
+                                               'size', 'dark_size'])
+# packets/s and bytes/s of a meter
+MeterRates = namedtuple('MeterRates', ['avg_pkt_rate', 'max_pkt_rate', 'avg_byte_rate', 'max_byte_rate'])
+# outcome of aging every block by one sweep
+Aging = namedtuple('Aging', ['activated', 'deactivated', 'refreshed', 'inactive_pfxs', 'inactive_addr'])
+
+
+def index_runs(indices):
+    # (first, last) of the runs of consecutive indices
+    runs = []
+    for i in sorted(indices):
+        if runs and runs[-1][1] == i - 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return [tuple(run) for run in runs]
+
+
+class Backend:
+    """Register and meter I/O of one data plane, indexed like the counters.
+
+    sync() makes the flags set so far readable, read_flags() returns them
+    in bulk, write_global() and clear_flags() write back the outcome of a
+    sweep and program_meters() sets the dark meters.
+    """
+
+    def sync(self):
+        pass
+
+    def read_flags(self, size, blocks=None):
+        """Flags of the indices below size, 1 where any switch or pipe set it.
+
+        blocks are the (start, end) index ranges of the dark blocks, for a
+        backend that can tell which ones saw no traffic at all.
+        """
+        raise NotImplementedError
+
+    def write_global(self, ones, zeros, refreshed=()):
+        """Set the global bits of ones and clear those of zeros.
+
+        refreshed are the indices whose flag was read set, for a backend
+        whose data plane sets global bits on its own and may need them
+        written again.
+        """
+        raise NotImplementedError
+
+    def clear_flags(self, indices):
+        raise NotImplementedError
+
+    def program_meters(self, global_rates, block_rates):
+        """Set the global meters (unless None) and {dark index: MeterRates}."""
+        raise NotImplementedError
+
+
+class MemoryBackend(Backend):
+    """A data plane in memory, for running the engine without a switch."""
+
+    def __init__(self, size, dark_size):
+        self.flags = bytearray(size)
+        self.global_table = bytearray([1]) * size
+        self.global_rates = None
+        self.block_rates = [None] * dark_size
+
+    def read_flags(self, size, blocks=None):
+        return self.flags[:size]
+
+    def write_global(self, ones, zeros, refreshed=()):
+        for i in ones:
+            self.global_table[i] = 1
+        for i in zeros:
+            self.global_table[i] = 0
+
+    def clear_flags(self, indices):
+        for i in indices:
+            self.flags[i] = 0
+
+    def program_meters(self, global_rates, block_rates):
+        if global_rates is not None:
+            self.global_rates = global_rates
+        for i, rates in block_rates.items():
+            self.block_rates[i] = rates
+
+    # data-plane side: outgoing traffic from these indices
+    def traffic(self, indices):
+        for i in indices:
+            self.flags[i] = 1
+            self.global_table[i] = 1
+
+
+class SweepEngine:
+    """Counters of the tracked blocks and the sweep that ages them.
+
+    A controller sets self.backend, parses its monitored entries with its
+    own parse_entry() into self.monitored and calls map_monitored(); the
+    sweep, the dark meter rates and the queries then only go through the
+    backend.
+    """
+
+    def __init__(self, global_table_size, dark_meter_size, alpha, max_pkt_rate, max_byte_rate,
+                 avg_pkt_rate, avg_byte_rate, rate_divisor=None):
+        self.backend = None
+        self.switch = None
+        self.global_table_size = global_table_size
+        self.dark_meter_size = dark_meter_size
+        self.alpha = alpha
+        self.counters = [self.alpha]*self.global_table_size
+        # sweep of the last active/inactive transition of every index
+        self.sweeps = 0
+        self.last_change = np.zeros(self.global_table_size, dtype=np.uint32)
+        self.monitored = []
+        self.index_prefix_mapping = []
+        self.prefix_index_mapping = Radix()
+        self.dark_index_mapping = []
+        self.dark_index_prefix_mapping = []
+        self.dark_index_ranges = []
+        # addresses behind every index
+        self.block_addrs = np.zeros(0, dtype=np.int64)
+        # counters of alternative alpha values, a row each, see set_what_if
+        self.what_if = None
+        self.what_if_alphas = None
+
+        self.max_pkt_rate = max_pkt_rate
+        self.max_byte_rate = max_byte_rate
+        self.avg_pkt_rate = avg_pkt_rate
+        self.avg_byte_rate = avg_byte_rate
+        self.rates = MeterRates(avg_pkt_rate, max_pkt_rate, avg_byte_rate, max_byte_rate)
+        # rates per address, the global rates over rate_divisor (global_table_size by default)
+        self.addr_rates = MeterRates(*(round(rate / (rate_divisor or self.global_table_size), 3) for rate in self.rates))
+
+        self.lock = threading.Lock()
+        # bumped whenever the inactive state or the layout changes
+        self.epoch = 0
+        self.last_sweep = None
+        self._state = None
+
+    def parse_monitored(self, path):
+        monitored_prefixes = []
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                monitored_prefixes.append(line)
+        return monitored_prefixes
+
+    def layout(self, entries, global_table_size=None, dark_meter_size=None):
+        # contiguous register and dark meter ranges, in the order of entries
+        global_table_size = global_table_size or self.global_table_size
+        dark_meter_size = dark_meter_size or self.dark_meter_size
+        layout = []
+        base_idx = 0
+        dark_base_idx = 0
+        for entry in entries:
+            ipnet, track_len, dark_len = self.parse_entry(entry)
+            size = 2**(track_len - ipnet.prefixlen)
+            dark_size = 2**(dark_len - ipnet.prefixlen)
+            if base_idx + size > global_table_size:
+                raise ValueError(f'{entry}: needs {size} entries, {global_table_size - base_idx} left')
+            if dark_base_idx + dark_size > dark_meter_size:
+                raise ValueError(f'{entry}: needs {dark_size} dark meters, {dark_meter_size - dark_base_idx} left')
+            layout.append(MonitoredEntry(ipnet, track_len, dark_len, base_idx, dark_base_idx, size, dark_size))
+            base_idx += size
+            dark_base_idx += dark_size
+        return layout
+
+    def map_monitored(self):
+        # save in local dictionary
+        self.index_prefix_mapping = []
+        self.prefix_index_mapping = Radix()
+        self.dark_index_mapping = []
+        self.dark_index_prefix_mapping = []
+        self.dark_index_ranges = []
+        self.block_addrs = np.concatenate([np.full(m.size, 2**(32 - m.track_len), dtype=np.int64)
+                                           for m in self.monitored] or [self.block_addrs[:0]])
+        for m in self.monitored:
+            netws = list(m.ipnet.subnets(new_prefix=m.track_len))
+            self.index_prefix_mapping.extend(netws)
+
+            for i in range(len(netws)):
+                node = self.prefix_index_mapping.add(str(netws[i]))
+                node.data['index'] = m.base_idx + i
+
+            # every tracked block falls in exactly one dark block
+            blocks_per_dark = m.size // m.dark_size
+            self.dark_index_mapping.extend(m.dark_base_idx + i // blocks_per_dark for i in range(m.size))
+            self.dark_index_prefix_mapping.extend(m.ipnet.subnets(new_prefix=m.dark_len))
+            self.dark_index_ranges.extend((m.base_idx + j*blocks_per_dark, m.base_idx + (j + 1)*blocks_per_dark)
+                                          for j in range(m.dark_size))
+
+    def age(self, flags):
+        # one sweep of every block, flags[i] set if block i sent traffic
+        activated = []
+        deactivated = []
+        refreshed = []
+        inactive_pfxs = dict()
+        inactive_addr = 0
+        for i in range(len(self.index_prefix_mapping)):
+            with self.lock:
+                if flags[i]:
+                    refreshed.append(i)
+                    if not self.counters[i]:
+                        activated.append(i)
+                        logging.warning(f'Prefix {self.index_prefix_mapping[i]} became active.')
+                    self.counters[i] = self.alpha + 1
+                elif self.counters[i] > 1:
+                    self.counters[i] -= 1
+                else:
+                    addrs = self.index_prefix_mapping[i].num_addresses
+                    inactive_addr += addrs
+                    pfx = self.dark_index_mapping[i]
+                    if pfx not in inactive_pfxs:
+                        inactive_pfxs[pfx] = 0
+                    inactive_pfxs[pfx] += addrs
+
+                    if self.counters[i] == 1:
+                        deactivated.append(i)
+                        self.counters[i] = 0
+        with self.lock:
+            self.sweeps += 1
+            self.last_change[activated] = self.sweeps
+            self.last_change[deactivated] = self.sweeps
+            if self.what_if is not None:
+                self.age_what_if(flags)
+        return Aging(activated, deactivated, refreshed, inactive_pfxs, inactive_addr)
+
+    def set_what_if(self, alphas):
+        # the configured alpha is kept as well, to compare against
+        self.what_if_alphas = np.array(sorted(set(alphas) | {self.alpha}), dtype=np.uint16)
+        if self.what_if_alphas[-1] == np.iinfo(np.uint16).max:
+            raise ValueError(f'alpha must be below {np.iinfo(np.uint16).max}')
+        self.what_if = np.repeat(self.what_if_alphas[:, None], self.global_table_size, axis=1)
+        # sweeps and addresses that changed state, per alpha
+        self.what_if_sweeps = 0
+        self.what_if_churn = np.zeros(len(self.what_if_alphas), dtype=np.int64)
+        self.what_if_total_churn = np.zeros(len(self.what_if_alphas), dtype=np.int64)
+
+    def age_what_if(self, flags):
+        # the aging of age() for every alpha at once, from the same flags
+        size = len(self.index_prefix_mapping)
+        active = np.frombuffer(bytes(flags[:size]), dtype=np.uint8) != 0
+        counters = self.what_if[:, :size]
+        dark = counters == 0
+        np.subtract(counters, 1, out=counters, where=~dark)
+        counters[:, active] = (self.what_if_alphas + 1)[:, None]
+        self.what_if_churn = (dark != (counters == 0)) @ self.block_addrs
+        self.what_if_total_churn += self.what_if_churn
+        self.what_if_sweeps += 1
+
+    def get_what_if(self):
+        # inactive addresses and churn (addresses that changed state) per alpha
+        with self.lock:
+            if self.what_if is None:
+                return None
+            size = len(self.index_prefix_mapping)
+            inactive = (self.what_if[:, :size] == 0) @ self.block_addrs
+            return {
+                'sweeps': self.what_if_sweeps,
+                'addresses': int(self.block_addrs.sum()),
+                'alphas': [{
+                    'alpha': int(alpha),
+                    'current': int(alpha) == self.alpha,
+                    'inactive': int(inactive[k]),
+                    'churn': int(self.what_if_churn[k]),
+                    'mean_churn': float(self.what_if_total_churn[k] / self.what_if_sweeps) if self.what_if_sweeps else 0.0,
+                } for k, alpha in enumerate(self.what_if_alphas)],
+            }
+
+    def dark_rates(self, addr_rates, addrs):
+        # rates of a dark block with addrs addresses behind it
+        return MeterRates(*(math.ceil(rate * addrs) for rate in addr_rates))
+
+    def set_rates(self):
+        # global rates, and each dark block in proportion to its size
+        self.backend.program_meters(self.rates, {i: self.dark_rates(self.addr_rates, dark_netw.num_addresses)
+                                                 for i, dark_netw in enumerate(self.dark_index_prefix_mapping)})
+
+    def update_rates(self, inactive_pfxs, inactive_addr):
+        # nothing is dark, nothing to redistribute
+        if not inactive_addr:
+            return
+        addr_rates = MeterRates(*(math.ceil(rate / inactive_addr) for rate in self.rates))
+        # inactive_pfxs: dark meter index -> inactive addresses behind it
+        self.backend.program_meters(None, {idx: self.dark_rates(addr_rates, in_addr)
+                                           for idx, in_addr in inactive_pfxs.items()})
+
+    def sweep(self):
+        logging.info('Starting collecting values...')
+        self.backend.sync()
+        flags = self.backend.read_flags(len(self.index_prefix_mapping), self.dark_index_ranges)
+        aging = self.age(flags)
+        self.backend.write_global(aging.activated, aging.deactivated, aging.refreshed)
+        self.backend.clear_flags(aging.refreshed)
+        self.update_rates(aging.inactive_pfxs, aging.inactive_addr)
+        with self.lock:
+            self.epoch += 1
+            self.last_sweep = time.time()
+        return aging
+
+    def run(self):
+        while True:
+            self.sweep()
+
+            logging.info(f'Waiting for {self.time_interval} seconds...')
+            time.sleep(self.time_interval)
+
+    def age_mask(self, indices, min_age=None, max_age=None):
+        # indices whose last transition was between min_age and max_age sweeps ago
+        ages = self.sweeps - self.last_change[indices].astype(np.int64)
+        mask = np.ones(len(indices), dtype=bool)
+        if min_age is not None:
+            mask &= ages >= min_age
+        if max_age is not None:
+            mask &= ages <= max_age
+        return mask
+
+    def inactive_blocks(self, covering_prefix=None, min_age=None, max_age=None):
+        # (index, prefix) of the inactive blocks in covering_prefix, with self.lock held
+        if covering_prefix is None:
+            indices = np.flatnonzero(np.asarray(self.counters[:len(self.index_prefix_mapping)]) == 0)
+            found = [(i, str(self.index_prefix_mapping[i])) for i in indices]
+        else:
+            found = []
+            covered = self.prefix_index_mapping.search_covered(covering_prefix)
+            for node in covered:
+                if not self.counters[node.data['index']]:
+                    found.append((node.data['index'], str(node.prefix)))
+            if not covered:
+                # finer than the tracking granularity: inactive if its block is
+                node = self.prefix_index_mapping.search_best(covering_prefix)
+                if node is not None and not self.counters[node.data['index']]:
+                    found.append((node.data['index'], str(ipaddress.ip_network(covering_prefix, strict=False))))
+        if (min_age is not None or max_age is not None) and found:
+            keep = self.age_mask(np.array([i for i, _ in found]), min_age, max_age)
+            found = [f for f, k in zip(found, keep) if k]
+        return found
+
+    def get_inactive_prefixes(self, covering_prefix=None, min_age=None, max_age=None):
+        with self.lock:
+            found = self.inactive_blocks(covering_prefix, min_age, max_age)
+        return aggregate([pfx for _, pfx in found])
+
+    def get_state(self):
+        # inactive blocks of every monitored entry, one byte each and
+        # zlib-compressed, rebuilt at most once per epoch
+        with self.lock:
+            if self._state is None or self._state['epoch'] != self.epoch:
+                inactive = bytes(map(operator.not_, self.counters[:len(self.index_prefix_mapping)]))
+                self._state = {
+                    'epoch': self.epoch,
+                    'swept': self.last_sweep,
+                    'switch': self.switch and self.switch.name,
+                    'monitored': [[str(m.ipnet), m.track_len, m.base_idx] for m in self.monitored],
+                    'inactive': base64.b64encode(zlib.compress(inactive, 1)).decode(),
+                }
+            return self._state
@@ -0,0 +1,99 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+# Interval arithmetic on IPv4 address ranges, shared by the Tofino controller
+# (history, snapshot) and the federation aggregator. A set of ranges is a
+# pair of int64 arrays (starts, ends) of sorted, disjoint [start, end)
+# intervals.
+
+import ipaddress
+
+import numpy as np
+
+EMPTY = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+
+def union(starts, ends):
+    """Sorted, disjoint [start, end) intervals covering the given ones."""
+    if not len(starts):
+        return EMPTY
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    first = np.ones(len(starts), dtype=bool)
+    first[1:] = starts[1:] > reach[:-1]
+    idx = np.flatnonzero(first)
+    last = np.append(idx[1:] - 1, len(starts) - 1)
+    return starts[idx], reach[last]
+
+
+def merge(a, b):
+    return union(np.concatenate([a[0], b[0]]), np.concatenate([a[1], b[1]]))
+
+
+def difference(a, b):
+    """a minus b, both sorted and disjoint."""
+    (a_starts, a_ends), (b_starts, b_ends) = a, b
+    if not len(a_starts) or not len(b_starts):
+        return a
+    points = np.concatenate([a_starts, a_ends, b_starts, b_ends])
+    ones_a, ones_b = np.ones(len(a_starts), dtype=np.int64), np.ones(len(b_starts), dtype=np.int64)
+    zeros_a, zeros_b = np.zeros_like(ones_a), np.zeros_like(ones_b)
+    in_a = np.concatenate([ones_a, -ones_a, zeros_b, zeros_b])
+    in_b = np.concatenate([zeros_a, zeros_a, ones_b, -ones_b])
+    order = np.argsort(points, kind='stable')
+    points = points[order]
+    in_a, in_b = np.cumsum(in_a[order]), np.cumsum(in_b[order])
+    # coverage holds on [points[i], points[i + 1])
+    keep = (in_a[:-1] > 0) & (in_b[:-1] == 0) & (points[1:] > points[:-1])
+    return union(points[:-1][keep], points[1:][keep])
+
+
+def intersection(a, b):
+    return difference(a, difference(a, b))
+
+
+def clip(intervals, start, end):
+    starts, ends = intervals
+    lo = np.searchsorted(ends, start, side='right')
+    hi = np.searchsorted(starts, end, side='left')
+    return np.maximum(starts[lo:hi], start), np.minimum(ends[lo:hi], end)
+
+
+def to_prefixes(intervals):
+    prefixes = []
+    for start, end in zip(*intervals):
+        nets = ipaddress.summarize_address_range(ipaddress.IPv4Address(int(start)), ipaddress.IPv4Address(int(end) - 1))
+        prefixes.extend(str(net) for net in nets)
+    return prefixes
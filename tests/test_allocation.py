@@ -0,0 +1,127 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+import json
+import ipaddress
+
+import pytest
+
+from allocation import Switch, join_entries, load_switches, plan_allocation, format_entry
+
+
+def entry(prefix, track_len=32, dark_len=24):
+    return ipaddress.IPv4Network(prefix), track_len, dark_len
+
+
+def switch(name, size, dark=1024, monitored=1024):
+    return Switch(name, 'localhost:50052', size, dark, monitored)
+
+
+def covered(plan):
+    return sorted(ipaddress.collapse_addresses([e[0] for entries in plan.values() for e in entries]))
+
+
+def test_single_switch_keeps_entries():
+    entries = [entry('10.0.0.0/22'), entry('10.1.0.0/24')]
+    assert plan_allocation(entries, [switch('s1', 4096)]) == {'s1': entries}
+
+
+def test_split_in_proportion():
+    entries = [entry('10.0.0.0/20')]
+    plan = plan_allocation(entries, [switch('s1', 8192), switch('s2', 4096)])
+    sizes = {name: sum(2**(32 - e[0].prefixlen) for e in es) for name, es in plan.items()}
+    assert sum(sizes.values()) == 4096
+    # within a balancing granularity (a quarter of the smallest share) of 2/3
+    assert abs(sizes['s1'] - 4096 * 2 / 3) <= 4096 / 3 / 4
+    assert covered(plan) == [ipaddress.IPv4Network('10.0.0.0/20')]
+    # every switch gets contiguous address ranges, in address order
+    assert max(e[0] for e in plan['s1']) < min(e[0] for e in plan['s2'])
+
+
+def test_registers_oversubscribed():
+    with pytest.raises(ValueError, match='register entries needed'):
+        plan_allocation([entry('10.0.0.0/20')], [switch('s1', 2048), switch('s2', 1024)])
+
+
+def test_dark_meters_oversubscribed():
+    with pytest.raises(ValueError, match='dark meters needed'):
+        plan_allocation([entry('10.0.0.0/20')], [switch('s1', 8192, dark=8), switch('s2', 8192, dark=4)])
+
+
+def test_no_switches():
+    with pytest.raises(ValueError):
+        plan_allocation([entry('10.0.0.0/24')], [])
+
+
+def test_granularity_limit():
+    # enough room in all, but a /24 with /24 dark blocks cannot be halved
+    # and the third one fits on neither switch
+    entries = [entry('10.0.0.0/24'), entry('10.0.1.0/24'), entry('10.0.2.0/24')]
+    with pytest.raises(ValueError, match='does not fit'):
+        plan_allocation(entries, [switch('s1', 384), switch('s2', 384)])
+    # with /25 dark blocks it is split between them
+    entries = [entry('10.0.0.0/24', 32, 25), entry('10.0.1.0/24', 32, 25)]
+    plan = plan_allocation(entries, [switch('s1', 256), switch('s2', 256)])
+    assert all(e[0].prefixlen <= 25 for es in plan.values() for e in es)
+    assert covered(plan) == [ipaddress.IPv4Network('10.0.0.0/23')]
+
+
+def test_monitored_table_limit():
+    entries = [entry(f'10.0.{i}.0/24', 24) for i in range(0, 8, 2)]
+    plan = plan_allocation(entries, [switch('s1', 1024, monitored=1), switch('s2', 1024, monitored=8)])
+    assert len(plan['s1']) <= 1
+    assert sum(len(es) for es in plan.values()) == 4
+
+
+def test_join_entries():
+    halves = [entry('10.0.0.0/25'), entry('10.0.0.128/25'), entry('10.0.1.0/24')]
+    assert join_entries(halves) == [entry('10.0.0.0/23')]
+    # different tracking lengths or non-siblings stay apart
+    mixed = [entry('10.0.0.0/25'), entry('10.0.0.128/25', 28)]
+    assert join_entries(mixed) == mixed
+    apart = [entry('10.0.0.128/25'), entry('10.0.1.0/25')]
+    assert join_entries(apart) == apart
+    assert join_entries([]) == []
+
+
+def test_load_switches(tmp_path):
+    path = tmp_path / 'switches.json'
+    path.write_text(json.dumps([{'name': 's1', 'global_table_size': 1024}, {'name': 's2', 'grpc_addr': 'h:1'}]))
+    s1, s2 = load_switches(str(path))
+    assert (s1.name, s1.global_table_size, s1.dark_meter_size) == ('s1', 1024, 16384)
+    assert (s2.grpc_addr, s2.global_table_size) == ('h:1', 4194304)
+
+
+def test_format_entry():
+    assert format_entry(entry('10.64.0.0/12', 28, 20)) == '10.64.0.0/12 28 20'
@@ -0,0 +1,148 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+import struct
+
+import numpy as np
+import pytest
+
+from collector import Aggregates, MAGIC_NS, PcapStream
+
+
+def add(aggregates, keys, ts, length=None):
+    keys = np.asarray(keys, dtype=np.uint32)
+    length = np.full(len(keys), 100, dtype=np.int64) if length is None else np.asarray(length, dtype=np.int64)
+    aggregates.add(keys, length, np.asarray(ts, dtype=np.int64))
+
+
+def test_first_and_last_seen():
+    aggregates = Aggregates()
+    add(aggregates, [7, 7, 7], [100, 200, 300])
+    assert aggregates.top(1) == [(7, 3, 300, 100, 300)]
+
+
+def test_interleaved_keys():
+    aggregates = Aggregates()
+    add(aggregates, [1, 2, 1, 3, 2], [10, 20, 30, 40, 50], [1, 2, 3, 4, 5])
+    assert sorted(aggregates.top(3)) == [(1, 2, 4, 10, 30), (2, 2, 7, 20, 50), (3, 1, 4, 40, 40)]
+
+
+def test_batches_merge():
+    aggregates = Aggregates()
+    add(aggregates, [1, 2], [10, 20])
+    add(aggregates, [2, 3, 2], [30, 40, 50])
+    add(aggregates, [], [])
+    assert len(aggregates) == 3
+    assert sorted(aggregates.top(3)) == [(1, 1, 100, 10, 10), (2, 3, 300, 20, 50), (3, 1, 100, 40, 40)]
+
+
+def test_top_by_bytes():
+    aggregates = Aggregates()
+    add(aggregates, [1, 2, 2], [10, 20, 30], [1000, 10, 10])
+    assert [row[0] for row in aggregates.top(2)] == [2, 1]
+    assert [row[0] for row in aggregates.top(1, by='bytes')] == [1]
+
+
+def packet(i, caplen, vlan=False, ether_type=0x0800):
+    # an IPv4/TCP packet from 198.51.100.0/24 to 10.0.0.0/16, truncated
+    ip = struct.pack('>BBHHHBBHII', 0x45, 0, 40 + i % 1000, 0, 0, 64, 6, 0,
+                     0xc6336400 + i % 256, 0x0a000000 + i % 65536)
+    tag = struct.pack('>HH', 0x8100, 7) if vlan else b''
+    frame = bytes(12) + tag + struct.pack('>H', ether_type) + ip + struct.pack('>HH', 1024 + i % 60000, 23)
+    return frame.ljust(caplen, b'\0')[:caplen]
+
+
+def write_pcap(path, frames, endian):
+    with open(path, 'wb') as f:
+        f.write(struct.pack(endian + 'IHHiIII', MAGIC_NS, 2, 4, 0, 0, 65535, 1))
+        for i, frame in enumerate(frames):
+            f.write(struct.pack(endian + 'IIII', 1700000000 + i, i, len(frame), 60) + frame)
+
+
+def expected(i, caplen, vlan=False):
+    ports = (1024 + i % 60000, 23) if caplen >= 14 + (4 if vlan else 0) + 24 else (0, 0)
+    return (1700000000 * 10**9 + i * 10**9 + i, 0xc6336400 + i % 256, 0x0a000000 + i % 65536, 6) \
+        + ports + (40 + i % 1000,)
+
+
+def rows(records):
+    return list(zip(*(getattr(records, name).tolist() for name in records.fields)))
+
+
+def read_all(stream, batch_size=1 << 21):
+    return [row for records in stream.read(batch_size) for row in rows(records)]
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_pcap_fixed_length(tmp_path, endian):
+    path = str(tmp_path / 'dark.pcap')
+    write_pcap(path, [packet(i, 54) for i in range(300)], endian)
+    stream = PcapStream(path)
+    assert read_all(stream, batch_size=100) == [expected(i, 54) for i in range(300)]
+    assert (stream.records, stream.irregular) == (300, 0)
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_pcap_mixed_length(tmp_path, endian):
+    rng = np.random.default_rng(1)
+    caplens = [int(c) for c in rng.choice([34, 38, 42, 54, 64, 98], size=500)]
+    caplens[200:400] = [64] * 200
+    caplens[10:13] = [64, 64, 20]
+    frames = [packet(i, caplen) for i, caplen in enumerate(caplens)]
+    # a tagged packet, an ARP packet and a record too short to decode
+    frames[10] = packet(10, 64, vlan=True)
+    frames[11] = packet(11, 64, ether_type=0x0806)
+    path = str(tmp_path / 'dark.pcap')
+    write_pcap(path, frames, endian)
+    stream = PcapStream(path)
+    assert read_all(stream, batch_size=64) == [expected(i, caplen, vlan=i == 10)
+                                               for i, caplen in enumerate(caplens) if i not in (11, 12)]
+    assert stream.records == 500
+    assert stream.irregular == sum(a != b for a, b in zip(caplens, caplens[1:]))
+
+
+def test_pcap_growing_file(tmp_path):
+    path = str(tmp_path / 'dark.pcap')
+    frames = [packet(i, 38 + i % 3) for i in range(100)]
+    write_pcap(path, frames, '<')
+    with open(path, 'rb') as f:
+        data = f.read()
+    cut = len(data) - 30
+    with open(path, 'wb') as f:
+        f.write(data[:cut])
+    stream = PcapStream(path)
+    first = read_all(stream)
+    with open(path, 'ab') as f:
+        f.write(data[cut:])
+    assert first + read_all(stream) == [expected(i, 38 + i % 3) for i in range(100)]
@@ -0,0 +1,119 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+import ipaddress
+
+import pytest
+
+from engine import MemoryBackend, MeterRates, SweepEngine
+
+RATES = (1024000, 2048000000, 512000, 1024000000)   # max pkt, max byte, avg pkt, avg byte
+
+
+class Engine(SweepEngine):
+    # a controller without a data plane: entries are 'prefix track_len dark_len'
+
+    def __init__(self, entries, global_table_size=1024, alpha=2, table_size=None, rate_divisor=None):
+        super().__init__(table_size or global_table_size, 16, alpha, *RATES, rate_divisor=rate_divisor)
+        self.backend = MemoryBackend(self.global_table_size, self.dark_meter_size)
+        self.monitored = self.layout(entries)
+        self.map_monitored()
+
+    def parse_entry(self, entry):
+        prefix, track_len, dark_len = entry.split()
+        return ipaddress.IPv4Network(prefix), int(track_len), int(dark_len)
+
+
+def index(engine, prefix):
+    return engine.prefix_index_mapping.search_exact(prefix).data['index']
+
+
+def test_aging_and_last_change():
+    engine = Engine(['10.0.0.0/24 26 25'])
+    a = index(engine, '10.0.0.0/26')
+    engine.sweep()
+    aging = engine.sweep()
+    # nothing was seen, every block goes dark after alpha sweeps
+    assert sorted(aging.deactivated) == [0, 1, 2, 3]
+    assert list(engine.backend.global_table[:4]) == [0, 0, 0, 0]
+    assert list(engine.last_change[:4]) == [2, 2, 2, 2]
+
+    engine.backend.traffic([a])
+    aging = engine.sweep()
+    assert (aging.activated, aging.refreshed) == ([a], [a])
+    assert engine.counters[a] == engine.alpha + 1
+    assert engine.backend.global_table[a] == 1 and engine.backend.flags[a] == 0
+    assert engine.last_change[a] == 3 and engine.last_change[a + 1] == 2
+    # the others went dark a sweep ago
+    assert engine.inactive_blocks(max_age=0) == []
+    assert [i for i, _ in engine.inactive_blocks(min_age=1)] == [1, 2, 3]
+
+    # active for alpha more sweeps without traffic
+    for _ in range(engine.alpha):
+        assert engine.sweep().deactivated == []
+    assert engine.sweep().deactivated == [a]
+    assert engine.last_change[a] == 3 + engine.alpha + 1
+
+
+def test_inactive_prefixes_aggregate():
+    engine = Engine(['10.0.0.0/24 26 25', '10.0.1.0/24 26 25'])
+    for _ in range(engine.alpha):
+        engine.sweep()
+    assert engine.get_inactive_prefixes() == ['10.0.0.0/23']
+
+    engine.backend.traffic([index(engine, '10.0.1.64/26')])
+    aging = engine.sweep()
+    assert engine.get_inactive_prefixes() == ['10.0.0.0/24', '10.0.1.0/26', '10.0.1.128/25']
+    assert engine.get_inactive_prefixes('10.0.1.0/25') == ['10.0.1.0/26']
+    # finer than the tracking granularity
+    assert engine.get_inactive_prefixes('10.0.1.10/32') == ['10.0.1.10/32']
+    assert engine.get_inactive_prefixes('10.0.1.70/32') == []
+    # dark meters: addresses of the inactive blocks behind each
+    assert aging.inactive_addr == 512 - 64
+    assert aging.inactive_pfxs == {0: 128, 1: 128, 2: 64, 3: 128}
+
+
+@pytest.mark.parametrize('target, table_size, rate_divisor', [
+    ('bmv2', 1024, None),
+    ('tofino', 1024, None),
+    # two address banks of global_table_size entries
+    ('tofino2', 2048, 1024),
+])
+def test_rate_divisor(target, table_size, rate_divisor):
+    engine = Engine(['10.0.0.0/24 26 25'], table_size=table_size, rate_divisor=rate_divisor)
+    assert engine.addr_rates == MeterRates(*(round(rate / 1024, 3) for rate in engine.rates))
+    engine.set_rates()
+    assert engine.backend.global_rates == engine.rates
+    # a /25 dark block gets the rates of its 128 addresses
+    assert engine.backend.block_rates[0] == MeterRates(64000, 128000, 128000000, 256000000)
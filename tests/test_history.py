@@ -0,0 +1,106 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+from conftest import iv, pairs
+from history import History
+from intervals import EMPTY
+
+
+MONITORED = iv((0, 1000))
+
+
+def history(path, **kwargs):
+    # t=0: everything dark, t=10: [100, 200) active, t=20: [150, 200) dark
+    # again, t=30: [0, 50) active
+    h = History(str(path), **kwargs)
+    h.record(1, 0, EMPTY, EMPTY, lambda: (MONITORED, MONITORED))
+    h.record(2, 10, iv((100, 200)), EMPTY, lambda: (MONITORED, iv((0, 100), (200, 1000))))
+    h.record(3, 20, EMPTY, iv((150, 200)), lambda: (MONITORED, iv((0, 100), (150, 1000))))
+    h.record(4, 30, iv((0, 50)), EMPTY, lambda: (MONITORED, iv((50, 100), (150, 1000))))
+    return h
+
+
+def test_dark_throughout(tmp_path):
+    h = history(tmp_path / 'history')
+    assert pairs(h.dark_throughout(0, 1000, 0, 5)) == [(0, 1000)]
+    assert pairs(h.dark_throughout(0, 1000, 0, 25)) == [(0, 100), (200, 1000)]
+    assert pairs(h.dark_throughout(0, 1000, 20, 40)) == [(50, 100), (150, 1000)]
+    assert pairs(h.dark_throughout(120, 180, 25, 40)) == [(150, 180)]
+
+
+def test_checkpoints(tmp_path):
+    # a checkpoint after every delta gives the same answers
+    h = history(tmp_path / 'history', checkpoint_every=1)
+    assert len(h.checkpoints) == 4
+    assert pairs(h.dark_throughout(0, 1000, 0, 25)) == [(0, 100), (200, 1000)]
+    assert pairs(h.dark_throughout(0, 1000, 20, 40)) == [(50, 100), (150, 1000)]
+
+
+def test_active_times(tmp_path):
+    h = history(tmp_path / 'history')
+    assert h.first_active(100, 200, 0) == 10
+    assert h.first_active(500, 600, 0) is None
+    assert h.last_active(150, 200, 40) == 20
+    assert h.last_active(100, 150, 40) == 40
+    assert h.last_active(500, 600, 40) is None
+
+
+def test_reopen(tmp_path):
+    h = history(tmp_path / 'history')
+    h.close()
+    h = History(str(tmp_path / 'history'))
+    assert len(h.index) == 4
+    assert pairs(h.dark_throughout(0, 1000, 20, 40)) == [(50, 100), (150, 1000)]
+
+
+def test_compact(tmp_path):
+    h = history(tmp_path / 'history')
+    before = pairs(h.dark_throughout(0, 1000, 20, 40))
+    h.compact(20)
+    # a checkpoint at t=10 replaces the first two records
+    assert [kind for _, _, kind, _ in h.index] == [b'C', b'D', b'D']
+    assert h.index[0][0] == 10
+    assert pairs(h.dark_throughout(0, 1000, 20, 40)) == before
+    assert pairs(h.dark_throughout(0, 1000, 10, 25)) == [(0, 100), (200, 1000)]
+    h.compact(0)
+    assert len(h.index) == 3
+
+
+def test_partial_record(tmp_path):
+    h = history(tmp_path / 'history')
+    h.close()
+    with open(tmp_path / 'history', 'ab') as f:
+        f.write(b'D\0\0')
+    h = History(str(tmp_path / 'history'))
+    assert len(h.index) == 4
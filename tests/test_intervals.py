@@ -0,0 +1,75 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+from conftest import iv, pairs
+from intervals import EMPTY, union, merge, difference, intersection, clip, to_prefixes
+
+
+def test_union():
+    assert pairs(union(*iv((10, 20), (0, 5), (15, 30), (5, 8), (40, 50)))) == [(0, 8), (10, 30), (40, 50)]
+    assert pairs(union(*iv((0, 100), (10, 20)))) == [(0, 100)]
+    assert pairs(union(*EMPTY)) == []
+
+
+def test_merge():
+    assert pairs(merge(iv((0, 10)), iv((10, 20), (30, 40)))) == [(0, 20), (30, 40)]
+
+
+def test_difference():
+    a = iv((0, 10), (20, 30))
+    assert pairs(difference(a, iv((5, 25)))) == [(0, 5), (25, 30)]
+    assert pairs(difference(a, iv((0, 10)))) == [(20, 30)]
+    assert pairs(difference(a, iv((2, 3), (4, 6)))) == [(0, 2), (3, 4), (6, 10), (20, 30)]
+    assert pairs(difference(a, EMPTY)) == pairs(a)
+    assert pairs(difference(EMPTY, a)) == []
+    assert pairs(difference(a, iv((-5, 50)))) == []
+
+
+def test_intersection():
+    assert pairs(intersection(iv((0, 10), (20, 30)), iv((5, 25)))) == [(5, 10), (20, 25)]
+    assert pairs(intersection(iv((0, 10)), iv((10, 20)))) == []
+
+
+def test_clip():
+    a = iv((0, 10), (20, 30), (40, 50))
+    assert pairs(clip(a, 5, 45)) == [(5, 10), (20, 30), (40, 45)]
+    assert pairs(clip(a, 10, 20)) == []
+    assert pairs(clip(a, 25, 26)) == [(25, 26)]
+
+
+def test_to_prefixes():
+    base = int.from_bytes(bytes([10, 0, 0, 0]), 'big')
+    assert to_prefixes(iv((base, base + 256))) == ['10.0.0.0/24']
+    assert to_prefixes(iv((base + 1, base + 4))) == ['10.0.0.1/32', '10.0.0.2/31']
+    assert to_prefixes(EMPTY) == []
@@ -0,0 +1,92 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+import numpy as np
+import pytest
+
+import fake_bfrt
+
+ALPHA = 2
+
+
+@pytest.fixture
+def client(tmp_path):
+    info = fake_bfrt.install(global_table_size=65536, num_pipes=2)
+    from controllertof import LocalClient
+    monitored = tmp_path / 'monitored.txt'
+    monitored.write_text('10.1.0.0/20\n')
+    c = LocalClient(3, 65536, 1024, ALPHA, str(monitored), {'incoming': [2], 'outgoing': [1]},
+                    1174405, 338102845, 343933, 17758683)
+    c.info = info
+    c.monitored_file = monitored
+    for _ in range(ALPHA + 1):
+        c.sweep()
+    return c
+
+
+def flags(c, bank):
+    table = c.info.table_get(f'pipe.Ingress.flag_table{bank}')
+    return set(np.flatnonzero(table.test_bits(range(65536))).tolist())
+
+
+def test_index_moves(client):
+    old = client.layout(['10.1.0.0/20'])
+    assert client.index_moves(old, client.layout(['10.0.0.0/20', '10.1.0.0/20'])) == [(0, 4096, 4096)]
+    assert client.index_moves(old, client.layout(['10.1.8.0/21', '10.1.0.0/22'])) == [(2048, 0, 2048), (0, 2048, 1024)]
+    # blocks tracked at another granularity start over
+    assert client.index_moves(old, client.layout(['10.1.0.0/20 24'])) == []
+
+
+def test_reload_moves_flags(client):
+    live, summary = fake_bfrt.live_flag_tables(client.info)
+    live.set_bits([100, 4000])
+    summary.set_indices({client.dark_index_mapping[100], client.dark_index_mapping[4000]})
+    client.monitored_file.write_text('10.0.0.0/20\n10.1.0.0/20\n')
+    client.reload()
+    bank = client.backend.flag_bank
+    assert fake_bfrt.live_flag_tables(client.info)[0] is client.info.table_get(f'pipe.Ingress.flag_table{bank}')
+    assert flags(client, bank) == {4196, 8096}
+    assert flags(client, bank ^ 1) == set()
+    client.sweep()
+    assert client.counters[4196] == client.counters[8096] == ALPHA + 1
+    assert client.counters[100] == ALPHA - 1
+
+
+def test_reload_clears_dropped_flags(client):
+    live, _ = fake_bfrt.live_flag_tables(client.info)
+    live.set_bits([10, 3000])
+    client.monitored_file.write_text('10.1.0.0/21\n')
+    client.reload()
+    assert flags(client, client.backend.flag_bank) == {10}
+    assert flags(client, client.backend.flag_bank ^ 1) == set()
@@ -0,0 +1,115 @@
+# This software is Copyright (c) 2024 Georgia Tech Research Corporation. All
+# Rights Reserved. Permission to copy, modify, and distribute this software and
+# its documentation for academic research and education purposes, without fee,
+# and without a written agreement is hereby granted, provided that the above
+# copyright notice, this paragraph and the following three paragraphs appear in
+# all copies. Permission to make use of this software for other than academic
+# research and education purposes may be obtained by contacting:
+#
+#  Office of Technology Licensing
+#  Georgia Institute of Technology
+#  926 Dalney Street, NW
+#  Atlanta, GA 30318
+#  404.385.8066
+#  techlicensing@gtrc.gatech.edu
+#
+# This software program and documentation are copyrighted by Georgia Tech
+# Research Corporation (GTRC). The software program and documentation are 
+# supplied "as is", without any accompanying services from GTRC. GTRC does
+# not warrant that the operation of the program will be uninterrupted or
+# error-free. The end-user understands that the program was developed for
+# research purposes and is advised not to rely exclusively on the program for
+# any reason.
+#
+# IN NO EVENT SHALL GEORGIA TECH RESEARCH CORPORATION BE LIABLE TO ANY PARTY FOR
+# DIRECT, INDIRECT, SPECIAL, INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING
+# LOST PROFITS, ARISING OUT OF THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION,
+# EVEN IF GEORGIA TECH RESEARCH CORPORATION HAS BEEN ADVISED OF THE POSSIBILITY
+# OF SUCH DAMAGE. GEORGIA TECH RESEARCH CORPORATION SPECIFICALLY DISCLAIMS ANY
+# WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+# MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE SOFTWARE PROVIDED
+# HEREUNDER IS ON AN "AS IS" BASIS, AND  GEORGIA TECH RESEARCH CORPORATION HAS
+# NO OBLIGATIONS TO PROVIDE MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR
+# MODIFICATIONS.
+
+import ipaddress
+
+from sparse6 import SparseTracker6, merge, slots6, subtract
+
+NET = ipaddress.IPv6Network('2001:db8::/47')
+
+
+def tracker(alpha=1, entries=((NET, 64),)):
+    t = SparseTracker6(alpha, 65536)
+    t.set_monitored(list(entries))
+    # past the warmup, nothing active
+    for _ in range(alpha):
+        t.age([])
+    return t
+
+
+def block(i, net=NET):
+    return (int(net.network_address) >> 64) + i
+
+
+def test_slots_are_crc16():
+    # no initial xor: 0 hashes to 0, and 16 consecutive bits hit every slot
+    assert slots6([0])[0] == 0
+    assert len(set(slots6([block(i) for i in range(65536)]).tolist())) == 65536
+
+
+def test_idle():
+    assert tracker().inactive() == [str(NET)]
+
+
+def test_reported_block_is_active():
+    t = tracker()
+    slots = slots6([block(i) for i in range(131072)])
+    first = int(slots[0])
+    other = [i for i in range(1, 131072) if slots[i] == first]
+    assert len(other) == 1
+    # only the first block to flag the slot is reported, the other one is
+    # not known to the controller
+    t.seen(block(0), first)
+    inactive = [ipaddress.IPv6Network(p) for p in t.inactive()]
+    assert not any(ipaddress.IPv6Address(block(0) << 64) in net for net in inactive)
+    assert any(ipaddress.IPv6Address(block(other[0]) << 64) in net for net in inactive)
+    assert sum(net.num_addresses for net in inactive) == NET.num_addresses - 2**64
+
+
+def test_busy_slot_ages_out():
+    t = tracker()
+    t.seen(block(0), int(slots6([block(0)])[0]))
+    assert t.age([]) == ([], [])
+    t.age([])
+    assert t.inactive() == [str(NET)]
+
+
+def test_nested_entries():
+    inner = ipaddress.IPv6Network('2001:db8:0:100::/56')
+    t = tracker(entries=[(NET, 56), (inner, 64)])
+    slot = int(slots6([block(0x100, NET)])[0])
+    t.seen(block(0x100), slot)
+    inactive = [ipaddress.IPv6Network(p) for p in t.inactive()]
+    assert ipaddress.IPv6Network('2001:db8:0:100::/64') not in inactive
+    # the /56 holding the inner prefix is tracked at /64, its other blocks stay dark
+    assert any(ipaddress.IPv6Address('2001:db8:0:101::') in net for net in inactive)
+
+
+def test_large_prefix():
+    # nothing is kept per block of the monitored prefixes
+    net = ipaddress.IPv6Network('2001:db8::/32')
+    t = tracker(entries=[(net, 64)])
+    assert t.inactive() == [str(net)]
+    t.seen(block(1, net), int(slots6([block(1, net)])[0]))
+    inactive = [ipaddress.IPv6Network(p) for p in t.inactive()]
+    assert inactive[:2] == [ipaddress.IPv6Network('2001:db8::/64'), ipaddress.IPv6Network('2001:db8:0:2::/63')]
+    assert sum(n.num_addresses for n in inactive) == net.num_addresses - 2**64
+    t.age([])
+    t.age([])
+    assert t.inactive() == [str(net)]
+
+
+def test_range_arithmetic():
+    assert merge([(5, 7), (1, 3), (2, 4)]) == [(1, 4), (5, 7)]
+    assert subtract([(0, 10), (20, 30)], [(2, 4), (8, 22)]) == [(0, 2), (4, 8), (22, 30)]